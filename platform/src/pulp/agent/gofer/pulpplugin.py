@@ -30,6 +30,7 @@ from gofer.agent.rmi import Context
 
 from pulp.common.bundle import Bundle as BundleImpl
 from pulp.common.config import Config
+from pulp.common.util import profile_hash
 from pulp.agent.lib.dispatcher import Dispatcher
 from pulp.agent.lib.conduit import Conduit as HandlerConduit
 from pulp.bindings.server import PulpConnection
@@ -368,6 +369,39 @@ class Profile:
             if not profile_report['succeeded']:
                 continue
             details = profile_report['details']
+            if self.__unchanged(bindings, myid, typeid, details):
+                log.debug('profile (%s), unchanged', typeid)
+                continue
             http = bindings.profile.send(myid, typeid, details)
             log.debug('profile (%s), reported: %d', typeid, http.response_code)
         return report.dict()
+
+    def __unchanged(self, bindings, myid, typeid, profile):
+        """
+        Get whether the server already has the specified profile by
+        comparing content hashes, so that unchanged profiles are not sent.
+        @param bindings: The pulp bindings.
+        @type bindings: PulpBindings
+        @param myid: The consumer ID.
+        @type myid: str
+        @param typeid: The profile (content) type ID.
+        @type typeid: str
+        @param profile: The unit profile.
+        @type profile: object
+        @return: True if the server has the same profile.
+        @rtype: bool
+        """
+        try:
+            digest = profile_hash(profile)
+        except ImportError:
+            # hashlib is not available on python 2.4
+            log.debug('profile (%s), hashing not supported', typeid)
+            return False
+        try:
+            http = bindings.profile.hash(myid, typeid)
+            stored = http.response_body['profile_hash']
+        except Exception:
+            # not yet reported or not supported by the server
+            log.debug('profile (%s), hash not found', typeid, exc_info=True)
+            return False
+        return stored == digest
@@ -182,6 +182,10 @@ class ProfilesAPI(PulpAPI):
         data = { 'content_type':content_type, 'profile':profile }
         return self.server.POST(path, data)
 
+    def hash(self, id, content_type):
+        path = self.BASE_PATH % id + '%s/hash/' % content_type
+        return self.server.GET(path)
+
 
 class ConsumerHistoryAPI(PulpAPI):
     """
@@ -11,6 +11,8 @@
 # You should have received a copy of GPLv2 along with this software; if not,
 # see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
 
+from pulp.common.compat import json
+
 
 def encode_unicode(path):
     """
@@ -46,3 +48,36 @@ def ensure_utf_8(s):
         s = s.decode('iso-8859-1')
     u = s.encode('utf-8')
     return u
+
+
+def profile_hash(profile):
+    """
+    Calculate the canonical content hash of a unit profile, so that consumers
+    and the server can tell whether a profile changed without comparing it.
+    Profiles describe a set of installed units: the order of dictionary keys
+    and of list items does not affect the hash.
+
+    @param profile: unit profile
+    @type profile: object
+    @return: hex digest of the profile
+    @rtype: str
+    @raise ImportError: when hashlib is not available (python 2.4)
+    """
+    # imported here so the rest of the module can be used on python 2.4
+    from hashlib import sha256
+    canonical = json.dumps(_canonical(profile), sort_keys=True, separators=(',', ':'))
+    return sha256(canonical).hexdigest()
+
+
+def _canonical(value):
+    """
+    Recursively sort the items of the lists, and tuples, within the given value.
+    """
+    if isinstance(value, dict):
+        return dict([(k, _canonical(v)) for k, v in value.items()])
+    if isinstance(value, (list, tuple)):
+        items = [_canonical(v) for v in value]
+        keyed = [(json.dumps(i, sort_keys=True), i) for i in items]
+        keyed.sort()
+        return [i for k, i in keyed]
+    return value
@@ -18,9 +18,11 @@ import sys
 import pulp.plugins.conduits._common as common_utils
 from   pulp.plugins.model import Unit, PublishReport
 from   pulp.plugins.types import database as types_db
+from   pulp.server.compat import json
 import pulp.server.dispatch.factory as dispatch_factory
 from   pulp.server.exceptions import MissingResource
 import pulp.server.managers.factory as manager_factory
+from   pulp.server.util import paginate
 
 # Unused in this class but imported here so plugins don't have to reach
 # into server packages directly
@@ -30,6 +32,9 @@ from   pulp.server.db.model.criteria import UnitAssociationCriteria, Criteria
 
 _LOG = logging.getLogger(__name__)
 
+# Default number of units read from the server at once by the get_units_iter calls
+DEFAULT_UNITS_BATCH_SIZE = 1000
+
 # -- exceptions ---------------------------------------------------------------
 
 class ImporterConduitException(Exception):
@@ -146,6 +151,26 @@ class SingleRepoUnitsMixin(object):
         """
         return do_get_repo_units(self.repo_id, criteria, self.exception_class)
 
+    def get_units_iter(self, criteria=None, batch_size=DEFAULT_UNITS_BATCH_SIZE):
+        """
+        Iterator variant of get_units. Units are read from the server in
+        batches and converted as they are consumed, so the memory used does
+        not grow with the number of units in the repository. This should be
+        preferred over get_units when walking every unit in a large
+        repository, such as during a publish.
+
+        @param criteria: used to scope the returned results or the data within;
+               the Criteria class can be imported from this module
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @param batch_size: number of units read from the server at once
+        @type  batch_size: int
+
+        @return: iterator of unit instances
+        @rtype:  generator of L{AssociatedUnit}
+        """
+        return do_get_repo_units_iter(self.repo_id, criteria, self.exception_class, batch_size)
+
 
 class MultipleRepoUnitsMixin(object):
 
@@ -169,6 +194,24 @@ class MultipleRepoUnitsMixin(object):
         """
         return do_get_repo_units(repo_id, criteria, self.exception_class)
 
+    def get_units_iter(self, repo_id, criteria=None, batch_size=DEFAULT_UNITS_BATCH_SIZE):
+        """
+        Iterator variant of get_units. Units are read from the server in
+        batches and converted as they are consumed, so the memory used does
+        not grow with the number of units in the repository.
+
+        @param criteria: used to scope the returned results or the data within;
+               the Criteria class can be imported from this module
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @param batch_size: number of units read from the server at once
+        @type  batch_size: int
+
+        @return: iterator of unit instances
+        @rtype:  generator of L{AssociatedUnit}
+        """
+        return do_get_repo_units_iter(repo_id, criteria, self.exception_class, batch_size)
+
 
 class SearchUnitsMixin(object):
 
@@ -386,6 +429,10 @@ class AddUnitMixin(object):
 
         self._association_owner_id = association_owner_id
 
+        # Set when the repo's units change; the server invalidates the
+        # applicability cached for the repo once, at the end of the operation
+        self._applicability_stale = False
+
     def init_unit(self, type_id, unit_key, metadata, relative_path):
         """
         Initializes the Pulp representation of a content unit. The conduit will
@@ -473,13 +520,123 @@ class AddUnitMixin(object):
                 self._added_count += 1
 
             # Associate it with the repo
-            association_manager.associate_unit_by_id(self.repo_id, unit.type_id, unit.id, self.association_owner_type, self.association_owner_id)
+            if association_manager.associate_unit_by_id(self.repo_id, unit.type_id, unit.id, self.association_owner_type,
+                                                        self.association_owner_id, invalidate_applicability=False):
+                self._applicability_stale = True
 
             return unit
         except Exception, e:
             _LOG.exception(_('Content unit association failed [%s]' % str(unit)))
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
+    def save_units(self, units, batch_size=DEFAULT_UNITS_BATCH_SIZE):
+        """
+        Bulk variant of save_unit. The units are processed in batches; for
+        each unit type in a batch, the units that already exist in Pulp are
+        resolved with a single query, the new units are added with a single
+        insert and the associations to the repository are made in one call.
+
+        Existing units are only written to if their metadata has changed.
+
+        This call is idempotent in the same way save_unit is. The id field of
+        each unit will be populated with the UUID for the unit.
+
+        @param units: unit objects returned from the init_unit call
+        @type  units: iterable of L{Unit}
+
+        @param batch_size: maximum number of units saved at once
+        @type  batch_size: int
+
+        @return: list of the provided units, their state updated from the call
+        @rtype:  list of L{Unit}
+        """
+        saved_units = []
+        try:
+            for page in paginate(units, batch_size):
+                units_by_type = {}
+                for unit in page:
+                    units_by_type.setdefault(unit.type_id, []).append(unit)
+
+                for type_id, type_units in units_by_type.items():
+                    self._save_units_of_type(type_id, type_units)
+
+                saved_units.extend(page)
+
+            return saved_units
+        except Exception, e:
+            _LOG.exception(_('Bulk content unit association failed for repository [%s]' % self.repo_id))
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
+
+    def _save_units_of_type(self, type_id, units):
+        """
+        Saves and associates a batch of units of a single type. See save_units.
+
+        @param type_id: type of all of the given units
+        @type  type_id: str
+
+        @param units: units to save
+        @type  units: list of L{Unit}
+        """
+        content_query_manager = manager_factory.content_query_manager()
+        content_manager = manager_factory.content_manager()
+        association_manager = manager_factory.repo_unit_association_manager()
+
+        def _key(unit_key_dict):
+            # unit key values may be unhashable, such as lists or dicts
+            return json.dumps(unit_key_dict, sort_keys=True)
+
+        pulp_units = [common_utils.to_pulp_unit(u) for u in units]
+
+        # Only the exact unit keys are matched, and only the fields that are
+        # compared are read
+        unit_keys_by_key = dict([(_key(u.unit_key), u.unit_key) for u in units])
+        key_fields = units[0].unit_key.keys()
+        fields = set(['_id'])
+        for pulp_unit in pulp_units:
+            fields.update(pulp_unit.keys())
+        collection = content_query_manager.get_content_unit_collection(type_id)
+        existing = collection.find({'$or' : unit_keys_by_key.values()}, fields=list(fields))
+
+        existing_by_key = {}
+        for pulp_unit in existing:
+            unit_key = dict([(k, pulp_unit[k]) for k in key_fields])
+            existing_by_key[_key(unit_key)] = pulp_unit
+
+        new_units = []
+        new_pulp_units = []
+        new_units_by_key = {}
+
+        for unit, pulp_unit in zip(units, pulp_units):
+            key = _key(unit.unit_key)
+            existing_unit = existing_by_key.get(key)
+
+            if existing_unit is not None:
+                unit.id = existing_unit['_id']
+                changed = [k for k, v in pulp_unit.items() if existing_unit.get(k) != v]
+                if changed:
+                    content_manager.update_content_unit(type_id, unit.id, pulp_unit)
+                self._updated_count += 1
+            elif key in new_units_by_key:
+                # Same unit appears more than once in the batch; it's only
+                # added the first time it's seen
+                new_units_by_key[key].append(unit)
+            else:
+                new_units_by_key[key] = [unit]
+                new_units.append(unit)
+                new_pulp_units.append(pulp_unit)
+
+        new_ids = content_manager.add_content_units(type_id, new_pulp_units)
+        for unit, unit_id in zip(new_units, new_ids):
+            for u in new_units_by_key[_key(unit.unit_key)]:
+                u.id = unit_id
+            self._added_count += 1
+
+        unit_ids = list(set([u.id for u in units]))
+        if association_manager.associate_all_by_ids(self.repo_id, type_id, unit_ids,
+                                                    self.association_owner_type, self.association_owner_id,
+                                                    invalidate_applicability=False):
+            self._applicability_stale = True
+
     def link_unit(self, from_unit, to_unit, bidirectional=False):
         """
         Creates a reference between two content units. The semantics of what
@@ -607,3 +764,29 @@ def do_get_repo_units(repo_id, criteria, exception_class):
         _LOG.exception('Exception from server requesting all content units for repository [%s]' % repo_id)
         raise exception_class(e), None, sys.exc_info()[2]
 
+
+
+def do_get_repo_units_iter(repo_id, criteria, exception_class, batch_size=DEFAULT_UNITS_BATCH_SIZE):
+    """
+    Generator variant of do_get_repo_units. The units are streamed from the
+    database in batches and each is converted to its transfer object only as
+    it is consumed.
+    """
+    try:
+        association_query_manager = manager_factory.repo_unit_association_query_manager()
+        units = association_query_manager.get_units_iter(repo_id, criteria=criteria, page_size=batch_size)
+
+        # Type definitions are cached as they are encountered so we don't
+        # hammer the database
+        type_defs = {}
+
+        for unit in units:
+            type_id = unit['unit_type_id']
+            if type_id not in type_defs:
+                type_defs[type_id] = types_db.type_definition(type_id)
+
+            yield common_utils.to_plugin_associated_unit(unit, type_defs[type_id])
+
+    except Exception, e:
+        _LOG.exception('Exception from server requesting all content units for repository [%s]' % repo_id)
+        raise exception_class(e), None, sys.exc_info()[2]
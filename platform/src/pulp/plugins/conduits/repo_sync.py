@@ -110,7 +110,9 @@ class RepoSyncConduit(RepoScratchPadMixin, ImporterScratchPadMixin, AddUnitMixin
         """
 
         try:
-            self._association_manager.unassociate_unit_by_id(self.repo_id, unit.type_id, unit.id, OWNER_TYPE_IMPORTER, self.association_owner_id)
+            if self._association_manager.unassociate_unit_by_id(self.repo_id, unit.type_id, unit.id, OWNER_TYPE_IMPORTER,
+                                                                self.association_owner_id, invalidate_applicability=False):
+                self._applicability_stale = True
             self._removed_count += 1
         except Exception, e:
             _LOG.exception(_('Content unit unassociation failed'))
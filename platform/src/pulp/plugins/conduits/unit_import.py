@@ -114,7 +114,10 @@ class ImportUnitConduit(ImporterScratchPadMixin, RepoScratchPadMixin,
         """
 
         try:
-            self.__association_manager.associate_unit_by_id(self.dest_repo_id, unit.type_id, unit.id, self.association_owner_type, self.association_owner_id)
+            if self.__association_manager.associate_unit_by_id(self.dest_repo_id, unit.type_id, unit.id,
+                                                               self.association_owner_type, self.association_owner_id,
+                                                               invalidate_applicability=False):
+                self._applicability_stale = True
             return unit
         except Exception, e:
             _LOG.exception(_('Content unit association failed [%s]' % str(unit)))
@@ -33,6 +33,13 @@ class Importer(object):
         * types - List of all content type IDs that may be imported using this
                importer.
 
+        The following keys are optional:
+
+        * server_side_copy - If True, the importer does not need to process
+               units copied into its repository from another repository. Pulp
+               will copy the associations itself and import_units will not be
+               called for those copies. Defaults to False.
+
         This method call may be made multiple times during the course of a
         running Pulp server and thus should not be used for initialization
         purposes.
@@ -337,6 +344,13 @@ class GroupImporter(object):
         * types - List of all content type IDs that may be imported using this
                importer.
 
+        The following keys are optional:
+
+        * server_side_copy - If True, the importer does not need to process
+               units copied into its repository from another repository. Pulp
+               will copy the associations itself and import_units will not be
+               called for those copies. Defaults to False.
+
         This method call may be made multiple times during the course of a
         running Pulp server and thus should not be used for initialization
         purposes.
@@ -290,4 +290,40 @@ class Profiler(object):
         """
         message = 'Applicability for: %s, not supported' % unit_type_id
         raise InvalidUnitTypeForApplicability(unit_type_id, message)
+
+    def units_applicable_batch(self, consumers, repo_ids, unit_type_id, unit_keys, config, conduit):
+        """
+        Determine the applicability of the content units to each of the
+        specified consumers, all of which are bound to the same repos. The
+        same units are checked for all the consumers, so profilers can index
+        them once and evaluate every consumer profile against that index.
+
+        By default, units_applicable is called for each consumer.
+
+        :param consumers: Consumers bound to the same repos.
+        :type consumers: list of pulp.plugins.model.Consumer
+
+        :param repo_ids: List of repo ids to check for unit applicability
+        :type repo_ids: list
+
+        :param unit_type_id: Common type id of all the units
+        :type unit_type_id: str
+
+        :param unit_keys: list of unit keys to identify units
+        :type unit_keys: list of dict
+
+        :param config: plugin configuration
+        :type config: pulp.plugins.config.PluginCallConfiguration
+
+        :param conduit: provides access to relevant Pulp functionality
+        :type conduit: pulp.plugins.conduits.profiler.ProfilerConduit
+
+        :return: List of applicability reports keyed by consumer ID.
+        :rtype: dict of: {<consumer_id>: list of pulp.plugins.model.ApplicabilityReport}
+        """
+        reports = {}
+        for consumer in consumers:
+            reports[consumer.id] = \
+                self.units_applicable(consumer, repo_ids, unit_type_id, unit_keys, config, conduit)
+        return reports
             
@@ -17,7 +17,9 @@ This module covers both the ContentType collection itself as well as any
 type-specific collections that exist to suit the type needs.
 """
 
+import copy
 import logging
+import threading
 
 from pymongo import ASCENDING
 
@@ -62,6 +64,130 @@ class MissingDefinitions(Exception):
     def __str__(self):
         return 'MissingDefinitions [%s]' % ', '.join(self.missing_type_ids)
 
+# -- type definition cache ----------------------------------------------------
+
+class TypeDefinitionCache(object):
+    """
+    Process-wide cache of the type definitions stored in the database.
+
+    Type definitions are only written by update_database (run by
+    pulp-manage-db), so they are read once and kept in memory instead of being
+    looked up on every call. The cache is loaded on first use, or explicitly
+    at server start up, and is dropped whenever this module writes to the
+    types collection.
+
+    A lookup of a type that is not in the cache is counted as a miss and
+    falls back to the database, so types added by another process since the
+    cache was loaded are still found.
+
+    @ivar hits: number of lookups answered from the cache
+    @type hits: int
+    @ivar misses: number of lookups that went to the database
+    @type misses: int
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (type ids in database order, map of type id to type definition),
+        # replaced as a whole so readers never see the two disagree
+        self._definitions = None
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """
+        (Re)load all of the type definitions from the database.
+        @return: tuple of the type ids in database order and a map of type id
+                 to type definition
+        @rtype:  tuple
+        """
+        self._lock.acquire()
+        try:
+            type_ids = []
+            by_id = {}
+            for type_def in ContentType.get_collection().find():
+                type_ids.append(type_def['id'])
+                by_id[type_def['id']] = type_def
+            definitions = (type_ids, by_id)
+            self._definitions = definitions
+            return definitions
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """
+        Drop the cached type definitions; they will be reloaded on next use.
+        """
+        self._lock.acquire()
+        try:
+            self._definitions = None
+        finally:
+            self._lock.release()
+
+    def reset_statistics(self):
+        """
+        Zero the hit and miss counters.
+        """
+        self.hits = 0
+        self.misses = 0
+
+    def statistics(self):
+        """
+        @return: dict of the hit and miss counters and the number of cached types
+        @rtype:  dict
+        """
+        definitions = self._definitions
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': definitions is not None and len(definitions[0]) or 0}
+
+    def all_definitions(self):
+        """
+        @return: all type definitions in database order; these are the cache's
+                 own copies and must not be modified
+        @rtype:  list
+        """
+        definitions = self._definitions
+        if definitions is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            definitions = self.load()
+        type_ids, by_id = definitions
+        return [by_id[t] for t in type_ids]
+
+    def definition(self, type_id):
+        """
+        @param type_id: unique type id
+        @type  type_id: str
+        @return: the type definition for the given type, None if there is no
+                 such type; this is the cache's own copy and must not be modified
+        @rtype:  SON or None
+        """
+        definitions = self._definitions
+        if definitions is not None and type_id in definitions[1]:
+            self.hits += 1
+            return definitions[1][type_id]
+        self.misses += 1
+        if definitions is None:
+            return self.load()[1].get(type_id)
+        type_def = ContentType.get_collection().find_one({'id': type_id})
+        if type_def is not None:
+            # copy on write so concurrent readers never see the map change
+            self._lock.acquire()
+            try:
+                if self._definitions is definitions:
+                    type_ids, by_id = definitions
+                    by_id = dict(by_id)
+                    by_id[type_id] = type_def
+                    self._definitions = (type_ids + [type_id], by_id)
+            finally:
+                self._lock.release()
+        return type_def
+
+
+TYPE_DEFINITION_CACHE = TypeDefinitionCache()
+
 # -- public -------------------------------------------------------------------
 
 def update_database(definitions, error_on_missing_definitions=False):
@@ -152,6 +278,25 @@ def clean():
     type_collection = ContentType.get_collection()
     type_collection.remove(safe=True)
 
+    TYPE_DEFINITION_CACHE.invalidate()
+
+
+def load_type_definition_cache():
+    """
+    Load all of the type definitions into the process-wide cache. Called at
+    server start up so the first requests do not pay for the load.
+    """
+    TYPE_DEFINITION_CACHE.load()
+
+
+def type_definition_cache_statistics():
+    """
+    @return: dict of the type definition cache's hit and miss counters and the
+             number of cached types
+    @rtype:  dict
+    """
+    return TYPE_DEFINITION_CACHE.statistics()
+
 
 def type_units_collection(type_id):
     """
@@ -175,11 +320,7 @@ def all_type_ids():
     @rtype:  list of str
     """
 
-    collection = ContentType.get_collection()
-    type_id_son = list(collection.find(fields={'id' : 1}))
-    type_ids = [t['id'] for t in type_id_son]
-
-    return type_ids
+    return [t['id'] for t in TYPE_DEFINITION_CACHE.all_definitions()]
 
 
 def all_type_collection_names():
@@ -204,9 +345,7 @@ def all_type_definitions():
     @rtype:  list of dict
     """
 
-    coll = ContentType.get_collection()
-    types = list(coll.find())
-    return types
+    return copy.deepcopy(TYPE_DEFINITION_CACHE.all_definitions())
 
 
 def type_definition(type_id):
@@ -217,9 +356,7 @@ def type_definition(type_id):
     @return: corresponding type definition, None if not found
     @rtype: SON or None
     """
-    collection = ContentType.get_collection()
-    type_ = collection.find_one({'id': type_id})
-    return type_
+    return copy.deepcopy(TYPE_DEFINITION_CACHE.definition(type_id))
 
 
 def unit_collection_name(type_id):
@@ -246,11 +383,10 @@ def type_units_unit_key(type_id):
              content type collection
     @rtype: list of str or None
     """
-    collection = ContentType.get_collection()
-    type_def = collection.find_one({'id': type_id})
+    type_def = TYPE_DEFINITION_CACHE.definition(type_id)
     if type_def is None:
         return None
-    return type_def['unit_key']
+    return copy.deepcopy(type_def['unit_key'])
 
 # -- private -----------------------------------------------------------------
 
@@ -274,6 +410,9 @@ def _create_or_update_type(type_def):
     # XXX this still causes a potential race condition when 2 users are updating the same type
     content_type_collection.save(content_type, safe=True)
 
+    # the cached definitions are reloaded with this change on next use
+    TYPE_DEFINITION_CACHE.invalidate()
+
 def _update_indexes(type_def, unique):
 
     collection_name = unit_collection_name(type_def.id)
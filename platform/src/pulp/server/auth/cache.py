@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Cache of successfully verified credentials, so that the expensive password
+hashing and certificate verification is not repeated on every request.
+
+Credentials are never stored: entries are keyed by a keyed digest of them,
+using a secret that is randomly generated by, and never leaves, the process.
+Only successful verifications are cached, and entries expire after a fixed
+time to live, so that a credential that is no longer valid is rejected after
+at most that long even if an invalidation is missed.
+"""
+
+import hmac
+import os
+import threading
+import time
+from collections import deque
+
+from pulp.common.util import encode_unicode
+from pulp.server import config as pulp_config
+from pulp.server.compat import digestmod
+
+# authentication cache ---------------------------------------------------------
+
+class AuthenticationCache(object):
+    """
+    Bounded, time to live, cache of verified credentials.
+    When the cache is full, the oldest entries are evicted.
+
+    @ivar max_size: maximum number of cached entries, 0 disables the cache
+    @type max_size: int
+    @ivar ttl: time, in seconds, an entry is valid for, 0 disables the cache
+    @type ttl: float
+    """
+
+    def __init__(self, max_size, ttl):
+        assert max_size >= 0
+        assert ttl >= 0
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.__secret = os.urandom(32)
+        self.__lock = threading.Lock()
+        # key: (expiration time, value, owner)
+        self.__entries = {}
+        # (key, entry) in the order they were cached
+        self.__order = deque()
+
+        # incremented by every invalidation
+        self.__generation = 0
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def key(self, *credentials):
+        """
+        Generate a cache key from the given credentials.
+        @param credentials: strings that together identify the credentials
+        @type  credentials: str or unicode
+        @return: cache key
+        @rtype:  str
+        """
+        message = '\0'.join(encode_unicode(c) for c in credentials)
+        return hmac.new(self.__secret, message, digestmod).hexdigest()
+
+    def generation(self):
+        """
+        Get the cache's current generation, to pass to L{put} along with the
+        result of a verification started after this call.
+        @rtype: int
+        """
+        return self.__generation
+
+    def get(self, key):
+        """
+        Look up the result of a previously verified credential.
+        @param key: cache key returned by L{key}
+        @type  key: str
+        @return: cached result, None if there is none or it has expired
+        """
+        if not self.enabled:
+            return None
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self.__entries[key]
+                entry = None
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            return entry[1]
+        finally:
+            self.__lock.release()
+
+    def put(self, key, value, owner=None, generation=None, expires=None):
+        """
+        Cache the result of a successfully verified credential.
+        @param key: cache key returned by L{key}
+        @type  key: str
+        @param value: result of the verification, must not be None
+        @param owner: user login or consumer id the credential belongs to, used
+                      to invalidate the cached entries of the owner
+        @type  owner: str or None
+        @param generation: cache generation from before the verification, the
+                           result is not cached if the cache has been
+                           invalidated since
+        @type  generation: int or None
+        @param expires: time, in seconds since the epoch, after which the
+                        result is no longer valid, e.g. when the verified
+                        certificate expires; caps the entry's time to live
+        @type  expires: float or None
+        """
+        assert value is not None
+        if not self.enabled:
+            return
+        self.__lock.acquire()
+        try:
+            if generation is not None and generation != self.__generation:
+                return
+            if key not in self.__entries and len(self.__entries) >= self.max_size:
+                self.__evict()
+            expiration = time.time() + self.ttl
+            if expires is not None:
+                expiration = min(expiration, expires)
+            entry = (expiration, value, owner)
+            self.__entries[key] = entry
+            self.__order.append((key, entry))
+            self.__compact()
+        finally:
+            self.__lock.release()
+
+    def invalidate(self, owner=None):
+        """
+        Remove the cached entries of the given owner, or all cached entries if
+        no owner is given.
+        @param owner: user login or consumer id
+        @type  owner: str or None
+        """
+        self.__lock.acquire()
+        try:
+            self.__invalidations += 1
+            self.__generation += 1
+            if owner is None:
+                self.__entries.clear()
+                self.__order.clear()
+                return
+            for key, entry in self.__entries.items():
+                if entry[2] == owner:
+                    del self.__entries[key]
+        finally:
+            self.__lock.release()
+
+    def metrics(self):
+        """
+        Snapshot of the cache's effectiveness.
+        @return: dictionary of the cache's size, maximum size, time to live,
+                 hits, misses, hit rate, evictions and invalidations
+        @rtype:  dict
+        """
+        self.__lock.acquire()
+        try:
+            lookups = self.__hits + self.__misses
+            return {'size': len(self.__entries),
+                    'max_size': self.max_size,
+                    'ttl': self.ttl,
+                    'hits': self.__hits,
+                    'misses': self.__misses,
+                    'hit_rate': lookups and float(self.__hits) / lookups or 0.0,
+                    'evictions': self.__evictions,
+                    'invalidations': self.__invalidations}
+        finally:
+            self.__lock.release()
+
+    def __evict(self):
+        # NOTE must be called with the lock held
+        # entries generally live equally long, so the oldest entries are the
+        # closest to expiring; the order queue also holds entries that have
+        # since been replaced or removed, skip them
+        while len(self.__entries) >= self.max_size and self.__order:
+            key, entry = self.__order.popleft()
+            if self.__entries.get(key) is not entry:
+                continue
+            del self.__entries[key]
+            self.__evictions += 1
+
+    def __compact(self):
+        # NOTE must be called with the lock held
+        if len(self.__order) > 2 * self.max_size:
+            self.__order = deque((k, e) for k, e in self.__order if self.__entries.get(k) is e)
+
+# process-wide cache -----------------------------------------------------------
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def authentication_cache():
+    """
+    Get the process-wide authentication cache, configured by the auth_cache_size
+    and auth_cache_ttl settings of the security section of the configuration.
+    @rtype: L{AuthenticationCache}
+    """
+    global _CACHE
+    if _CACHE is None:
+        _CACHE_LOCK.acquire()
+        try:
+            if _CACHE is None:
+                max_size = pulp_config.config.getint('security', 'auth_cache_size')
+                ttl = pulp_config.config.getfloat('security', 'auth_cache_ttl')
+                _CACHE = AuthenticationCache(max_size, ttl)
+        finally:
+            _CACHE_LOCK.release()
+    return _CACHE
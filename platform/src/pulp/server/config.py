@@ -68,6 +68,7 @@ _default_values = {
         'uninstall_timeout': '10:600',
         'bind_timeout': '2592000:600',
         'unbind_timeout': '2592000:600',
+        'group_fanout_workers': '16',
     },
     'scheduler': {
         'dispatch_interval': '30',
@@ -79,6 +80,8 @@ _default_values = {
         'user_cert_expiration': '7',
         'consumer_cert_expiration': '3650',
         'serial_number_path': '/var/lib/pulp/sn.dat',
+        'auth_cache_size': '10000',
+        'auth_cache_ttl': '300',
     },
     'server': {
         'server_name': socket.gethostname(),
@@ -86,11 +89,20 @@ _default_values = {
         'default_password': 'admin',
         'debugging_mode': 'false',
         'storage_dir': '/var/lib/pulp/',
+        'orphan_file_workers': '4',
     },
     'tasks': {
         'concurrency_threshold': '9',
         'dispatch_interval': '0.5',
         'archived_call_lifetime': '48',
+        'long_task_workers': '9',
+        'short_task_workers': '16',
+        'long_task_actions': 'sync, publish, auto_publish',
+        'scheduling_policy': 'fifo',
+        'priority_classes': 'admin, consumer, publish, sync',
+        'priority_aging_interval': '300',
+        'concurrency_caps': '',
+        'completed_task_cache_budget': '64',
         'consumer_content_weight': '0',
         'create_weight': '0',
         'publish_weight': '1',
@@ -29,6 +29,9 @@ from pulp.server.exceptions import PulpException
 _connection = None
 _database = None
 
+# collection name: PulpCollection instance
+_collections = {}
+
 _log = logging.getLogger(__name__)
 
 # connection api ---------------------------------------------------------------
@@ -38,6 +41,7 @@ def initialize(name=None, seeds=None):
     Initialize the connection pool and top-level database for pulp.
     """
     global _connection, _database
+    reset_collection_cache()
     try:
         if not name:
             name = config.config.get('database', 'name')
@@ -137,12 +141,34 @@ def get_collection(name, create=False):
     """
     Factory function to instantiate PulpConnection objects using configurable
     parameters.
+
+    One instance is created per collection name and shared by all callers;
+    the instances hold no connection state of their own, as the underlying
+    connection pool handles reconnecting, so they remain valid for the life
+    of the database connection.
+
+    @param name: name of the collection
+    @type  name: str
+    @param create: if True, explicitly create the collection in the database
+    @type  create: bool
+    @rtype: L{PulpCollection}
     """
     global _database
     if _database is None:
         raise PulpCollectionFailure(_('Cannot get collection from uninitialized database'))
-    retries = config.config.getint('database', 'operation_retries')
-    return PulpCollection(_database, name, retries=retries, create=create)
+    collection = _collections.get(name)
+    if collection is None or create:
+        retries = config.config.getint('database', 'operation_retries')
+        collection = PulpCollection(_database, name, retries=retries, create=create)
+        _collections[name] = collection
+    return collection
+
+
+def reset_collection_cache():
+    """
+    Forget all of the cached collection instances.
+    """
+    _collections.clear()
 
 def database():
     """
@@ -18,6 +18,8 @@ import sys
 from pulp.plugins.loader.api import load_content_types
 from pulp.server.db import connection
 from pulp.server.db.migrate import models
+from pulp.server.db.model import (
+    auth, base, consumer, content, dispatch, event, repo_group, repository)
 from pulp.server import config
 
 
@@ -92,6 +94,15 @@ def migrate_database(options):
             logger.critical(''.join(traceback.format_exception(*sys.exc_info())))
 
 
+def ensure_database_indices():
+    """
+    Ensure the indices of every data model's document collection, so the
+    server does not have to build them when it first uses the collection.
+    """
+    for model_class in base.all_models():
+        model_class.ensure_indices()
+
+
 def main():
     """
     This is the high level entry method. It does logging if any Exceptions are raised.
@@ -128,6 +139,14 @@ def _auto_manage_db(options):
     print message
     logger.info(message)
 
+    message = _('Ensuring database indexes.')
+    print message
+    logger.info(message)
+    ensure_database_indices()
+    message = _('Database indexes ensured.')
+    print message
+    logger.info(message)
+
     message = _('Loading content types.')
     print message
     logger.info(message)
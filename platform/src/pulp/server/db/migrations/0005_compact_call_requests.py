@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import logging
+
+from pulp.server.db.model.dispatch import ArchivedCall, QueuedCall, ScheduledCall
+from pulp.server.dispatch import pickling
+from pulp.server.dispatch.call import CallRequest
+
+
+_LOG = logging.getLogger(__name__)
+
+
+def migrate(*args, **kwargs):
+    """
+    Re-serializes the pickled call requests stored by the queued, scheduled and
+    archived calls in the current, compact, call request format. Call requests
+    that can no longer be unpickled are left as they are; the migration is
+    idempotent.
+    """
+    pickling.initialize()
+    for model in (QueuedCall, ScheduledCall, ArchivedCall):
+        _migrate_collection(model.get_collection())
+
+
+def _migrate_collection(collection):
+    query = {'serialized_call_request': {'$ne': None},
+             'serialized_call_request.format_version': {'$exists': False}}
+    for document in collection.find(query, fields=['serialized_call_request']):
+        call_request = CallRequest.deserialize(document['serialized_call_request'])
+        serialized_call_request = call_request and call_request.serialize()
+        if serialized_call_request is None:
+            _LOG.warn('Leaving call request in %s document %s in the pickled format' %
+                      (collection.name, document['_id']))
+            continue
+        collection.update({'_id': document['_id']},
+                          {'$set': {'serialized_call_request': serialized_call_request}},
+                          safe=True)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+from pulp.server.db.model.consumer import UnitProfile
+
+
+def migrate(*args, **kwargs):
+    """
+    Stores the canonical content hash of each unit profile that does not yet
+    have one. The migration is idempotent.
+    """
+    collection = UnitProfile.get_collection()
+    query = {'profile_hash': {'$exists': False}}
+    for profile in collection.find(query, fields=['profile']):
+        profile_hash = UnitProfile.calculate_hash(profile['profile'])
+        collection.update({'_id': profile['_id']},
+                          {'$set': {'profile_hash': profile_hash}},
+                          safe=True)
@@ -77,23 +77,35 @@ class Model(dict):
     # database collection methods ---------------------------------------------
 
     @classmethod
-    def _get_collection_from_db(cls):
-        # ensure the indices in the document collection
+    def ensure_indices(cls):
+        """
+        Ensure the unique and search indices of this data model exist in its
+        document collection.
+        """
+        # indices are either tuples or strings,
+        # tuples are 'unique together' if unique is True
         def _ensure_indices(collection, indices, unique):
-            # indices are either tuples or strings,
-            # tuples are 'unique together' if unique is True
             for index in indices:
                 if isinstance(index, basestring):
                     index = (index,)
                 # we're using descending ordering for the arbitrary case,
                 # if you need a particular ordering, override the
-                # _get_collection_from_db method
+                # ensure_indices method
                 collection.ensure_index([(i, DESCENDING) for i in index],
                                         unique=unique, background=True)
-        # create the collection and ensure the unique and other indices
         collection = get_collection(cls.collection_name)
         _ensure_indices(collection, cls.unique_indices, True)
         _ensure_indices(collection, cls.search_indices, False)
+
+    @classmethod
+    def _get_collection_from_db(cls):
+        # the collection handle is cached by the connection module, ensure the
+        # indices only the first time a given handle is seen; resetting the
+        # connection's cache causes the indices to be ensured again
+        collection = get_collection(cls.collection_name)
+        if _INDEXED_COLLECTIONS.get(cls) is not collection:
+            cls.ensure_indices()
+            _INDEXED_COLLECTIONS[cls] = collection
         return collection
 
     @classmethod
@@ -107,6 +119,11 @@ class Model(dict):
     def get_collection(cls):
         """
         Get the document collection for this data model.
+
+        The collection handle is shared by every call in the process and the
+        model's indices are only ensured the first time it is requested; both
+        are forgotten by pulp.server.db.connection.reset_collection_cache.
+
         @rtype: pymongo.collection.Collection instance or None
         @return: the document collection if associated with one, None otherwise
         """
@@ -115,5 +132,25 @@ class Model(dict):
         # collection_name
         if cls.collection_name is None:
             return None
-        # removed cached connections to handle AutoReconnect exception
         return cls._get_collection_from_db()
+
+# collection cache -------------------------------------------------------------
+
+# model class: collection handle the model's indices were last ensured on
+_INDEXED_COLLECTIONS = {}
+
+
+def all_models(model_class=Model):
+    """
+    @param model_class: model class to search beneath
+    @type  model_class: type
+    @return: list of all the loaded subclasses of the given model class that
+             are associated with a document collection
+    @rtype:  list of type
+    """
+    models = []
+    for subclass in model_class.__subclasses__():
+        if subclass.collection_name is not None:
+            models.append(subclass)
+        models.extend(all_models(subclass))
+    return models
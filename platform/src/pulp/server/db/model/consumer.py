@@ -15,6 +15,7 @@ import datetime
 
 from pulp.server.db.model.base import Model
 from pulp.common import dateutils
+from pulp.common import util
 
 # -- classes -----------------------------------------------------------------
 
@@ -138,6 +139,8 @@ class UnitProfile(Model):
     @type content_type: str
     @ivar profile: The stored profile.
     @type profile: dict
+    @ivar profile_hash: The canonical content hash of the profile.
+    @type profile_hash: str
     """
 
     collection_name = 'consumer_unit_profiles'
@@ -145,7 +148,7 @@ class UnitProfile(Model):
         ('consumer_id', 'content_type'),
     )
 
-    def __init__(self, consumer_id, content_type, profile):
+    def __init__(self, consumer_id, content_type, profile, profile_hash=None):
         """
         @param consumer_id: A consumer ID.
         @type consumer_id: str
@@ -153,11 +156,80 @@ class UnitProfile(Model):
         @type content_type: str
         @param profile: The stored profile.
         @type profile: dict
+        @param profile_hash: The canonical content hash of the profile.
+            Calculated when not specified.
+        @type profile_hash: str
         """
         super(UnitProfile, self).__init__()
         self.consumer_id = consumer_id
         self.content_type = content_type
         self.profile = profile
+        if profile_hash is None:
+            profile_hash = self.calculate_hash(profile)
+        self.profile_hash = profile_hash
+
+    @staticmethod
+    def calculate_hash(profile):
+        """
+        Calculate the canonical content hash of a profile.
+        @param profile: A unit profile.
+        @type profile: object
+        @return: The hash.
+        @rtype: str
+        """
+        return util.profile_hash(profile)
+
+
+class CachedApplicability(Model):
+    """
+    Represents the cached applicability of all of the units of a type in a set
+    of repos to consumers with the same profiles.
+    @ivar key: uniquely identifies the profiles, repos and unit type.
+    @type key: str
+    @ivar consumer_id: The consumer the applicability was last determined for.
+    @type consumer_id: str
+    @ivar profile_hash: Hash of all the profiles of the consumer.
+    @type profile_hash: str
+    @ivar repo_ids: The sorted list of repo IDs.
+    @type repo_ids: list
+    @ivar unit_type_id: The unit type ID.
+    @type unit_type_id: str
+    @ivar reports: The encoded applicability reports, None until determined.
+    @type reports: list
+    @ivar stale: Indicates the profiles or repos have changed since the
+                 reports were determined.
+    @type stale: bool
+    @ivar refresh_token: Identifies the pending determination of the reports,
+                         reset when the entry is invalidated.
+    @type refresh_token: str
+    """
+
+    collection_name = 'consumer_applicability_cache'
+    unique_indices = ('key',)
+    search_indices = ('repo_ids', 'consumer_id', 'stale')
+
+    def __init__(self, key, consumer_id, profile_hash, repo_ids, unit_type_id):
+        """
+        @param key: uniquely identifies the profiles, repos and unit type.
+        @type key: str
+        @param consumer_id: The consumer the applicability is determined for.
+        @type consumer_id: str
+        @param profile_hash: Hash of all the profiles of the consumer.
+        @type profile_hash: str
+        @param repo_ids: The sorted list of repo IDs.
+        @type repo_ids: list
+        @param unit_type_id: The unit type ID.
+        @type unit_type_id: str
+        """
+        super(CachedApplicability, self).__init__()
+        self.key = key
+        self.consumer_id = consumer_id
+        self.profile_hash = profile_hash
+        self.repo_ids = repo_ids
+        self.unit_type_id = unit_type_id
+        self.reports = None
+        self.stale = True
+        self.refresh_token = None
 
 
 class ConsumerHistoryEvent(Model):
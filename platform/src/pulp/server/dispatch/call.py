@@ -23,6 +23,7 @@ from pulp.common import dateutils
 from pulp.common.util import encode_unicode
 from pulp.server.db.model.auth import User
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import serialization
 from pulp.server.managers import factory as managers_factory
 
 
@@ -189,9 +190,14 @@ class CallRequest(object):
 
     # call request serialization/deserialization -------------------------------
 
+    # version of the serialized format, the original format had no version and
+    # pickled all of the non-copied fields
+    serialization_format_version = 2
+
     copied_fields = ('id', 'group_id', 'schedule_id', 'tags', 'resources', 'weight', 'asynchronous', 'archive')
-    pickled_fields = ('call', 'args', 'kwargs', 'principal', 'execution_hooks', 'control_hooks')
-    all_fields = itertools.chain(copied_fields, pickled_fields)
+    encoded_fields = ('call', 'args', 'kwargs', 'principal', 'execution_hooks', 'control_hooks')
+    pickled_fields = encoded_fields # version 1
+    all_fields = itertools.chain(copied_fields, encoded_fields)
 
     def serialize(self):
         """
@@ -200,20 +206,27 @@ class CallRequest(object):
         @rtype: dict
         """
 
-        data = {'callable_name': self.callable_name()}
+        data = {'callable_name': self.callable_name(),
+                'format_version': self.serialization_format_version}
 
         for field in self.copied_fields:
             data[field] = getattr(self, field)
 
-        for field in self.pickled_fields:
-            try:
-                data[field] = pickle.dumps(getattr(self, field))
+        try:
+            data['call'] = serialization.encode_callable(self.call)
+            data['args'] = serialization.encode_value(self.args)
+            data['kwargs'] = serialization.encode_value(self.kwargs)
+            data['principal'] = serialization.encode_principal(self.principal)
+            data['execution_hooks'] = [[serialization.encode_callable(h) for h in hooks]
+                                       for hooks in self.execution_hooks]
+            data['control_hooks'] = [serialization.encode_callable(h) if h is not None else None
+                                     for h in self.control_hooks]
 
-            except Exception, e:
-                msg =_('Exception encountered while pickling: %(f)s') % {'f': field}
-                _LOG.error(msg)
-                _LOG.exception(e)
-                return None
+        except Exception, e:
+            msg =_('Exception encountered while serializing: %(c)s') % {'c': self.callable_name()}
+            _LOG.error(msg)
+            _LOG.exception(e)
+            return None
 
         return data
 
@@ -232,13 +245,26 @@ class CallRequest(object):
 
         constructor_kwargs = dict(data)
         constructor_kwargs.pop('callable_name') # added for search
+        format_version = constructor_kwargs.pop('format_version', 1)
 
         for key, value in constructor_kwargs.items():
             constructor_kwargs[encode_unicode(key)] = constructor_kwargs.pop(key)
 
         try:
-            for field in cls.pickled_fields:
-                constructor_kwargs[field] = pickle.loads(data[field].encode('ascii'))
+            if format_version == 1:
+                for field in cls.pickled_fields:
+                    constructor_kwargs[field] = pickle.loads(data[field].encode('ascii'))
+
+            else:
+                constructor_kwargs['call'] = serialization.decode_callable(data['call'])
+                constructor_kwargs['args'] = serialization.decode_value(data['args'])
+                kwargs = serialization.decode_value(data['kwargs'])
+                constructor_kwargs['kwargs'] = dict((encode_unicode(k), v) for k, v in kwargs.items())
+                constructor_kwargs['principal'] = serialization.decode_principal(data['principal'])
+                constructor_kwargs['execution_hooks'] = [[serialization.decode_callable(h) for h in hooks]
+                                                         for hooks in data['execution_hooks']]
+                constructor_kwargs['control_hooks'] = [serialization.decode_callable(h) if h is not None else None
+                                                       for h in data['control_hooks']]
 
         except Exception, e:
             _LOG.exception(e)
@@ -13,8 +13,9 @@
 
 import copy
 import datetime
+import itertools
 import logging
-import time
+import threading
 import types
 import uuid
 from gettext import gettext as _
@@ -25,8 +26,11 @@ from pulp.server.db.model.dispatch import QueuedCall, CallResource
 from pulp.server.dispatch import constants as dispatch_constants
 from pulp.server.dispatch import exceptions as dispatch_exceptions
 from pulp.server.dispatch import factory as dispatch_factory
+from pulp.server.dispatch import history as dispatch_history
+from pulp.server.dispatch import serialization
 from pulp.server.dispatch.call import CallRequest
 from pulp.server.dispatch.task import AsyncTask, Task
+from pulp.server.dispatch.writebehind import WriteBehindQueue
 from pulp.server.exceptions import OperationTimedOut
 from pulp.server.util import subdict, TopologicalSortError, topological_sort
 
@@ -45,14 +49,19 @@ class Coordinator(object):
     """
     Coordinator class that runs call requests in the task queue and detects and
     resolves conflicting operations on resources.
-    @ivar task_state_poll_interval: sleep interval to use while polling a "synchronous" task
+    @ivar task_state_poll_interval: no longer used; threads waiting on a
+                                    "synchronous" task are woken by the task's
+                                    state changes
     @type task_state_poll_interval: float
+    @ivar call_resource_table: in-memory table of the resources held by queued
+                               call requests
+    @type call_resource_table: L{CallResourceTable}
     """
 
     def __init__(self, task_state_poll_interval=0.5):
 
         self.task_state_poll_interval = task_state_poll_interval
-        self.call_resource_collection = CallResource.get_collection()
+        self.call_resource_table = CALL_RESOURCE_TABLE
 
     # explicit initialization --------------------------------------------------
 
@@ -62,9 +71,12 @@ class Coordinator(object):
         interrupted tasks.
         """
         # drop all previous knowledge of previous calls
-        self.call_resource_collection.remove(safe=True)
+        self.call_resource_table.clear()
 
         # re-start interrupted tasks
+        # NOTE the queued calls of dequeued tasks are removed in the background;
+        # make sure none of them are mistaken for interrupted tasks
+        dispatch_factory._task_queue().flush_queued_call_removals()
         queued_call_collection = QueuedCall.get_collection()
         queued_call_list = list(queued_call_collection.find().sort('timestamp'))
         queued_call_collection.remove(safe=True)
@@ -111,7 +123,7 @@ class Coordinator(object):
         if not isinstance(task, AsyncTask) and task.call_report.response is dispatch_constants.CALL_ACCEPTED_RESPONSE:
             self._run_task(task)
 
-        return copy.copy(task.call_report)
+        return copy.copy(task_call_report(task))
 
     def execute_call_synchronously(self, call_request, call_report=None, timeout=None):
         """
@@ -139,7 +151,7 @@ class Coordinator(object):
         if task.call_report.response is not dispatch_constants.CALL_REJECTED_RESPONSE:
             self._run_task(task, timeout)
 
-        return copy.copy(task.call_report)
+        return copy.copy(task_call_report(task))
 
     def execute_call_asynchronously(self, call_request, call_report=None):
         """
@@ -245,10 +257,9 @@ class Coordinator(object):
                 return
 
             if call_resource_list:
-                self.call_resource_collection.insert(call_resource_list, safe=True)
+                self.call_resource_table.add(call_resource_list)
 
-            for task in task_list:
-                task_queue.enqueue(task)
+            task_queue.batch_enqueue(task_list)
 
         finally:
             task_queue.unlock()
@@ -268,15 +279,23 @@ class Coordinator(object):
         valid_states.extend(dispatch_constants.CALL_COMPLETE_STATES)
 
         try:
-            wait_for_task(task, valid_states, poll_interval=self.task_state_poll_interval, timeout=timeout)
+            wait_for_task(task, valid_states, timeout=timeout)
 
         except OperationTimedOut:
-            task_queue.dequeue(task) # dequeue or cancel? really need timed out support
+            # a task that has been dispatched, but is still waiting for a
+            # worker, must be cancelled so the worker doesn't start it
+            task_queue.lock()
+            try:
+                if task in task_queue.running_tasks():
+                    task_queue.cancel(task)
+                else:
+                    task_queue.dequeue(task) # dequeue or cancel? really need timed out support
+            finally:
+                task_queue.unlock()
             raise
 
         else:
-            wait_for_task(task, dispatch_constants.CALL_COMPLETE_STATES,
-                          poll_interval=self.task_state_poll_interval)
+            wait_for_task(task, dispatch_constants.CALL_COMPLETE_STATES)
 
     def _generate_call_request_group_id(self):
         """
@@ -337,12 +356,10 @@ class Coordinator(object):
         rejecting_call_requests = set()
         rejecting_reasons = []
 
-        call_resource_collection = CallResource.get_collection()
         call_resources = resource_dict_to_call_resources(resources)
-        or_query = filter_dicts(call_resources, ('resource_type', 'resource_id'))
-        cursor = call_resource_collection.find({'$or': or_query})
+        queued_call_resources = self.call_resource_table.find(call_resources)
 
-        for call_resource in cursor:
+        for call_resource in queued_call_resources:
             proposed_operation = resources[call_resource['resource_type']][call_resource['resource_id']]
             queued_operation = call_resource['operation']
 
@@ -387,20 +404,8 @@ class Coordinator(object):
         @rtype: list
         """
         task_queue = dispatch_factory._task_queue()
-
-        if include_completed:
-            queued_tasks = task_queue.all_tasks()
-        else:
-            queued_tasks = task_queue.incomplete_tasks()
-
-        call_reports = []
-
-        for task in queued_tasks:
-            if task.call_request.id not in call_request_id_list:
-                continue
-            call_reports.append(task.call_report)
-
-        return call_reports
+        tasks = task_queue.get_multiple(call_request_id_list, include_completed)
+        return [task_call_report(t) for t in tasks]
 
     def _find_tasks(self, **criteria):
         """
@@ -426,14 +431,42 @@ class Coordinator(object):
             raise dispatch_exceptions.UnrecognizedSearchCriteria(*list(superfluous_criteria))
 
         tasks = []
-        task_queue = dispatch_factory._task_queue()
 
-        for task in task_queue.all_tasks():
+        for task in self._candidate_tasks(criteria):
             if task_matches_criteria(task, criteria):
                 tasks.append(task)
 
         return tasks
 
+    def _candidate_tasks(self, criteria):
+        """
+        Use the most selective of the task queue's indexes to narrow down the
+        tasks that may match the given criteria.
+        @param criteria: search criteria
+        @type  criteria: dict
+        @return: tasks that need to be tested against the criteria
+        @rtype:  list or iterator
+        """
+        task_queue = dispatch_factory._task_queue()
+
+        if 'call_request_id' in criteria:
+            task = task_queue.get(criteria['call_request_id'])
+            return task is not None and [task] or []
+
+        if 'call_request_id_list' in criteria:
+            return task_queue.get_multiple(criteria['call_request_id_list'])
+
+        if 'call_request_group_id' in criteria:
+            return task_queue.find_by_call_request_group_id(criteria['call_request_group_id'])
+
+        if 'schedule_id' in criteria:
+            return task_queue.find_by_schedule_id(criteria['schedule_id'])
+
+        if criteria.get('tags'):
+            return task_queue.find(*criteria['tags'])
+
+        return task_queue.all_tasks()
+
     def find_call_reports(self, **criteria):
         """
         Find call reports that match the criteria given as key word arguments.
@@ -451,7 +484,7 @@ class Coordinator(object):
          * tags
         """
         tasks = self._find_tasks(**criteria)
-        return [t.call_report for t in tasks]
+        return [task_call_report(t) for t in tasks]
 
     # control methods ----------------------------------------------------------
 
@@ -508,9 +541,7 @@ class Coordinator(object):
         """
         cancel_returns = {}
         task_queue = dispatch_factory._task_queue()
-        for task in task_queue.all_tasks():
-            if call_request_group_id != task.call_request.group_id:
-                continue
+        for task in task_queue.find_by_call_request_group_id(call_request_group_id):
             cancel_returns[task.call_request.id] = task_queue.cancel(task)
         return cancel_returns
 
@@ -596,6 +627,126 @@ def resource_dict_to_call_resources(resource_dict):
             call_resources.append(call_resource)
     return call_resources
 
+# call resource table ----------------------------------------------------------
+
+class CallResourceTable(object):
+    """
+    In-memory table of the resources, and the operations on them, held by the
+    call requests in the task queue, indexed by resource type and id.
+    As only one server process owns the task queue, conflict detection is done
+    entirely against this table. Changes are persisted to the call_resources
+    collection by a background writer thread, in batches, so that the state of
+    the coordinator can be inspected and recovered without the collection
+    being in the conflict detection path.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # (resource_type, resource_id) -> list of call resources
+        self.__resources = {}
+        # call_request_id -> list of (resource_type, resource_id)
+        self.__call_request_resources = {}
+
+        self.__writes = WriteBehindQueue('call-resource-writer', self.__persist)
+
+    # table operations ---------------------------------------------------------
+
+    def add(self, call_resources):
+        """
+        Add call resources to the table.
+        @param call_resources: call resources with their call_request_id set
+        @type  call_resources: list of L{CallResource} instances
+        """
+        self.__lock.acquire()
+        try:
+            for call_resource in call_resources:
+                key = (call_resource['resource_type'], call_resource['resource_id'])
+                self.__resources.setdefault(key, []).append(call_resource)
+                keys = self.__call_request_resources.setdefault(call_resource['call_request_id'], [])
+                keys.append(key)
+        finally:
+            self.__lock.release()
+        self.__writes.put(('insert', call_resources))
+
+    def remove(self, call_request_id):
+        """
+        Remove all of the call resources held by a call request from the table.
+        @param call_request_id: id of the call request
+        @type  call_request_id: str
+        """
+        self.__lock.acquire()
+        try:
+            keys = self.__call_request_resources.pop(call_request_id, [])
+            for key in keys:
+                remaining = [r for r in self.__resources.get(key, [])
+                             if r['call_request_id'] != call_request_id]
+                if remaining:
+                    self.__resources[key] = remaining
+                else:
+                    self.__resources.pop(key, None)
+        finally:
+            self.__lock.release()
+        if keys:
+            self.__writes.put(('remove', [call_request_id]))
+
+    def find(self, call_resources):
+        """
+        Find the call resources in the table held on the same resources as the
+        given call resources.
+        @param call_resources: call resources to find the held resources for
+        @type  call_resources: list of L{CallResource} instances
+        @return: list of held call resources
+        @rtype:  list of L{CallResource} instances
+        """
+        found = []
+        self.__lock.acquire()
+        try:
+            for call_resource in call_resources:
+                key = (call_resource['resource_type'], call_resource['resource_id'])
+                found.extend(self.__resources.get(key, []))
+        finally:
+            self.__lock.release()
+        return found
+
+    def clear(self):
+        """
+        Drop all the call resources from the table and the database.
+        """
+        self.__lock.acquire()
+        try:
+            self.__resources.clear()
+            self.__call_request_resources.clear()
+        finally:
+            self.__lock.release()
+        self.flush()
+        CallResource.get_collection().remove(safe=True)
+
+    def flush(self):
+        """
+        Block until all of the pending changes have been written to the database.
+        """
+        self.__writes.flush()
+
+    # write-behind persistence -------------------------------------------------
+
+    def __persist(self, writes):
+        collection = CallResource.get_collection()
+        # consecutive writes of the same operation are collapsed into a single
+        # database operation, preserving the order of inserts and removes
+        for operation, group in itertools.groupby(writes, lambda w: w[0]):
+            values = []
+            for w in group:
+                values.extend(w[1])
+            if operation == 'insert':
+                collection.insert(values, safe=True)
+            else:
+                collection.remove({'call_request_id': {'$in': values}}, safe=True)
+
+
+# NOTE there is only one task queue per server process, so the call resource
+# table is a process-wide global that is accessible to the dequeue callback
+CALL_RESOURCE_TABLE = CallResourceTable()
+
 # call run utility functions ---------------------------------------------------
 
 def set_call_request_id_on_call_resources(call_request_id, call_resources):
@@ -609,35 +760,67 @@ def set_call_request_id_on_call_resources(call_request_id, call_resources):
         call_resource['call_request_id'] = call_request_id
 
 
-def wait_for_task(task, states, poll_interval=0.5, timeout=None):
+def wait_for_task(task, states, poll_interval=None, timeout=None):
     """
-    Wait for a task to be in a certain set of states
+    Wait for a task to be in a certain set of states.
+    The waiting thread is woken as soon as the task changes state.
     @param task: task to wait for
     @type  task: L{Task}
     @param states: set of valid states
     @type  states: list or tuple
-    @param poll_interval: time, in seconds, to wait in between polling the task
-    @type  poll_interval: float or int
-    @param timeout: maximum amount of time to poll task, None means indefinitely
+    @param poll_interval: if given, maximum time, in seconds, to wait between
+                          checks of the task's state; only needed when the
+                          state may be changed without going through the task
+    @type  poll_interval: None, float or int
+    @param timeout: maximum amount of time to wait for the task, None means indefinitely
     @type  timeout: None or datetime.timedelta
     """
     assert isinstance(task, Task)
     assert isinstance(states, (list, set, tuple))
-    assert isinstance(poll_interval, (float, int))
+    assert isinstance(poll_interval, (types.NoneType, float, int))
     assert isinstance(timeout, (datetime.timedelta, types.NoneType))
 
     start = datetime.datetime.now()
-    while task.call_report.state not in states:
-        time.sleep(poll_interval)
-        if timeout is None:
-            continue
-        now = datetime.datetime.now()
-        if now - start < timeout:
-            continue
-        raise OperationTimedOut(timeout)
+    while True:
+        wait = poll_interval
+        if timeout is not None:
+            remaining = timeout - (datetime.datetime.now() - start)
+            remaining = remaining.days * 86400 + remaining.seconds + remaining.microseconds / 1000000.0
+            if remaining <= 0:
+                if task.call_report.state in states:
+                    return
+                raise OperationTimedOut(timeout)
+            if wait is None or remaining < wait:
+                wait = remaining
+        if task.wait_for_state(states, wait):
+            return
 
 # query utility functions ------------------------------------------------------
 
+def task_call_report(task):
+    """
+    Get a task's call report, restoring the result and progress of the call
+    reports of completed tasks that have been trimmed from the task queue's
+    completed task cache from the archived call.
+    @param task: task to get the call report of
+    @type  task: L{Task}
+    @return: call report
+    @rtype:  L{call.CallReport}
+    """
+    call_report = task.call_report
+    if not task.trimmed:
+        return call_report
+    archived_calls = dispatch_history.find_archived_calls(call_request_id=task.call_request.id)
+    if archived_calls.count() == 0:
+        return call_report
+    serialized_call_report = archived_calls[0]['serialized_call_report']
+    call_report = copy.copy(call_report)
+    # results that are not serialized are neither archived nor trimmed
+    if call_report.serialize_result:
+        call_report.result = serialized_call_report.get('result')
+    call_report.progress = serialized_call_report.get('progress', call_report.progress)
+    return call_report
+
 def task_matches_criteria(task, criteria):
     """
     Test a task to see if it matches the given search criteria.
@@ -682,6 +865,8 @@ def coordinator_dequeue_callback(call_request, call_report):
     @param call_report: call report for the call
     @type  call_report: L{call.CallReport} instance
     """
-    collection = CallResource.get_collection()
-    collection.remove({'call_request_id': call_request.id}, safe=True)
+    CALL_RESOURCE_TABLE.remove(call_request.id)
+
+
+serialization.register_callable('coordinator_dequeue_callback', coordinator_dequeue_callback)
 
@@ -19,6 +19,7 @@ from pulp.server.dispatch import context as dispatch_context
 _COORDINATOR = None
 _SCHEDULER = None
 _TASK_QUEUE = None
+_WORKER_POOLS = None
 
 # initialization ---------------------------------------------------------------
 
@@ -40,20 +41,52 @@ def _initialize_scheduler():
     _SCHEDULER.start()
 
 
+def _scheduling_policy():
+    from pulp.server.dispatch import policy
+    policy_name = pulp_config.config.get('tasks', 'scheduling_policy')
+    if policy_name == 'fifo':
+        return policy.FIFOPolicy()
+    if policy_name != 'priority':
+        raise ValueError('Unknown task scheduling policy: %s' % policy_name)
+    priority_classes = pulp_config.config.get('tasks', 'priority_classes')
+    priority_classes = [c.strip() for c in priority_classes.split(',') if c.strip()]
+    aging_interval = pulp_config.config.getfloat('tasks', 'priority_aging_interval')
+    concurrency_caps = policy.parse_concurrency_caps(pulp_config.config.get('tasks', 'concurrency_caps'))
+    return policy.PriorityPolicy(priority_classes, concurrency_caps, aging_interval)
+
+
 def _initialize_task_queue():
     global _TASK_QUEUE
     assert _TASK_QUEUE is None
     from pulp.server.dispatch.taskqueue import TaskQueue
     concurrency_threshold = pulp_config.config.getint('tasks', 'concurrency_threshold')
     dispatch_interval = pulp_config.config.getfloat('tasks', 'dispatch_interval')
-    _TASK_QUEUE = TaskQueue(concurrency_threshold, dispatch_interval)
+    scheduling_policy = _scheduling_policy()
+    # megabytes in the configuration, 0 means unlimited
+    completed_task_cache_budget = pulp_config.config.getfloat('tasks', 'completed_task_cache_budget')
+    completed_task_cache_budget = int(completed_task_cache_budget * 1024 * 1024) or None
+    _TASK_QUEUE = TaskQueue(concurrency_threshold, dispatch_interval,
+                            scheduling_policy=scheduling_policy,
+                            completed_task_cache_budget=completed_task_cache_budget)
     _TASK_QUEUE.start()
 
 
+def _initialize_worker_pools():
+    global _WORKER_POOLS
+    assert _WORKER_POOLS is None
+    from pulp.server.dispatch.pool import TaskWorkerPools
+    long_workers = pulp_config.config.getint('tasks', 'long_task_workers')
+    short_workers = pulp_config.config.getint('tasks', 'short_task_workers')
+    long_actions = pulp_config.config.get('tasks', 'long_task_actions')
+    long_actions = [a.strip() for a in long_actions.split(',') if a.strip()]
+    _WORKER_POOLS = TaskWorkerPools(long_workers, short_workers, long_actions)
+
+
 def initialize():
     # order sensitive
     from pulp.server.dispatch import pickling
     pickling.initialize()
+    _initialize_worker_pools()
     _initialize_task_queue()
     _initialize_coordinator()
     _initialize_scheduler()
@@ -63,6 +96,7 @@ def initialize():
 def _finalize_coordinator():
     global _COORDINATOR
     assert _COORDINATOR is not None
+    _COORDINATOR.call_resource_table.flush()
     _COORDINATOR = None
 
 
@@ -80,6 +114,13 @@ def _finalize_task_queue(clear_queued_calls):
     _TASK_QUEUE = None
 
 
+def _finalize_worker_pools():
+    global _WORKER_POOLS
+    assert _WORKER_POOLS is not None
+    _WORKER_POOLS.stop()
+    _WORKER_POOLS = None
+
+
 def finalize(clear_queued_calls=False):
     # NOTE this is not required for the pulp server, but is for unit testing
     # order sensitive
@@ -87,6 +128,7 @@ def finalize(clear_queued_calls=False):
     _finalize_scheduler()
     _finalize_coordinator()
     _finalize_task_queue(clear_queued_calls)
+    _finalize_worker_pools()
 
 # factory functions ------------------------------------------------------------
 
@@ -129,3 +171,23 @@ def _task_queue():
     """
     assert _TASK_QUEUE is not None
     return _TASK_QUEUE
+
+
+def _worker_pools():
+    """
+    Dispatch worker pools factory. Returns the current task worker pools.
+    NOTE: this should not be used outside of the dispatch package
+    @return: worker pools for running tasks or None if not initialized
+    @rtype:  L{pulp.server.dispatch.pool.TaskWorkerPools} or None
+    """
+    return _WORKER_POOLS
+
+
+def worker_pool_utilization():
+    """
+    Utilization of the task worker pools, for sizing the pools.
+    @return: utilization of each of the worker pool lanes, keyed by lane name
+    @rtype:  dict
+    """
+    assert _WORKER_POOLS is not None
+    return _WORKER_POOLS.utilization()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Scheduling policies used by the task queue to pick which of the waiting tasks
+to run when concurrency becomes available.
+"""
+
+from datetime import datetime
+
+from pulp.common import dateutils
+from pulp.common.tags import action_tag
+
+# priority classes -------------------------------------------------------------
+
+ADMIN_CLASS = 'admin'
+CONSUMER_CLASS = 'consumer'
+PUBLISH_CLASS = 'publish'
+SYNC_CLASS = 'sync'
+
+# action tags of the calls in each priority class; calls that are not tagged
+# with any of these actions are considered administrative calls
+PRIORITY_CLASS_ACTIONS = {
+    CONSUMER_CLASS: ('unit_install', 'unit_update', 'unit_uninstall',
+                     'scheduled_unit_install', 'scheduled_unit_update',
+                     'scheduled_unit_uninstall', 'bind', 'unbind', 'agent_bind',
+                     'agent_unbind', 'delete_binding', 'profile_create',
+                     'profile_update'),
+    PUBLISH_CLASS: ('publish', 'auto_publish'),
+    SYNC_CLASS: ('sync',),
+}
+
+# default order of the priority classes, highest priority first
+DEFAULT_PRIORITY_CLASSES = (ADMIN_CLASS, CONSUMER_CLASS, PUBLISH_CLASS, SYNC_CLASS)
+
+# fifo policy ------------------------------------------------------------------
+
+class FIFOPolicy(object):
+    """
+    First in, first out scheduling policy.
+    Walks the waiting tasks in the order they were enqueued, running every
+    unblocked task whose weight fits in the available concurrency.
+    """
+
+    def ready_tasks(self, waiting_tasks, running_tasks, available_weight, now=None):
+        """
+        Select the waiting tasks to run.
+        @param waiting_tasks: waiting tasks, in the order they were enqueued
+        @type  waiting_tasks: list of L{pulp.server.dispatch.task.Task}
+        @param running_tasks: tasks that are currently running
+        @type  running_tasks: list of L{pulp.server.dispatch.task.Task}
+        @param available_weight: concurrency weight available for new tasks
+        @type  available_weight: int
+        @param now: current time, defaults to the current utc time
+        @type  now: None or datetime.datetime
+        @return: tasks to run
+        @rtype:  list of L{pulp.server.dispatch.task.Task}
+        """
+        tasks = []
+        for task in waiting_tasks:
+            if task.call_request.dependencies:
+                continue
+            if task.call_request.weight > available_weight:
+                continue
+            available_weight -= task.call_request.weight
+            tasks.append(task)
+        return tasks
+
+# priority policy --------------------------------------------------------------
+
+class PriorityPolicy(FIFOPolicy):
+    """
+    Priority scheduling policy.
+    Waiting tasks are run in order of their priority class, derived from their
+    call request tags, and in the order they were enqueued within a class.
+    Tasks are promoted one class for every aging interval they have been
+    waiting, up to the highest class, where they still yield to the tasks that
+    belong to that class. A task that has been waiting long enough to be
+    promoted past the highest class is starving: if it does not fit in the
+    available concurrency, it reserves it and no other weighted tasks behind it
+    are run until it has. Tags may also be capped to a maximum number of
+    concurrently running tasks.
+
+    @ivar priority_classes: priority class names, highest priority first
+    @type priority_classes: list of str
+    @ivar concurrency_caps: maximum number of running tasks per tag
+    @type concurrency_caps: dict
+    @ivar aging_interval: seconds a task waits to be promoted a class, None
+                          or 0 disables aging
+    @type aging_interval: None or float
+    """
+
+    def __init__(self, priority_classes=DEFAULT_PRIORITY_CLASSES, concurrency_caps=None, aging_interval=None):
+        self.priority_classes = list(priority_classes)
+        self.concurrency_caps = dict(concurrency_caps or {})
+        self.aging_interval = aging_interval
+
+        # action tag: priority, unlisted classes get the lowest priority
+        self.__tag_priorities = {}
+        for priority_class, actions in PRIORITY_CLASS_ACTIONS.items():
+            priority = self.class_priority(priority_class)
+            for action in actions:
+                self.__tag_priorities[action_tag(action)] = priority
+
+    def class_priority(self, priority_class):
+        """
+        @return: priority of a priority class, lower is higher priority
+        @rtype:  int
+        """
+        if priority_class in self.priority_classes:
+            return self.priority_classes.index(priority_class)
+        return len(self.priority_classes)
+
+    def task_priority(self, task):
+        """
+        @return: priority of a task's class, lower is higher priority
+        @rtype:  int
+        """
+        priorities = [self.__tag_priorities[t] for t in task.call_request.tags
+                      if t in self.__tag_priorities]
+        if not priorities:
+            return self.class_priority(ADMIN_CLASS)
+        return min(priorities)
+
+    def effective_priority(self, task, now):
+        """
+        @return: priority of a task after aging, lower is higher priority;
+                 negative for starving tasks
+        @rtype:  int
+        """
+        priority = self.task_priority(task)
+        if not self.aging_interval or task.enqueue_time is None:
+            return priority
+        waiting = now - task.enqueue_time
+        waiting = waiting.days * 86400 + waiting.seconds + waiting.microseconds / 1000000.0
+        return priority - int(waiting / self.aging_interval)
+
+    def ready_tasks(self, waiting_tasks, running_tasks, available_weight, now=None):
+        now = now or datetime.now(dateutils.utc_tz())
+
+        running_counts = dict.fromkeys(self.concurrency_caps, 0)
+        for task in running_tasks:
+            for tag in task.call_request.tags:
+                if tag in running_counts:
+                    running_counts[tag] += 1
+
+        candidates = []
+        for position, task in enumerate(waiting_tasks):
+            if task.call_request.dependencies:
+                continue
+            priority = self.effective_priority(task, now)
+            candidates.append((max(priority, 0), self.task_priority(task), position, task))
+        candidates.sort()
+
+        tasks = []
+        reserved = False
+        for priority, class_priority, position, task in candidates:
+            weight = task.call_request.weight
+            capped_tags = [t for t in task.call_request.tags if t in running_counts]
+            if [t for t in capped_tags if running_counts[t] >= self.concurrency_caps[t]]:
+                continue
+            if weight > available_weight or (reserved and weight > 0):
+                # a starving task keeps the weight it is waiting for from
+                # being taken by the tasks behind it
+                if self.effective_priority(task, now) < 0:
+                    reserved = True
+                continue
+            available_weight -= weight
+            for tag in capped_tags:
+                running_counts[tag] += 1
+            tasks.append(task)
+        return tasks
+
+# utility functions ------------------------------------------------------------
+
+def parse_concurrency_caps(value):
+    """
+    Parse concurrency caps from a comma separated list of tag=maximum pairs.
+    @param value: string to parse
+    @type  value: str
+    @return: maximum number of running tasks per tag
+    @rtype:  dict
+    @raise ValueError: if the string is malformed
+    """
+    caps = {}
+    for pair in value.split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        tag, maximum = pair.rsplit('=', 1)
+        caps[tag.strip()] = int(maximum)
+    return caps
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import logging
+import Queue
+import threading
+from gettext import gettext as _
+
+from pulp.common import tags
+
+
+_LOG = logging.getLogger(__name__)
+
+# lanes ------------------------------------------------------------------------
+
+LONG_LANE = 'long'
+SHORT_LANE = 'short'
+
+# worker pool ------------------------------------------------------------------
+
+class WorkerPool(object):
+    """
+    Bounded pool of re-usable daemon worker threads.
+    Worker threads are started lazily, as work is submitted, up to the maximum
+    number of workers; work submitted while all of the workers are busy waits
+    in the pool's queue for the next available worker.
+
+    @ivar name: name of the pool, used for thread names and utilization reports
+    @type name: str
+    @ivar max_workers: maximum number of worker threads
+    @type max_workers: int
+    """
+
+    def __init__(self, name, max_workers):
+        assert max_workers > 0
+
+        self.name = name
+        self.max_workers = max_workers
+
+        self.__lock = threading.Lock()
+        self.__queue = Queue.Queue()
+        self.__workers = []
+        self.__busy = 0
+        self.__outstanding = 0
+        self.__completed = 0
+        self.__exit = False
+
+    # public api ---------------------------------------------------------------
+
+    def submit(self, target, *args, **kwargs):
+        """
+        Submit a callable to be run by one of the pool's worker threads.
+        @param target: callable to run
+        @type  target: callable
+        """
+        self.__lock.acquire()
+        try:
+            assert not self.__exit
+            self.__queue.put((target, args, kwargs))
+            # NOTE outstanding work includes work that has been taken off the
+            # queue, but hasn't been marked as busy by a worker yet
+            self.__outstanding += 1
+            if self.__outstanding > len(self.__workers) and len(self.__workers) < self.max_workers:
+                self.__start_worker()
+        finally:
+            self.__lock.release()
+
+    def stop(self):
+        """
+        Stop the pool's worker threads once they have finished the work already
+        submitted to the pool.
+        """
+        self.__lock.acquire()
+        try:
+            self.__exit = True
+            workers = self.__workers[:]
+            for i in range(len(workers)):
+                self.__queue.put(None)
+        finally:
+            self.__lock.release()
+        for worker in workers:
+            worker.join()
+
+    def utilization(self):
+        """
+        Snapshot of the pool's utilization.
+        @return: dictionary of the pool's name, maximum number of workers,
+                 started workers, busy workers, idle workers, queued work and
+                 completed work
+        @rtype:  dict
+        """
+        self.__lock.acquire()
+        try:
+            workers = len(self.__workers)
+            return {'name': self.name,
+                    'max_workers': self.max_workers,
+                    'workers': workers,
+                    'busy': self.__busy,
+                    'idle': workers - self.__busy,
+                    'queued': self.__queue.qsize(),
+                    'completed': self.__completed}
+        finally:
+            self.__lock.release()
+
+    # worker threads -----------------------------------------------------------
+
+    def __start_worker(self):
+        # NOTE must be called with the lock held
+        name = '%s-worker-%d' % (self.name, len(self.__workers))
+        worker = threading.Thread(target=self.__work, name=name)
+        worker.setDaemon(True)
+        self.__workers.append(worker)
+        worker.start()
+
+    def __work(self):
+        while True:
+            work = self.__queue.get()
+            if work is None:
+                break
+            target, args, kwargs = work
+            self.__set_busy(1)
+            try:
+                target(*args, **kwargs)
+            except Exception, e:
+                _LOG.exception(e)
+            self.__set_busy(-1)
+
+    def __set_busy(self, delta):
+        self.__lock.acquire()
+        try:
+            self.__busy += delta
+            if delta < 0:
+                self.__outstanding -= 1
+                self.__completed += 1
+        finally:
+            self.__lock.release()
+
+# lane selection ---------------------------------------------------------------
+
+def task_lane(task, long_actions):
+    """
+    Determine which lane a task should be run in.
+    Tasks tagged with any of the given long running actions are run in the long
+    lane, all others in the short lane.
+    @param task: task to run
+    @type  task: L{pulp.server.dispatch.task.Task}
+    @param long_actions: action names of long running calls
+    @type  long_actions: iterable of str
+    @return: lane name
+    @rtype:  str
+    """
+    for action in long_actions:
+        if tags.action_tag(action) in task.call_request.tags:
+            return LONG_LANE
+    return SHORT_LANE
+
+
+class TaskWorkerPools(object):
+    """
+    Worker pools for running dispatch tasks, split into a lane for long running
+    calls (syncs, publishes, etc.) and a lane for short calls (CRUD operations)
+    so that long running calls cannot starve short ones of worker threads.
+
+    @ivar long_actions: action names of calls to run in the long lane
+    @type long_actions: list of str
+    """
+
+    def __init__(self, long_workers, short_workers, long_actions):
+        self.long_actions = list(long_actions)
+        self.pools = {LONG_LANE: WorkerPool(LONG_LANE, long_workers),
+                      SHORT_LANE: WorkerPool(SHORT_LANE, short_workers)}
+
+    def run(self, task, target):
+        """
+        Run the given target on behalf of the task in the task's lane.
+        @param task: task the target belongs to
+        @type  task: L{pulp.server.dispatch.task.Task}
+        @param target: callable to run
+        @type  target: callable
+        """
+        lane = task_lane(task, self.long_actions)
+        _LOG.debug(_('Running %(t)s in the %(l)s lane') % {'t': str(task), 'l': lane})
+        self.pools[lane].submit(target)
+
+    def stop(self):
+        for pool in self.pools.values():
+            pool.stop()
+
+    def utilization(self):
+        """
+        @return: utilization of each of the lanes, keyed by lane name
+        @rtype:  dict
+        """
+        return dict((lane, pool.utilization()) for lane, pool in self.pools.items())
@@ -26,6 +26,7 @@ from pulp.server.db.model.dispatch import ScheduledCall
 from pulp.server.dispatch import call
 from pulp.server.dispatch import constants as dispatch_constants
 from pulp.server.dispatch import factory as dispatch_factory
+from pulp.server.dispatch import serialization
 from pulp.server.util import subdict
 
 
@@ -594,3 +595,6 @@ def scheduler_complete_callback(call_request, call_report):
     scheduler = dispatch_factory.scheduler()
     scheduler.update_last_run(scheduled_call, call_report)
 
+
+serialization.register_callable('scheduler_complete_callback', scheduler_complete_callback)
+
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Compact, database native encoding of the fields of call requests that used to
+be pickled: callables, arguments, principals and hooks.
+
+Values that mongo can store natively are stored as is. Everything else is
+stored as a dictionary with a CODEC_KEY field naming how it was encoded:
+ * registered callables by their registry name
+ * functions and classes by their import path
+ * bound methods and callable objects by their class's import path, state
+   and method name
+ * the system principal by name
+ * tuples as lists of their items
+ * anything else as a pickle string
+"""
+
+import pickle
+import sys
+import types
+
+from pulp.server.compat import ObjectId
+from pulp.server.managers.auth.user import system
+
+
+CODEC_KEY = '_pulp_codec'
+
+_MAX_INT64 = 2 ** 63 - 1
+_MIN_INT64 = -2 ** 63
+
+# callable registry ------------------------------------------------------------
+
+_REGISTERED_CALLABLES = {}
+_REGISTERED_NAMES = {}
+
+
+def register_callable(name, call):
+    """
+    Register a callable, typically a life cycle callback or control hook, so
+    that call requests refer to it by name when they are serialized.
+    @param name: unique name of the callable
+    @type  name: str
+    @param call: callable to register
+    @type  call: callable
+    """
+    assert callable(call)
+    _REGISTERED_CALLABLES[name] = call
+    _REGISTERED_NAMES[id(call)] = name
+
+
+def registered_callable(name):
+    """
+    @return: callable registered under the given name
+    @rtype:  callable
+    @raise KeyError: if there is no callable registered under the name
+    """
+    return _REGISTERED_CALLABLES[name]
+
+# encoding ---------------------------------------------------------------------
+
+def encode_callable(call):
+    """
+    Encode a callable.
+    @param call: callable to encode
+    @type  call: callable
+    @return: encoded callable
+    @rtype:  dict
+    """
+    name = _REGISTERED_NAMES.get(id(call))
+    if name is not None and _REGISTERED_CALLABLES[name] is call:
+        return {CODEC_KEY: 'registered', 'name': name}
+
+    path = _global_path(call)
+    if path is not None:
+        return {CODEC_KEY: 'global', 'path': path}
+
+    if isinstance(call, types.MethodType) and call.im_self is not None:
+        if isinstance(call.im_self, (type, types.ClassType)):
+            obj = encode_callable(call.im_self)
+        else:
+            obj = _encode_object(call.im_self)
+        if obj[CODEC_KEY] != 'pickle':
+            return {CODEC_KEY: 'method', 'object': obj, 'name': call.im_func.__name__}
+
+    elif not isinstance(call, (types.FunctionType, types.BuiltinFunctionType, types.MethodType)):
+        return _encode_object(call)
+
+    return _encode_pickle(call)
+
+
+def encode_principal(principal):
+    """
+    Encode a call request's principal.
+    @param principal: principal to encode
+    @type  principal: L{pulp.server.db.model.auth.User} instance or dict
+    @return: encoded principal
+    """
+    if isinstance(principal, system.SystemUser):
+        return {CODEC_KEY: 'system_principal'}
+    if type(principal) is not dict:
+        return _encode_object(principal)
+    return encode_value(principal)
+
+
+def encode_value(value):
+    """
+    Encode an arbitrary value, such as a call's positional or keyword arguments.
+    Lists, dicts, strings, numbers, booleans, None and ObjectIds are stored
+    natively; other values are pickled.
+    @param value: value to encode
+    @return: encoded value
+    """
+    value_type = type(value)
+    if value is None or value_type in (bool, int, float, unicode, ObjectId):
+        return value
+    if value_type is long:
+        if _MIN_INT64 <= value <= _MAX_INT64:
+            return value
+        return _encode_pickle(value)
+    if value_type is str:
+        # only valid utf-8 strings can be stored
+        try:
+            value.decode('utf-8')
+        except UnicodeDecodeError:
+            return _encode_pickle(value)
+        return value
+    if value_type is list:
+        return [encode_value(v) for v in value]
+    if value_type is tuple:
+        return {CODEC_KEY: 'tuple', 'items': [encode_value(v) for v in value]}
+    if value_type is dict and _storable_keys(value):
+        return dict((k, encode_value(v)) for k, v in value.items())
+    return _encode_pickle(value)
+
+
+def _storable_keys(d):
+    for key in d:
+        if not isinstance(key, basestring) or key == CODEC_KEY:
+            return False
+        if key.startswith('$') or '.' in key:
+            return False
+    return True
+
+
+def _encode_pickle(value):
+    return {CODEC_KEY: 'pickle', 'value': pickle.dumps(value)}
+
+
+def _encode_object(obj):
+    # objects are stored as their class and state, when their class can be
+    # imported and they use the default or their own getstate/setstate
+    path = _global_path(obj.__class__)
+    if path is None or isinstance(obj, (types.FunctionType, types.MethodType)):
+        return _encode_pickle(obj)
+    # classes with custom reductions keep their state elsewhere
+    for name in ('__reduce__', '__reduce_ex__'):
+        method = getattr(obj.__class__, name, None)
+        if method is not None and method is not getattr(object, name):
+            return _encode_pickle(obj)
+    if '__getstate__' in dir(obj.__class__):
+        state = obj.__getstate__()
+    elif not hasattr(obj, '__dict__') or '__slots__' in dir(obj.__class__):
+        return _encode_pickle(obj)
+    else:
+        state = obj.__dict__
+    encoded = {CODEC_KEY: 'object', 'class': path, 'state': encode_value(state)}
+    if isinstance(obj, dict) and state is obj.__dict__:
+        # models, and other dictionary derivatives, also store their items
+        if not _storable_keys(obj):
+            return _encode_pickle(obj)
+        encoded['items'] = encode_value(dict(obj))
+    return encoded
+
+
+def _global_path(obj):
+    # import path of a module level function or class, if it can be imported
+    if not isinstance(obj, (types.FunctionType, types.BuiltinFunctionType, type, types.ClassType)):
+        return None
+    module_name = getattr(obj, '__module__', None)
+    name = getattr(obj, '__name__', None)
+    if not module_name or not name or name == '<lambda>':
+        return None
+    try:
+        module = _import_module(module_name)
+    except ImportError:
+        return None
+    if getattr(module, name, None) is not obj:
+        return None
+    return ':'.join((module_name, name))
+
+# decoding ---------------------------------------------------------------------
+
+def decode_callable(encoded):
+    """
+    Decode a callable encoded by L{encode_callable}.
+    @param encoded: encoded callable
+    @type  encoded: dict
+    @return: callable
+    @rtype:  callable
+    """
+    return decode_value(encoded)
+
+
+def decode_principal(encoded):
+    """
+    Decode a principal encoded by L{encode_principal}.
+    """
+    return decode_value(encoded)
+
+
+def decode_value(encoded):
+    """
+    Decode a value encoded by any of the encode functions in this module.
+    @param encoded: encoded value
+    @return: decoded value
+    """
+    if isinstance(encoded, list):
+        return [decode_value(v) for v in encoded]
+    if not isinstance(encoded, dict):
+        return encoded
+    if CODEC_KEY not in encoded:
+        return dict((k, decode_value(v)) for k, v in encoded.items())
+
+    codec = encoded[CODEC_KEY]
+    if codec == 'pickle':
+        return pickle.loads(encoded['value'].encode('ascii'))
+    if codec == 'tuple':
+        return tuple(decode_value(v) for v in encoded['items'])
+    if codec == 'registered':
+        return registered_callable(encoded['name'])
+    if codec == 'global':
+        return _import_global(encoded['path'])
+    if codec == 'method':
+        obj = decode_value(encoded['object'])
+        return getattr(obj, encoded['name'])
+    if codec == 'object':
+        return _decode_object(encoded)
+    if codec == 'system_principal':
+        return system.SystemUser()
+    raise ValueError('Unknown encoding: %s' % codec)
+
+
+def _decode_object(encoded):
+    cls = _import_global(encoded['class'])
+    state = decode_value(encoded['state'])
+    if isinstance(cls, types.ClassType):
+        obj = types.InstanceType(cls)
+    else:
+        obj = cls.__new__(cls)
+    if 'items' in encoded:
+        dict.update(obj, decode_value(encoded['items']))
+    if '__setstate__' in dir(cls):
+        obj.__setstate__(state)
+    else:
+        obj.__dict__.update(state)
+    return obj
+
+
+def _import_global(path):
+    module_name, name = path.split(':', 1)
+    module = _import_module(module_name)
+    return getattr(module, name)
+
+
+def _import_module(module_name):
+    module = sys.modules.get(module_name)
+    if module is None:
+        __import__(module_name)
+        module = sys.modules[module_name]
+    return module
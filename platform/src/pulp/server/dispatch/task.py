@@ -16,6 +16,7 @@ import datetime
 import logging
 import sys
 import threading
+import time
 import types
 from gettext import gettext as _
 
@@ -24,6 +25,7 @@ from pulp.server.dispatch import call
 from pulp.server.dispatch import constants as dispatch_constants
 from pulp.server.dispatch import context as dispatch_context
 from pulp.server.dispatch import exceptions as dispatch_exceptions
+from pulp.server.dispatch import factory as dispatch_factory
 from pulp.server.dispatch import history as dispatch_history
 from pulp.server.managers import factory as managers_factory
 
@@ -45,8 +47,16 @@ class Task(object):
     @type call_request_exit_state: None or str
     @ivar queued_call_id: db id for serialized queued call
     @type queued_call_id: str
+    @ivar enqueue_time: time the task was enqueued in the task queue
+    @type enqueue_time: None or datetime.datetime
     @ivar complete_callback: task queue callback called on completion
     @type complete_callback: callable or None
+    @ivar archive_callback: task queue callback called once the completed call
+                            has been archived
+    @type archive_callback: callable or None
+    @ivar trimmed: True if the result and progress have been trimmed from the
+                   call report, in favor of the archived copy
+    @type trimmed: bool
     @ivar progress_callback: call request progress callback called to report execution progress
     @type progress_callback: callable or None
     """
@@ -58,11 +68,17 @@ class Task(object):
 
         self.call_request = call_request
         self.call_report = call_report or call.CallReport.from_call_request(call_request)
-        self.call_report.state = dispatch_constants.CALL_WAITING_STATE
+        self._state_condition = threading.Condition(threading.Lock())
+        # serializes a worker starting the task with the task being cancelled
+        self._start_lock = threading.Lock()
+        self._set_state(dispatch_constants.CALL_WAITING_STATE)
 
         self.call_request_exit_state = None
         self.queued_call_id = None
+        self.enqueue_time = None
         self.complete_callback = None
+        self.archive_callback = None
+        self.trimmed = False
 
     def __str__(self):
         return 'Task %s: %s' % (self.call_request.id, str(self.call_request))
@@ -72,6 +88,48 @@ class Task(object):
             raise TypeError('No comparison defined between task and %s' % type(other))
         return self.call_request.id == other.call_request.id
 
+    # task state ---------------------------------------------------------------
+
+    def _set_state(self, state):
+        """
+        Set the state in the task's call report and wake up any threads waiting
+        on the task's state.
+        @param state: new call state
+        @type  state: str
+        """
+        self._state_condition.acquire()
+        try:
+            self.call_report.state = state
+            self._state_condition.notifyAll()
+        finally:
+            self._state_condition.release()
+
+    def wait_for_state(self, states, timeout=None):
+        """
+        Block until the task's call report is in one of the given states.
+        @param states: set of valid states
+        @type  states: list, set or tuple
+        @param timeout: maximum time, in seconds, to wait; None means indefinitely
+        @type  timeout: None or float
+        @return: True if the task is in one of the states, False if the timeout expired first
+        @rtype:  bool
+        """
+        self._state_condition.acquire()
+        try:
+            if timeout is None:
+                while self.call_report.state not in states:
+                    self._state_condition.wait()
+                return True
+            deadline = time.time() + timeout
+            while self.call_report.state not in states:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._state_condition.wait(remaining)
+            return True
+        finally:
+            self._state_condition.release()
+
     # in-context task control --------------------------------------------------
 
     def _report_progress(self, progress):
@@ -98,21 +156,45 @@ class Task(object):
 
     def run(self):
         """
-        Public wrapper to kick off the call in the call_request in a new thread.
+        Public wrapper to kick off the call in the call_request in a dispatch
+        worker thread, or a new thread if the worker pools are not initialized.
+        A task handed to a worker pool stays in its ready state until a worker
+        actually starts it.
         """
         assert self.call_report.state in dispatch_constants.CALL_READY_STATES
 
-        # NOTE using run wrapper so that state transition is protected by the
-        # task queue lock and doesn't occur in another thread
-        self.call_report.state = dispatch_constants.CALL_RUNNING_STATE
+        worker_pools = dispatch_factory._worker_pools()
 
-        task_thread = threading.Thread(target=self._run)
-        task_thread.start()
+        if worker_pools is None:
+            # NOTE using run wrapper so that state transition is protected by the
+            # task queue lock and doesn't occur in another thread
+            self._set_state(dispatch_constants.CALL_RUNNING_STATE)
+            task_thread = threading.Thread(target=self._run)
+            task_thread.start()
+        else:
+            worker_pools.run(self, self._start)
 
         # I'm fairly certain these will always be called *before* the context
-        # switch to the task_thread
+        # switch to the worker thread
         self.call_life_cycle_callbacks(dispatch_constants.CALL_RUN_LIFE_CYCLE_CALLBACK)
 
+    def _start(self):
+        """
+        Mark the task as running and run the call in the call request, unless
+        the task was cancelled while it waited for a worker.
+        The target of the dispatch worker threads.
+        """
+        self._start_lock.acquire()
+        try:
+            if self.call_report.state not in dispatch_constants.CALL_READY_STATES:
+                _LOG.debug(_('Not starting %(t)s: %(s)s') % {'t': str(self), 's': self.call_report.state})
+                return
+            self._set_state(dispatch_constants.CALL_RUNNING_STATE)
+        finally:
+            self._start_lock.release()
+
+        self._run()
+
     def _run(self):
         """
         Run the call in the call request.
@@ -124,7 +206,7 @@ class Task(object):
 
         # generally set in the wrapper, but not when called directly
         if self.call_report.state in dispatch_constants.CALL_READY_STATES:
-            self.call_report.state = dispatch_constants.CALL_RUNNING_STATE
+            self._set_state(dispatch_constants.CALL_RUNNING_STATE)
 
         self.call_report.start_time = datetime.datetime.now(dateutils.utc_tz())
 
@@ -194,7 +276,7 @@ class Task(object):
         self._call_complete_callback()
 
         # don't set the state to complete in the report until the task is actually complete
-        self.call_report.state = state
+        self._set_state(state)
 
         self.call_life_cycle_callbacks(dispatch_constants.CALL_COMPLETE_LIFE_CYCLE_CALLBACK)
         if not self.call_request.archive:
@@ -203,6 +285,8 @@ class Task(object):
         # archive the completed call
         dispatch_history.archive_call(self.call_request, self.call_report)
 
+        self._call_archive_callback()
+
     def _call_complete_callback(self):
         """
         Safely call the complete_callback, if there is one.
@@ -216,6 +300,19 @@ class Task(object):
         except Exception, e:
             _LOG.exception(e)
 
+    def _call_archive_callback(self):
+        """
+        Safely call the archive_callback, if there is one.
+        """
+        if self.archive_callback is None:
+            return
+
+        try:
+            self.archive_callback(self)
+
+        except Exception, e:
+            _LOG.exception(e)
+
     # callback and hook execution ----------------------------------------------
 
     def call_life_cycle_callbacks(self, key):
@@ -250,24 +347,30 @@ class Task(object):
         # of the task queue lock. If that is not the case, a race condition
         # occurs on the state of the task.
 
-        # a complete task cannot be cancelled
-        if self.call_report.state in dispatch_constants.CALL_COMPLETE_STATES:
-            return None
+        # the start lock keeps a worker from starting the task in between
+        self._start_lock.acquire()
+        try:
+            # a complete task cannot be cancelled
+            if self.call_report.state in dispatch_constants.CALL_COMPLETE_STATES:
+                return None
 
-        # to cancel a running task, the cancel control hook *must* be called
-        if self.call_report.state == dispatch_constants.CALL_RUNNING_STATE:
+            # to cancel a running task, the cancel control hook *must* be called
+            if self.call_report.state == dispatch_constants.CALL_RUNNING_STATE:
 
-            try:
-                self._call_cancel_control_hook()
+                try:
+                    self._call_cancel_control_hook()
 
-            except Exception, e:
-                _LOG.exception(e)
-                return False
+                except Exception, e:
+                    _LOG.exception(e)
+                    return False
 
-        # nothing special needs to happen to cancel a task in a ready state
-        self.call_life_cycle_callbacks(dispatch_constants.CALL_CANCEL_LIFE_CYCLE_CALLBACK)
-        self._complete(dispatch_constants.CALL_CANCELED_STATE)
-        return True
+            # nothing special needs to happen to cancel a task in a ready state,
+            # including one waiting for a worker
+            self.call_life_cycle_callbacks(dispatch_constants.CALL_CANCEL_LIFE_CYCLE_CALLBACK)
+            self._complete(dispatch_constants.CALL_CANCELED_STATE)
+            return True
+        finally:
+            self._start_lock.release()
 
     def _call_cancel_control_hook(self):
         cancel_hook = self.call_request.control_hooks[dispatch_constants.CALL_CANCEL_CONTROL_HOOK]
@@ -304,7 +407,7 @@ class AsyncTask(Task):
 
         # usually set in the wrapper, unless called directly
         if self.call_report.state in dispatch_constants.CALL_READY_STATES:
-            self.call_report.state = dispatch_constants.CALL_RUNNING_STATE
+            self._set_state(dispatch_constants.CALL_RUNNING_STATE)
 
         self.call_report.start_time = datetime.datetime.now(dateutils.utc_tz())
 
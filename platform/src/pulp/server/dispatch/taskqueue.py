@@ -11,22 +11,35 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import copy
 import itertools
 import logging
 import sys
 import threading
 import traceback
+from collections import deque
 from datetime import datetime, timedelta
 from gettext import gettext as _
 
 from pulp.common import dateutils
 from pulp.server.db.model.dispatch import QueuedCall
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch.policy import FIFOPolicy
+from pulp.server.dispatch.writebehind import WriteBehindQueue
 from pulp.server.util import subdict
 
 
 _LOG = logging.getLogger(__name__)
 
+# task positions in the queue, in the order tasks are listed by the query methods
+_COMPLETED = 0
+_RUNNING = 1
+_WAITING = 2
+
+# approximate size, in bytes, above which the result or progress of completed
+# calls that have been archived are trimmed from the completed task cache
+_TRIM_SIZE = 4096
+
 # task queue class -------------------------------------------------------------
 
 class TaskQueue(object):
@@ -34,31 +47,69 @@ class TaskQueue(object):
     TaskQueue class
     Manager and dispatcher of concurrent, asynchronous task execution
 
+    The dispatcher thread sleeps until a task is enqueued, dequeued or
+    completes, as those are the only events that can make a waiting task ready
+    to run, or until the oldest cached completed task expires.
+
     @ivar concurrency_threshold: measurement of total allowed concurrency
     @type concurrency_threshold: int
-    @ivar dispatch_interval: time, in seconds, between checks for ready tasks
+    @ivar dispatch_interval: no longer used; the dispatcher is woken by the
+                             task queue events that can make tasks ready
     @type dispatch_interval: float
     @ivar completed_task_cache_life: time, in seconds, to cache completed tasks
     @type completed_task_cache_life: float
+    @ivar completed_task_cache_budget: approximate maximum size, in bytes, of
+                                       the call reports in the completed task
+                                       cache; the oldest completed tasks are
+                                       evicted early to stay within it, None
+                                       means unlimited
+    @type completed_task_cache_budget: None or int
+    @ivar scheduling_policy: policy selecting the waiting tasks to run
+    @type scheduling_policy: L{pulp.server.dispatch.policy.FIFOPolicy} or subclass
     """
 
     def __init__(self,
                  concurrency_threshold,
                  dispatch_interval=0.5,
-                 completed_task_cache_life=20.0):
+                 completed_task_cache_life=20.0,
+                 scheduling_policy=None,
+                 completed_task_cache_budget=None):
 
         self.concurrency_threshold = concurrency_threshold
         self.dispatch_interval = dispatch_interval
         self.completed_task_cache_life = timedelta(seconds=completed_task_cache_life)
+        self.completed_task_cache_budget = completed_task_cache_budget
+        self.scheduling_policy = scheduling_policy or FIFOPolicy()
 
         self.queued_call_collection = QueuedCall.get_collection()
+        # queued calls are removed from the database in the background, in batches
+        self.__queued_call_removals = WriteBehindQueue('queued-call-remover',
+                                                       self._remove_queued_calls)
 
         self.__waiting_tasks = []
         self.__running_tasks = []
-        self.__completed_tasks = []
+        # completed tasks in the order they completed, which is the order they
+        # expire in; call request id: approximate size of the call report
+        self.__completed_tasks = deque()
+        self.__completed_task_sizes = {}
+        self.__completed_task_cache_size = 0
+
+        # indexes over all of the tasks in the queue, keyed by call request id
+        # the position of a task is a (state, sequence) tuple; sorting tasks by
+        # position lists them in the same order as the task lists above
+        self.__tasks = {}
+        self.__positions = {}
+        self.__sequence = itertools.count()
+        # tag, call request group id and schedule id: set of call request ids
+        self.__tag_index = {}
+        self.__group_index = {}
+        self.__schedule_index = {}
+        # call request id: set of call request ids of waiting tasks dependent on it
+        self.__dependents_index = {}
 
         self.__running_weight = 0
         self.__exit = False
+        self.__dispatch_requested = False
 
         self.__lock = threading.RLock()
         self.__condition = threading.Condition(self.__lock)
@@ -73,11 +124,16 @@ class TaskQueue(object):
         self.__lock.acquire()
         while True:
             try:
-                self.__condition.wait(timeout=self.dispatch_interval)
+                while not (self.__dispatch_requested or self.__exit):
+                    timeout = self._completed_task_cache_timeout()
+                    self.__condition.wait(timeout=timeout)
+                    if timeout is not None:
+                        break
                 if self.__exit:
                     if self.__lock is not None:
                         self.__lock.release()
                     return
+                self.__dispatch_requested = False
                 ready_tasks = self._get_ready_tasks()
                 for task in ready_tasks:
                     self._run_ready_task(task)
@@ -86,25 +142,40 @@ class TaskQueue(object):
                 msg = _('Exception in task queue dispatcher thread:\n%(e)s')
                 _LOG.critical(msg % {'e': traceback.format_exception(*sys.exc_info())})
 
+    def _request_dispatch(self):
+        """
+        Wake the dispatcher thread to look for ready tasks.
+        NOTE: must be called with the lock held
+        """
+        self.__dispatch_requested = True
+        self.__condition.notify()
+
+    def _completed_task_cache_timeout(self):
+        """
+        Time, in seconds, until the oldest task in the completed task cache
+        expires, or None if the cache is empty.
+        NOTE: must be called with the lock held
+        """
+        if not self.__completed_tasks:
+            return None
+        expires = self.__completed_tasks[0].call_report.finish_time + self.completed_task_cache_life
+        remaining = expires - datetime.now(dateutils.utc_tz())
+        # wait at least a little while, as to not spin on an expiring task
+        return max(remaining.days * 86400 + remaining.seconds + remaining.microseconds / 1000000.0, 0.1)
+
     def _get_ready_tasks(self):
         """
         Algorithm at the heart of the task dispatcher. Gets the tasks that are
         ready to run (i.e. not blocked) within the limits of the available
-        concurrency threshold and returns them. Note that this algorithm checks
-        all the tasks as some may have a weight of 0.
+        concurrency threshold, as selected by the scheduling policy, and returns
+        them.
         """
         self.__lock.acquire()
         try:
-            tasks = []
             available_weight = self.concurrency_threshold - self.__running_weight
-            for task in self.__waiting_tasks:
-                if task.call_request.dependencies:
-                    continue
-                if task.call_request.weight > available_weight:
-                    continue
-                available_weight -= task.call_request.weight
-                tasks.append(task)
-            return tasks
+            return self.scheduling_policy.ready_tasks(self.__waiting_tasks,
+                                                      self.__running_tasks,
+                                                      available_weight)
         finally:
             self.__lock.release()
 
@@ -116,6 +187,7 @@ class TaskQueue(object):
         try:
             self.__waiting_tasks.remove(task)
             self.__running_tasks.append(task)
+            self._set_position(task, _RUNNING)
             self.__running_weight += task.call_request.weight
             task.run()
         finally:
@@ -124,15 +196,85 @@ class TaskQueue(object):
     def _purge_completed_task_cache(self):
         """
         Purge expired tasks from the completed tasks cache.
+        NOTE: must be called with the lock held
         """
         expired_cutoff = datetime.now(dateutils.utc_tz()) - self.completed_task_cache_life
-        index = 0 # index of the first non-expired cached task
         # the tasks stored in the cache are in ascending order of finish time
-        for i, task in enumerate(self.__completed_tasks):
-            if task.call_report.finish_time > expired_cutoff:
-                index = i
-                break
-        self.__completed_tasks = self.__completed_tasks[index:]
+        while self.__completed_tasks and self.__completed_tasks[0].call_report.finish_time <= expired_cutoff:
+            self._evict_completed_task()
+
+    def _cache_completed_task(self, task, size):
+        """
+        Add a completed task to the completed tasks cache, evicting the oldest
+        cached tasks if the cache is over its budget.
+        NOTE: must be called with the lock held
+        @param task: task that has completed
+        @type  task: pulp.server.dispatch.task.Task
+        @param size: approximate size of the task's call report
+        @type  size: int
+        """
+        self.__completed_tasks.append(task)
+        self._index_task(task)
+        self._set_position(task, _COMPLETED)
+        self._set_completed_task_size(task, size)
+        if self.completed_task_cache_budget is None:
+            return
+        while len(self.__completed_tasks) > 1 and \
+                self.__completed_task_cache_size > self.completed_task_cache_budget:
+            self._evict_completed_task()
+
+    def _evict_completed_task(self):
+        """
+        Remove the oldest task from the completed tasks cache.
+        NOTE: must be called with the lock held
+        """
+        task = self.__completed_tasks.popleft()
+        self.__completed_task_cache_size -= self.__completed_task_sizes.pop(task.call_request.id, 0)
+        self._unindex_task(task)
+
+    def _set_completed_task_size(self, task, size):
+        """
+        (Re)set the approximate size of a cached completed task.
+        NOTE: must be called with the lock held; the size is calculated
+        beforehand, without the lock, as it walks the whole call report
+        """
+        self.__completed_task_cache_size += size - self.__completed_task_sizes.get(task.call_request.id, 0)
+        self.__completed_task_sizes[task.call_request.id] = size
+
+    def _archived(self, task):
+        """
+        Trim the large result and progress of a cached completed task once its
+        call has been archived, as they can be retrieved from the archived copy.
+        NOTE: This method is used as a callback for the task itself
+        @param task: task that has been archived
+        @type  task: pulp.server.dispatch.task.Task
+        """
+        # the sizes are calculated without the lock, the call report of a
+        # completed task no longer changes
+        original_call_report = task.call_report
+        trim_result = original_call_report.serialize_result and \
+                      _approximate_size(original_call_report.result) > _TRIM_SIZE
+        trim_progress = _approximate_size(original_call_report.progress) > _TRIM_SIZE
+        if not (trim_result or trim_progress):
+            return
+        # the original call report may still be in use by synchronous
+        # callers, trim a copy of it
+        call_report = copy.copy(original_call_report)
+        if trim_result:
+            call_report.result = None
+        if trim_progress:
+            call_report.progress = {}
+        size = _call_report_size(call_report)
+
+        self.__lock.acquire()
+        try:
+            if self._get_state(task) != _COMPLETED or task.call_report is not original_call_report:
+                return
+            task.call_report = call_report
+            task.trimmed = True
+            self._set_completed_task_size(task, size)
+        finally:
+            self.__lock.release()
 
     # queue control methods ----------------------------------------------------
 
@@ -143,6 +285,8 @@ class TaskQueue(object):
         assert self.__dispatcher is None
         self.__lock.acquire()
         self.__exit = False # needed for re-start
+        # pick up any tasks enqueued while the queue was stopped
+        self.__dispatch_requested = True
         try:
             self.__dispatcher = threading.Thread(target=self.__dispatch)
             self.__dispatcher.setDaemon(True)
@@ -161,6 +305,7 @@ class TaskQueue(object):
         self.__lock.release()
         self.__dispatcher.join()
         self.__dispatcher = None
+        self.flush_queued_call_removals()
         if clear_queued_calls:
             self.queued_call_collection.remove(safe=True)
 
@@ -183,12 +328,23 @@ class TaskQueue(object):
         Enqueue multiple tasks so that dependency validation occurs while the
         queue is locked, eliminating race conditions where one task can complete
         before dependent tasks have time to validate their dependencies.
+        The queued calls for all of the tasks are persisted with a single insert.
         @param task_list: list of tasks to enqueue
         @type task_list: list or tuple
         """
         self.__lock.acquire()
         try:
-            map(self.enqueue, task_list)
+            queued_calls = []
+            for task in task_list:
+                queued_call = QueuedCall(task.call_request)
+                task.queued_call_id = queued_call['_id']
+                queued_calls.append(queued_call)
+            # the queued calls are written before the tasks can be run, so
+            # that they are re-run if the server is restarted
+            if queued_calls:
+                self.queued_call_collection.insert(queued_calls, safe=True)
+            for task in task_list:
+                self._enqueue(task)
         finally:
             self.__lock.release()
 
@@ -198,18 +354,26 @@ class TaskQueue(object):
         @param task: task to be run
         @type  task: pulp.server.dispatch.task.Task
         """
-        self.__lock.acquire()
-        try:
-            queued_call = QueuedCall(task.call_request)
-            task.queued_call_id = queued_call['_id']
-            self.queued_call_collection.save(queued_call, safe=True)
-            task.complete_callback = self._complete
-            self._validate_call_request_dependencies(task)
-            self.__waiting_tasks.append(task)
-            task.call_life_cycle_callbacks(dispatch_constants.CALL_ENQUEUE_LIFE_CYCLE_CALLBACK)
-            self.__condition.notify()
-        finally:
-            self.__lock.release()
+        self.batch_enqueue([task])
+
+    def _enqueue(self, task):
+        """
+        Add a task, whose queued call has been persisted, to the task queue.
+        NOTE: must be called with the lock held
+        @param task: task to be run
+        @type  task: pulp.server.dispatch.task.Task
+        """
+        task.enqueue_time = datetime.now(dateutils.utc_tz())
+        task.complete_callback = self._complete
+        task.archive_callback = self._archived
+        self._validate_call_request_dependencies(task)
+        self.__waiting_tasks.append(task)
+        self._index_task(task)
+        self._set_position(task, _WAITING)
+        for call_request_id in task.call_request.dependencies:
+            _add_to_index(self.__dependents_index, call_request_id, task.call_request.id)
+        task.call_life_cycle_callbacks(dispatch_constants.CALL_ENQUEUE_LIFE_CYCLE_CALLBACK)
+        self._request_dispatch()
 
     def _validate_call_request_dependencies(self, task):
         """
@@ -222,10 +386,11 @@ class TaskQueue(object):
         self.__lock.acquire()
         try:
             valid_call_request_dependency_ids = []
-            for potential_blocking_task in itertools.chain(self.__running_tasks, self.__waiting_tasks):
-                if potential_blocking_task.call_request.id not in task.call_request.dependencies:
+            for call_request_id in task.call_request.dependencies:
+                position = self.__positions.get(call_request_id)
+                if position is None or position[0] == _COMPLETED:
                     continue
-                valid_call_request_dependency_ids.append(potential_blocking_task.call_request.id)
+                valid_call_request_dependency_ids.append(call_request_id)
             # DANGER this ignores valid call complete states of dependencies!!
             task.call_request.dependencies = subdict(task.call_request.dependencies, valid_call_request_dependency_ids)
         finally:
@@ -241,17 +406,39 @@ class TaskQueue(object):
         self.__lock.acquire()
         try:
             task.complete_callback = None
-            self.queued_call_collection.remove({'_id': task.queued_call_id}, safe=True)
+            if task.queued_call_id is not None:
+                self.__queued_call_removals.put(task.queued_call_id)
             task.queued_call_id = None
-            if task in self.__waiting_tasks:
+            state = self._get_state(task)
+            if state == _WAITING:
                 self.__waiting_tasks.remove(task)
-            if task in self.__running_tasks:
+            elif state == _RUNNING:
                 self.__running_tasks.remove(task)
+            if state in (_WAITING, _RUNNING):
+                self._unindex_task(task)
             self._unblock_tasks(task)
+            # freed weight or unblocked tasks may let waiting tasks run
+            self._request_dispatch()
             task.call_life_cycle_callbacks(dispatch_constants.CALL_DEQUEUE_LIFE_CYCLE_CALLBACK)
         finally:
             self.__lock.release()
 
+    def _remove_queued_calls(self, queued_call_ids):
+        """
+        Remove the queued calls of dequeued tasks from the database.
+        NOTE: called from the queued call removal thread
+        @param queued_call_ids: db ids of the queued calls
+        @type  queued_call_ids: list
+        """
+        self.queued_call_collection.remove({'_id': {'$in': queued_call_ids}}, safe=True)
+
+    def flush_queued_call_removals(self):
+        """
+        Block until the queued calls of all the dequeued tasks have been removed
+        from the database.
+        """
+        self.__queued_call_removals.flush()
+
     def _unblock_tasks(self, task):
         """
         Remove a task call request id from all other task call requests' dependencies
@@ -260,7 +447,12 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            for potentially_blocked_task in self.__waiting_tasks[:]:
+            dependent_ids = self.__dependents_index.pop(task.call_request.id, ())
+            for potentially_blocked_task in self._sorted_tasks(dependent_ids):
+
+                # the task may have been skipped by an earlier iteration
+                if self._get_state(potentially_blocked_task) != _WAITING:
+                    continue
 
                 if task.call_request.id not in potentially_blocked_task.call_request.dependencies:
                     continue
@@ -286,18 +478,23 @@ class TaskQueue(object):
         @param task: task that has completed
         @type  task: pulp.server.dispatch.task.Task
         """
+        # calculated before taking the lock, so that large results don't stall
+        # the dispatcher
+        size = _call_report_size(task.call_report)
         self.__lock.acquire()
         try:
-            self.__running_weight -= task.call_request.weight
+            # tasks that are skipped or canceled never started running
+            if self._get_state(task) == _RUNNING:
+                self.__running_weight -= task.call_request.weight
             self.dequeue(task)
-            self.__completed_tasks.append(task)
+            self._cache_completed_task(task, size)
         finally:
             self.__lock.release()
 
     def skip(self, task):
         self.__lock.acquire()
         try:
-            if task not in self.__waiting_tasks:
+            if self._get_state(task) != _WAITING:
                 return
             return task.skip()
         finally:
@@ -327,13 +524,26 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            for task in itertools.chain(self.__completed_tasks,
-                                        self.__running_tasks,
-                                        self.__waiting_tasks):
-                if task.call_request.id != call_request_id:
-                    continue
-                return task
-            return None
+            return self.__tasks.get(call_request_id)
+        finally:
+            self.__lock.release()
+
+    def get_multiple(self, call_request_ids, include_completed=True):
+        """
+        Get the tasks for multiple call request ids
+        @param call_request_ids: list of unique task ids
+        @type  call_request_ids: list or tuple
+        @param include_completed: toggle inclusion of cached completed tasks
+        @type  include_completed: bool
+        @return: (potentially empty) list of the tasks found
+        @rtype:  list of pulp.server.dispatch.task.Task
+        """
+        self.__lock.acquire()
+        try:
+            call_request_ids = [i for i in set(call_request_ids) if i in self.__tasks]
+            if not include_completed:
+                call_request_ids = [i for i in call_request_ids if self.__positions[i][0] != _COMPLETED]
+            return self._sorted_tasks(call_request_ids)
         finally:
             self.__lock.release()
 
@@ -347,16 +557,42 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            tasks = []
-            for task in itertools.chain(self.__completed_tasks,
-                                        self.__running_tasks,
-                                        self.__waiting_tasks):
-                for tag in tags:
-                    if tag not in task.call_request.tags:
-                        break
-                else:
-                    tasks.append(task)
-            return tasks
+            if not tags:
+                return self._sorted_tasks(self.__tasks)
+            # intersect the smallest sets first
+            id_sets = sorted((self.__tag_index.get(t, ()) for t in set(tags)), key=len)
+            call_request_ids = set(id_sets[0])
+            for id_set in id_sets[1:]:
+                call_request_ids.intersection_update(id_set)
+            return self._sorted_tasks(call_request_ids)
+        finally:
+            self.__lock.release()
+
+    def find_by_call_request_group_id(self, call_request_group_id):
+        """
+        Find the tasks belonging to the given call request group
+        @param call_request_group_id: call request group id
+        @type  call_request_group_id: str
+        @return: (potentially empty) list of tasks in the group
+        @rtype:  list of pulp.server.dispatch.task.Task
+        """
+        self.__lock.acquire()
+        try:
+            return self._sorted_tasks(self.__group_index.get(call_request_group_id, ()))
+        finally:
+            self.__lock.release()
+
+    def find_by_schedule_id(self, schedule_id):
+        """
+        Find the tasks created by the given schedule
+        @param schedule_id: schedule id
+        @type  schedule_id: str
+        @return: (potentially empty) list of tasks created by the schedule
+        @rtype:  list of pulp.server.dispatch.task.Task
+        """
+        self.__lock.acquire()
+        try:
+            return self._sorted_tasks(self.__schedule_index.get(schedule_id, ()))
         finally:
             self.__lock.release()
 
@@ -405,7 +641,7 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            return self.__completed_tasks[:]
+            return list(self.__completed_tasks)
         finally:
             self.__lock.release()
 
@@ -417,8 +653,107 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            return itertools.chain(self.__completed_tasks[:],
+            return itertools.chain(list(self.__completed_tasks),
                                    self.__running_tasks[:],
                                    self.__waiting_tasks[:])
         finally:
             self.__lock.release()
+
+    # task index methods -------------------------------------------------------
+
+    def _index_task(self, task):
+        """
+        Add a task to the lookup indexes.
+        NOTE: must be called with the lock held
+        @param task: task to index
+        @type  task: pulp.server.dispatch.task.Task
+        """
+        call_request_id = task.call_request.id
+        self.__tasks[call_request_id] = task
+        for tag in task.call_request.tags:
+            _add_to_index(self.__tag_index, tag, call_request_id)
+        if task.call_request.group_id is not None:
+            _add_to_index(self.__group_index, task.call_request.group_id, call_request_id)
+        if task.call_report.schedule_id is not None:
+            _add_to_index(self.__schedule_index, task.call_report.schedule_id, call_request_id)
+
+    def _unindex_task(self, task):
+        """
+        Remove a task from the lookup indexes.
+        NOTE: must be called with the lock held
+        @param task: task to remove
+        @type  task: pulp.server.dispatch.task.Task
+        """
+        call_request_id = task.call_request.id
+        self.__tasks.pop(call_request_id, None)
+        self.__positions.pop(call_request_id, None)
+        for tag in task.call_request.tags:
+            _remove_from_index(self.__tag_index, tag, call_request_id)
+        _remove_from_index(self.__group_index, task.call_request.group_id, call_request_id)
+        _remove_from_index(self.__schedule_index, task.call_report.schedule_id, call_request_id)
+        for dependency_id in task.call_request.dependencies:
+            _remove_from_index(self.__dependents_index, dependency_id, call_request_id)
+
+    def _set_position(self, task, state):
+        """
+        Record that a task has (just) been placed in the list for the given state.
+        NOTE: must be called with the lock held
+        """
+        self.__positions[task.call_request.id] = (state, self.__sequence.next())
+
+    def _get_state(self, task):
+        """
+        Get the state of the task list a task is in.
+        @return: one of _WAITING, _RUNNING or _COMPLETED, None if the task is not queued
+        """
+        position = self.__positions.get(task.call_request.id)
+        if position is None or self.__tasks.get(task.call_request.id) is not task:
+            return None
+        return position[0]
+
+    def _sorted_tasks(self, call_request_ids):
+        """
+        Get the tasks for the given, indexed, call request ids in queue order.
+        NOTE: must be called with the lock held
+        """
+        positions = self.__positions
+        call_request_ids = sorted(call_request_ids, key=lambda i: positions[i])
+        return [self.__tasks[i] for i in call_request_ids]
+
+# size utility functions -------------------------------------------------------
+
+def _call_report_size(call_report):
+    """
+    Approximate the size, in bytes, of the payloads of a call report.
+    """
+    return sum(_approximate_size(getattr(call_report, field))
+               for field in ('result', 'progress', 'exception', 'traceback'))
+
+
+def _approximate_size(value):
+    """
+    Approximate the size, in bytes, of a value and the containers, strings and
+    numbers it contains.
+    """
+    size = sys.getsizeof(value, 0)
+    if isinstance(value, dict):
+        for k, v in value.iteritems():
+            size += _approximate_size(k) + _approximate_size(v)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for v in value:
+            size += _approximate_size(v)
+    return size
+
+# index utility functions ------------------------------------------------------
+
+def _add_to_index(index, key, call_request_id):
+    index.setdefault(key, set()).add(call_request_id)
+
+
+def _remove_from_index(index, key, call_request_id):
+    id_set = index.get(key)
+    if id_set is None:
+        return
+    id_set.discard(call_request_id)
+    if not id_set:
+        del index[key]
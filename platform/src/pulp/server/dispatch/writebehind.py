@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import logging
+import Queue
+import threading
+
+
+_LOG = logging.getLogger(__name__)
+
+# write-behind queue -----------------------------------------------------------
+
+class WriteBehindQueue(object):
+    """
+    Queue of database writes performed, in order, by a background writer thread
+    so that they can be taken out of latency sensitive code paths.
+    All of the writes that accumulate while the writer is busy are passed to
+    the write callable at once, so that they can be batched.
+
+    @ivar name: name of the writer thread
+    @type name: str
+    @ivar write: callable passed the list of pending writes, in the order they
+                 were put, called from the writer thread
+    @type write: callable
+    """
+
+    def __init__(self, name, write):
+        self.name = name
+        self.write = write
+
+        self.__lock = threading.Lock()
+        self.__queue = Queue.Queue()
+        self.__writer = None
+
+    def put(self, item):
+        """
+        Queue a write.
+        @param item: write to pass to the write callable
+        """
+        self.__queue.put(item)
+        self.__lock.acquire()
+        try:
+            if self.__writer is None:
+                self.__writer = threading.Thread(target=self.__write, name=self.name)
+                self.__writer.setDaemon(True)
+                self.__writer.start()
+        finally:
+            self.__lock.release()
+
+    def flush(self):
+        """
+        Block until all of the queued writes have been written.
+        """
+        self.__queue.join()
+
+    def __write(self):
+        while True:
+            items = [self.__queue.get()]
+            while True:
+                try:
+                    items.append(self.__queue.get_nowait())
+                except Queue.Empty:
+                    break
+            try:
+                self.write(items)
+            except Exception, e:
+                _LOG.exception(e)
+            for i in range(len(items)):
+                self.__queue.task_done()
@@ -14,6 +14,7 @@ import logging
 from pulp.server.dispatch.call import CallRequest
 from pulp.common.tags import action_tag, resource_tag
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import serialization
 from pulp.server.managers import factory as managers
 
 
@@ -51,6 +52,10 @@ def bind_failed(call_request, call_report):
 unbind_succeeded = bind_succeeded
 unbind_failed = bind_failed
 
+# refer to the callbacks by name in the serialized call requests
+serialization.register_callable('bind_succeeded', bind_succeeded)
+serialization.register_callable('bind_failed', bind_failed)
+
 
 # -- itineraries -------------------------------------------------------------------------
 
@@ -22,7 +22,7 @@ from pulp.server.dispatch.call import CallRequest
 from pulp.server.managers import factory as managers_factory
 
 
-def consumer_content_install_itinerary(consumer_id, units, options):
+def consumer_content_install_itinerary(consumer_id, units, options, translated=False):
     """
     Create an itinerary for consumer content installation.
     @param consumer_id: unique id of the consumer
@@ -31,12 +31,14 @@ def consumer_content_install_itinerary(consumer_id, units, options):
     @type units: list or tuple
     @param options: options to pass to the install manager
     @type options: dict or None
+    @param translated: the units have already been translated for the consumer
+    @type translated: bool
     @return: list of call requests
     @rtype: list
     """
     manager = managers_factory.consumer_agent_manager()
     args = [consumer_id]
-    kwargs = {'units': units, 'options': options}
+    kwargs = {'units': units, 'options': options, 'translated': translated}
     weight = pulp_config.config.getint('tasks', 'consumer_content_weight')
     tags = [resource_tag(dispatch_constants.RESOURCE_CONSUMER_TYPE, consumer_id),
             action_tag('unit_install')]
@@ -45,7 +47,7 @@ def consumer_content_install_itinerary(consumer_id, units, options):
     return [call_request]
 
 
-def consumer_content_update_itinerary(consumer_id, units, options):
+def consumer_content_update_itinerary(consumer_id, units, options, translated=False):
     """
     Create an itinerary for consumer content update.
     @param consumer_id: unique id of the consumer
@@ -54,12 +56,14 @@ def consumer_content_update_itinerary(consumer_id, units, options):
     @type units: list or tuple
     @param options: options to pass to the update manager
     @type options: dict or None
+    @param translated: the units have already been translated for the consumer
+    @type translated: bool
     @return: list of call requests
     @rtype: list
     """
     manager = managers_factory.consumer_agent_manager()
     args = [consumer_id]
-    kwargs = {'units': units, 'options': options}
+    kwargs = {'units': units, 'options': options, 'translated': translated}
     weight = pulp_config.config.getint('tasks', 'consumer_content_weight')
     tags = [resource_tag(dispatch_constants.RESOURCE_CONSUMER_TYPE, consumer_id),
             action_tag('unit_update')]
@@ -68,7 +72,7 @@ def consumer_content_update_itinerary(consumer_id, units, options):
     return [call_request]
 
 
-def consumer_content_uninstall_itinerary(consumer_id, units, options):
+def consumer_content_uninstall_itinerary(consumer_id, units, options, translated=False):
     """
     Create an itinerary for consumer content uninstall.
     @param consumer_id: unique id of the consumer
@@ -77,12 +81,14 @@ def consumer_content_uninstall_itinerary(consumer_id, units, options):
     @type units: list or tuple
     @param options: options to pass to the uninstall manager
     @type options: dict or None
+    @param translated: the units have already been translated for the consumer
+    @type translated: bool
     @return: list of call requests
     @rtype: list
     """
     manager = managers_factory.consumer_agent_manager()
     args = [consumer_id]
-    kwargs = {'units': units, 'options': options}
+    kwargs = {'units': units, 'options': options, 'translated': translated}
     weight = pulp_config.config.getint('tasks', 'consumer_content_weight')
     tags = [resource_tag(dispatch_constants.RESOURCE_CONSUMER_TYPE, consumer_id),
             action_tag('unit_uninstall')]
@@ -15,9 +15,16 @@
 Itinerary creation for complex consumer group operations.
 """
 
+from logging import getLogger
+
+from pulp.plugins.model import Consumer as ProfiledConsumer
 from pulp.server.itineraries.consumer import (consumer_content_install_itinerary,
     consumer_content_update_itinerary, consumer_content_uninstall_itinerary)
 from pulp.server.managers import factory as managers
+from pulp.server.managers.consumer.group import fanout
+
+
+_LOG = getLogger(__name__)
 
 
 def consumer_group_content_install_itinerary(consumer_group_id, units, options):
@@ -32,13 +39,7 @@ def consumer_group_content_install_itinerary(consumer_group_id, units, options):
     :return: list of call requests
     :rtype: list
     """
-    consumer_group = managers.consumer_group_query_manager().get_group(consumer_group_id)
-    consumer_group_call_requests_list = []
-    for consumer_id in consumer_group['consumer_ids']:
-        consumer_call_requests = consumer_content_install_itinerary(consumer_id, units, options)
-        consumer_group_call_requests_list.extend(consumer_call_requests)
- 
-    return consumer_group_call_requests_list
+    return _consumer_group_content_itinerary(consumer_group_id, units, options, 'install', consumer_content_install_itinerary)
 
 
 def consumer_group_content_update_itinerary(consumer_group_id, units, options):
@@ -53,13 +54,7 @@ def consumer_group_content_update_itinerary(consumer_group_id, units, options):
     :return: list of call requests
     :rtype: list
     """
-    consumer_group = managers.consumer_group_query_manager().get_group(consumer_group_id)
-    consumer_group_call_requests_list = []
-    for consumer_id in consumer_group['consumer_ids']:
-        consumer_call_requests = consumer_content_update_itinerary(consumer_id, units, options)
-        consumer_group_call_requests_list.extend(consumer_call_requests)
- 
-    return consumer_group_call_requests_list
+    return _consumer_group_content_itinerary(consumer_group_id, units, options, 'update', consumer_content_update_itinerary)
 
 
 def consumer_group_content_uninstall_itinerary(consumer_group_id, units, options):
@@ -74,10 +69,51 @@ def consumer_group_content_uninstall_itinerary(consumer_group_id, units, options
     :return: list of call requests
     :rtype: list
     """
+    return _consumer_group_content_itinerary(consumer_group_id, units, options, 'uninstall', consumer_content_uninstall_itinerary)
+
+
+def _consumer_group_content_itinerary(consumer_group_id, units, options, action, consumer_itinerary):
+    """
+    Create an itinerary for a content action on the consumers in a consumer
+    group, one call request for each consumer so that each agent's reply is
+    tracked. The units are translated for all of the consumers up front, with
+    their profiles looked up in bulk and the profilers once per content type,
+    so the calls only have to send the requests to the agents. The calls for
+    consumers the units could not be translated for translate the units
+    themselves, and report the failure in their task.
+    :param consumer_group_id: unique id of the consumer group
+    :type consumer_group_id: str
+    :param units: units to install, update or uninstall
+    :type units: list or tuple
+    :param options: options to pass to the agent manager
+    :type options: dict or None
+    :param action: content action (install|update|uninstall)
+    :type action: str
+    :param consumer_itinerary: itinerary for the action on a single consumer
+    :type consumer_itinerary: callable
+    :return: list of call requests
+    :rtype: list
+    """
     consumer_group = managers.consumer_group_query_manager().get_group(consumer_group_id)
+    consumer_ids = consumer_group['consumer_ids']
+    consumers = fanout.find_consumers(consumer_ids)
+    profiles = managers.consumer_profile_manager().find_profiles(consumers.keys())
+    agent_manager = managers.consumer_agent_manager()
+
     consumer_group_call_requests_list = []
-    for consumer_id in consumer_group['consumer_ids']:
-        consumer_call_requests = consumer_content_uninstall_itinerary(consumer_id, units, options)
+    profilers = {}
+    for consumer_id in consumer_ids:
+        translated_units = None
+        if consumer_id in consumers:
+            try:
+                pc = ProfiledConsumer(consumer_id, profiles[consumer_id])
+                translated_units = agent_manager.translate_units(pc, units, options, action, profilers)
+            except Exception:
+                _LOG.exception('units not translated for consumer [%s]' % consumer_id)
+        if translated_units is None:
+            consumer_call_requests = consumer_itinerary(consumer_id, units, options)
+        else:
+            consumer_call_requests = consumer_itinerary(consumer_id, translated_units, options, translated=True)
         consumer_group_call_requests_list.extend(consumer_call_requests)
- 
+
     return consumer_group_call_requests_list
@@ -16,6 +16,7 @@ import oauth2
 from pulp.server.db.model.consumer import Consumer
 from pulp.server.managers import factory
 from pulp.server.auth import ldap_connection
+from pulp.server.auth.cache import authentication_cache
 from pulp.server.config import config
 from pulp.server.exceptions import PulpException
 
@@ -129,25 +130,41 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: user login corresponding to the credentials
         """
+        cache = authentication_cache()
+        key = cache.key('user_cert', cert_pem)
+        login = cache.get(key)
+        if login is not None:
+            return login
+        generation = cache.generation()
+
+        login, expires = self._check_user_cert(cert_pem)
+        if login is not None:
+            cache.put(key, login, owner=login, generation=generation, expires=expires)
+        return login
+
+    def _check_user_cert(self, cert_pem):
+        # returns the user login and the time the certificate stops being
+        # valid, or (None, None)
         cert = factory.certificate_manager(content=cert_pem)
         subject = cert.subject()
         encoded_user = subject.get('CN', None)
     
         if not encoded_user:
-            return None
+            return None, None
     
         cert_gen_manager = factory.cert_generation_manager()
-        if not cert_gen_manager.verify_cert(cert_pem):
+        expires = cert_gen_manager.verified_until(cert_pem)
+        if expires is None:
             _LOG.error('Auth certificate with CN [%s] is signed by a foreign CA' %
                        encoded_user)
-            return None
+            return None, None
     
         try:
             username, id = cert_gen_manager.decode_admin_user(encoded_user)
         except PulpException:
-            return None
+            return None, None
     
-        return self.check_username_password(username)
+        return self.check_username_password(username), expires
     
     def check_consumer_cert(self, cert_pem):
         """
@@ -160,20 +177,37 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: id of a consumer corresponding to the credentials
         """
+        cache = authentication_cache()
+        key = cache.key('consumer_cert', cert_pem)
+        consumerid = cache.get(key)
+        if consumerid is not None:
+            return consumerid
+        generation = cache.generation()
+
+        consumerid, expires = self._check_consumer_cert(cert_pem)
+        if consumerid is not None:
+            cache.put(key, consumerid, owner=consumerid, generation=generation,
+                      expires=expires)
+        return consumerid
+
+    def _check_consumer_cert(self, cert_pem):
+        # returns the consumer id and the time the certificate stops being
+        # valid, or (None, None)
         cert = factory.certificate_manager(content=cert_pem)
         subject = cert.subject()
         consumerid = subject.get('CN', None)
     
         if consumerid is None:
-            return None
+            return None, None
     
         cert_gen_manager = factory.cert_generation_manager()
-        if not cert_gen_manager.verify_cert(cert_pem):
+        expires = cert_gen_manager.verified_until(cert_pem)
+        if expires is None:
             _LOG.error('Auth certificate with CN [%s] is signed by a foreign CA' %
                        consumerid)
-            return None
+            return None, None
     
-        return consumerid
+        return consumerid, expires
     
     # oauth authentication --------------------------------------------------------
     
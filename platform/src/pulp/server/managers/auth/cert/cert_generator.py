@@ -11,11 +11,17 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import calendar
 import logging
+import os
+import re
+from datetime import datetime
 from M2Crypto import X509, EVP, RSA, util
 from threading import RLock
 import subprocess
 
+from pulp.common import dateutils
+from pulp.server.auth.cache import AuthenticationCache
 from pulp.server.exceptions import PulpException
 from pulp.server import config
 from pulp.server.util import Singleton
@@ -104,27 +110,24 @@ class CertGenerationManager(object):
         @return: True if the certificate is successfully verified against the CA; False otherwise
         @rtype:  boolean
         '''
+        return self.verified_until(cert_pem) is not None
 
-        # M2Crypto doesn't support verifying a cert against a CA, so call out to openssl
-        ca_cert = config.config.get('security', 'cacert')
-        cmd = 'openssl verify -CAfile %s' % ca_cert
-        p = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE,
-                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    def verified_until(self, cert_pem):
+        '''
+        Verifies the given certificate against the server's CA and returns the
+        time the verification stops being valid, which is when the first
+        certificate in the chain expires.
 
-        # Use communicate to pipe the certificate to the verify call
-        stdout, stderr = p.communicate(input=cert_pem)
+        @param cert_pem: PEM encoded certificate to be verified
+        @type  cert_pem: string
 
-        # Successful result example:
-        #   stdin: OK\n
-        # Failed result example:
-        #   stdin: C = US, ST = NC, L = Raleigh, O = Red Hat, CN = localhost
-        #   error 20 at 0 depth lookup:unable to get local issuer certificate\n
-        result = stdout.rstrip()
+        @return: expiration time in seconds since the epoch if the certificate
+                 is successfully verified against the CA; None otherwise
+        @rtype:  float or None
+        '''
 
-        if result.endswith('OK'):
-            return True
-        else:
-            return False
+        ca_cert = config.config.get('security', 'cacert')
+        return CAStore().expiration(ca_cert, cert_pem)
 
     def encode_admin_user(self, user):
         '''
@@ -216,7 +219,159 @@ class SerialNumber:
         finally:
             self.__mutex.release()
 
-    
+
+class CAStore:
+    """
+    In process replacement for 'openssl verify -CAfile', which verifies that a
+    certificate is signed by a chain of the certificates in a CA file that ends
+    with a self signed certificate. As with openssl verify, every certificate in
+    the chain must be within its validity period, and every issuer must be a CA
+    certificate.
+
+    The CA file is loaded once and re-loaded when it changes. Successfully
+    verified certificates are remembered, by digest, along with the time the
+    first certificate in the chain expires, until they expire from the cache,
+    the CA file changes, or that time passes.
+    """
+
+    MAX_DEPTH = 9
+    __metaclass__ = Singleton
+
+    def __init__(self):
+        self.__mutex = RLock()
+        self.__path = None
+        self.__stat = None
+        # subject (DER encoded): list of CA certificates
+        self.__issuers = {}
+        max_size = config.config.getint('security', 'auth_cache_size')
+        ttl = config.config.getfloat('security', 'auth_cache_ttl')
+        self.verified = AuthenticationCache(max_size, ttl)
+
+    def verify(self, ca_path, cert_pem):
+        """
+        Verify a certificate against the CA certificates in the given file.
+        @param ca_path: path to the CA certificate file
+        @type  ca_path: str
+        @param cert_pem: PEM encoded certificate to be verified
+        @type  cert_pem: str
+        @return: True if the certificate is successfully verified; False otherwise
+        @rtype:  bool
+        """
+        return self.expiration(ca_path, cert_pem) is not None
+
+    def expiration(self, ca_path, cert_pem):
+        """
+        Verify a certificate against the CA certificates in the given file.
+        @param ca_path: path to the CA certificate file
+        @type  ca_path: str
+        @param cert_pem: PEM encoded certificate to be verified
+        @type  cert_pem: str
+        @return: the time, in seconds since the epoch, the first certificate in
+                 the chain expires if the certificate is successfully verified;
+                 None otherwise
+        @rtype:  float or None
+        """
+        try:
+            issuers = self.__load(ca_path)
+        except (IOError, OSError, X509.X509Error), e:
+            log.error('Unable to load CA certificate [%s]: %s' % (ca_path, e))
+            return None
+
+        key = self.verified.key(cert_pem)
+        expires = self.verified.get(key)
+        if expires is not None:
+            return expires
+        generation = self.verified.generation()
+
+        try:
+            cert = X509.load_cert_string(cert_pem)
+        except X509.X509Error:
+            return None
+
+        not_after = _verify_chain(cert, issuers, self.MAX_DEPTH, datetime.now(dateutils.utc_tz()))
+        if not_after is None:
+            return None
+
+        expires = float(calendar.timegm(not_after.utctimetuple()))
+        self.verified.put(key, expires, generation=generation, expires=expires)
+        return expires
+
+    def __load(self, ca_path):
+        # return the CA certificates by subject, re-loading them if the CA file
+        # has changed
+        st = os.stat(ca_path)
+        stat = (st.st_ino, st.st_size, st.st_mtime)
+        self.__mutex.acquire()
+        try:
+            if ca_path == self.__path and stat == self.__stat:
+                return self.__issuers
+            fp = open(ca_path)
+            try:
+                ca_pem = fp.read()
+            finally:
+                fp.close()
+            issuers = {}
+            for pem in _PEM_CERT_REGEX.findall(ca_pem):
+                ca = X509.load_cert_string(pem)
+                issuers.setdefault(ca.get_subject().as_der(), []).append(ca)
+            log.info('Loaded %d CA certificates from [%s]' %
+                     (sum(len(l) for l in issuers.values()), ca_path))
+            self.__path = ca_path
+            self.__stat = stat
+            self.__issuers = issuers
+            self.verified.invalidate()
+            return issuers
+        finally:
+            self.__mutex.release()
+
+
+_PEM_CERT_REGEX = re.compile('-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', re.DOTALL)
+
+
+def _verify_chain(cert, issuers, depth, now):
+    """
+    Verify that a certificate is valid at the given time and signed by one of
+    the given issuers, and that the issuer is a CA certificate that is either
+    self signed and valid at the given time, or itself verified the same way.
+    @return: the earliest expiration time of the certificates in the chain,
+             None if the certificate could not be verified
+    @rtype:  datetime.datetime or None
+    """
+    if depth < 0:
+        return None
+    not_after = _not_after(cert, now)
+    if not_after is None:
+        return None
+    issuer_name = cert.get_issuer().as_der()
+    for issuer in issuers.get(issuer_name, ()):
+        if not issuer.check_ca():
+            continue
+        if cert.verify(issuer.get_pubkey()) != 1:
+            continue
+        if issuer.get_issuer().as_der() == issuer_name and issuer.verify(issuer.get_pubkey()) == 1:
+            issuer_not_after = _not_after(issuer, now)
+        else:
+            issuer_not_after = _verify_chain(issuer, issuers, depth - 1, now)
+        if issuer_not_after is not None:
+            return min(not_after, issuer_not_after)
+    return None
+
+
+def _not_after(cert, now):
+    """
+    @return: the certificate's expiration time if it is valid at the given
+             time, None otherwise
+    @rtype:  datetime.datetime or None
+    """
+    try:
+        not_before = cert.get_not_before().get_datetime()
+        not_after = cert.get_not_after().get_datetime()
+    except ValueError:
+        return None
+    if now < not_before or now > not_after:
+        return None
+    return not_after
+
 #----------------------------------------------------------------------------------------------------
 
 def _make_priv_key():
@@ -20,6 +20,7 @@ Functions taken from stackoverflow.com : http://tinyurl.com/2f6gx7s
 import random
 from hmac import HMAC
 
+from pulp.server.auth.cache import authentication_cache
 from pulp.server.compat import digestmod
 
 # -- constants ----------------------------------------------------------------
@@ -49,11 +50,20 @@ class PasswordManager(object):
         return salt.encode("base64").strip() + "," + hashed_password.encode("base64").strip()
 
     def check_password(self, saved_password_entry, plain_password):
+        # the saved entry changes with the password, so cached results for an
+        # old password are never looked up again
+        cache = authentication_cache()
+        key = cache.key('password', saved_password_entry, plain_password)
+        if cache.get(key):
+            return True
         salt, hashed_password = saved_password_entry.split(",")
         salt = salt.decode("base64")
         hashed_password = hashed_password.decode("base64")
         pbkdbf = self.pbkdf_sha256(plain_password, salt, NUM_ITERATIONS)
-        return hashed_password == pbkdbf
+        if hashed_password != pbkdbf:
+            return False
+        cache.put(key, True)
+        return True
     
 
 
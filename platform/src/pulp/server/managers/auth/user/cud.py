@@ -22,6 +22,7 @@ import logging
 import re
 
 from pulp.server import config
+from pulp.server.auth.cache import authentication_cache
 from pulp.server.db.model.auth import User
 from pulp.server.exceptions import PulpDataException, DuplicateResource, InvalidValue, MissingResource
 from pulp.server.managers import factory
@@ -155,6 +156,7 @@ class UserManager(object):
             raise InvalidValue(invalid_values)
 
         User.get_collection().save(user, safe=True)
+        authentication_cache().invalidate(login)
 
         # Retrieve the user to return the SON object
         updated = User.get_collection().find_one({'login' : login})
@@ -192,6 +194,7 @@ class UserManager(object):
         permission_manager.revoke_all_permissions_from_user(login)
         
         User.get_collection().remove({'login' : login}, safe=True)
+        authentication_cache().invalidate(login)
 
 
     def ensure_admin(self):
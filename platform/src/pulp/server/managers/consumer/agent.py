@@ -122,7 +122,7 @@ class AgentManager(object):
             Bind.Action.UNBIND,
             action_id)
 
-    def install_content(self, consumer_id, units, options):
+    def install_content(self, consumer_id, units, options, translated=False):
         """
         Install content units on a consumer.
         @param consumer_id: The consumer ID.
@@ -132,27 +132,19 @@ class AgentManager(object):
             { type_id:<str>, unit_key:<dict> }
         @param options: Install options; based on unit type.
         @type options: dict
+        @param translated: The units have already been translated
+            for the consumer, see L{translate_units}.
+        @type translated: bool
         """
         manager = managers.consumer_manager()
         consumer = manager.get_consumer(consumer_id)
-        conduit = ProfilerConduit()
-        collated = Units(units)
-        for typeid, units in collated.items():
+        if not translated:
             pc = self.__profiled_consumer(consumer_id)
-            profiler, cfg = self.__profiler(typeid)
-            units = self.__invoke_plugin(
-                profiler.install_units,
-                pc,
-                units,
-                options,
-                cfg,
-                conduit)
-            collated[typeid] = units
-        units = collated.join()
+            units = self.translate_units(pc, units, options, 'install')
         agent = PulpAgent(consumer)
         agent.content.install(units, options)
 
-    def update_content(self, consumer_id, units, options):
+    def update_content(self, consumer_id, units, options, translated=False):
         """
         Update content units on a consumer.
         @param consumer_id: The consumer ID.
@@ -162,27 +154,19 @@ class AgentManager(object):
             { type_id:<str>, unit_key:<dict> }
         @param options: Update options; based on unit type.
         @type options: dict
+        @param translated: The units have already been translated
+            for the consumer, see L{translate_units}.
+        @type translated: bool
         """
         manager = managers.consumer_manager()
         consumer = manager.get_consumer(consumer_id)
-        conduit = ProfilerConduit()
-        collated = Units(units)
-        for typeid, units in collated.items():
+        if not translated:
             pc = self.__profiled_consumer(consumer_id)
-            profiler, cfg = self.__profiler(typeid)
-            units = self.__invoke_plugin(
-                profiler.update_units,
-                pc,
-                units,
-                options,
-                cfg,
-                conduit)
-            collated[typeid] = units
-        units = collated.join()
+            units = self.translate_units(pc, units, options, 'update')
         agent = PulpAgent(consumer)
         agent.content.update(units, options)
 
-    def uninstall_content(self, consumer_id, units, options):
+    def uninstall_content(self, consumer_id, units, options, translated=False):
         """
         Uninstall content units on a consumer.
         @param consumer_id: The consumer ID.
@@ -192,25 +176,54 @@ class AgentManager(object):
             { type_id:<str>, type_id:<dict> }
         @param options: Uninstall options; based on unit type.
         @type options: dict
+        @param translated: The units have already been translated
+            for the consumer, see L{translate_units}.
+        @type translated: bool
         """
         manager = managers.consumer_manager()
         consumer = manager.get_consumer(consumer_id)
+        if not translated:
+            pc = self.__profiled_consumer(consumer_id)
+            units = self.translate_units(pc, units, options, 'uninstall')
+        agent = PulpAgent(consumer)
+        agent.content.uninstall(units, options)
+
+    def translate_units(self, pc, units, options, action, profilers=None):
+        """
+        Translate content units for a consumer using the profilers
+        for their types.
+        @param pc: The profiled consumer.
+        @type pc: L{ProfiledConsumer}
+        @param units: A list of content units.
+        @type units: list of:
+            { type_id:<str>, unit_key:<dict> }
+        @param options: Options; based on unit type.
+        @type options: dict
+        @param action: The content action (install|update|uninstall).
+        @type action: str
+        @param profilers: Optional cache of the profilers found for each
+            content type, used when translating units for many consumers.
+        @type profilers: dict
+        @return: The translated units.
+        @rtype: list
+        """
+        if profilers is None:
+            profilers = {}
         conduit = ProfilerConduit()
         collated = Units(units)
         for typeid, units in collated.items():
-            pc = self.__profiled_consumer(consumer_id)
-            profiler, cfg = self.__profiler(typeid)
+            if typeid not in profilers:
+                profilers[typeid] = self.__profiler(typeid)
+            profiler, cfg = profilers[typeid]
             units = self.__invoke_plugin(
-                profiler.uninstall_units,
+                getattr(profiler, '%s_units' % action),
                 pc,
                 units,
                 options,
                 cfg,
                 conduit)
             collated[typeid] = units
-        units = collated.join()
-        agent = PulpAgent(consumer)
-        agent.content.uninstall(units, options)
+        return collated.join()
 
     def send_profile(self, consumer_id):
         """
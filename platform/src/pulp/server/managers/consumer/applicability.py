@@ -12,24 +12,60 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 """
-Contains content applicability management classes
+Contains content applicability management classes.
+
+The applicability of all the units of a type in a set of repos is cached for
+each distinct set of consumer profiles. The cached reports are marked stale
+when the repos' content changes; stale reports continue to be served, flagged
+as such, while they are refreshed in the background.
 """
 
+import hashlib
+from uuid import uuid4
+
+from pulp.common.tags import action_tag
+from pulp.common.util import encode_unicode
+from pulp.server.compat import json
+from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import factory as dispatch_factory
+from pulp.server.dispatch.call import CallRequest
+from pulp.server.dispatch.serialization import decode_value, encode_value
 from pulp.server.managers import factory as managers
 from pulp.server.managers.pluginwrapper import PluginWrapper
 from pulp.plugins.profiler import Profiler
-from pulp.plugins.model import Consumer as ProfiledConsumer
+from pulp.plugins.model import ApplicabilityReport, Consumer as ProfiledConsumer
 from pulp.plugins.types import database as content_types_db
 from pulp.plugins.conduits.profiler import ProfilerConduit
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.loader import exceptions as plugin_exceptions
 from pulp.server.exceptions import PulpExecutionException
-from pulp.server.db.model.criteria import UnitAssociationCriteria
+from pulp.server.db.model.consumer import CachedApplicability, UnitProfile
+from pulp.server.db.model.repository import Repo, RepoContentUnit
+from pulp.server.util import paginate
 from logging import getLogger
 from pulp.plugins.conduits import _common as common_utils
 
 _LOG = getLogger(__name__)
 
+# Maximum number of repos, units or cache entries in each $in query
+APPLICABILITY_BATCH_SIZE = 1000
+
+REFRESH_ACTION = 'applicability_refresh'
+
+
+class ApplicabilityResult(dict):
+    """
+    Applicability reports keyed by consumer ID and further keyed by unit type ID.
+    @ivar stale: list of unit type IDs keyed by consumer ID, for the reports
+                 that were determined before the consumer's profiles or repos
+                 last changed; they are being refreshed in the background.
+    @type stale: dict
+    """
+
+    def __init__(self):
+        super(ApplicabilityResult, self).__init__()
+        self.stale = {}
+
 
 class ApplicabilityManager(object):
 
@@ -52,6 +88,9 @@ class ApplicabilityManager(object):
                { <unit_type_id1> : [<ApplicabilityReport>]}
             }
 
+        The applicability of all units of a type is served from the cache; the
+        result's I{stale} attribute lists the reports that are being refreshed.
+
         :param consumer_criteria: The consumer selection criteria.
         :type consumer_criteria: dict
 
@@ -66,9 +105,9 @@ class ApplicabilityManager(object):
         :return: a dictionary with applicability reports for each unit 
                  keyed by a consumer id and further keyed by unit type id.
                  See above for sample return report.
-        :rtype: dict
+        :rtype: L{ApplicabilityResult}
         """
-        result = {}
+        result = ApplicabilityResult()
         conduit = ProfilerConduit()
         
         # Get repo ids satisfied by specified consumer criteria
@@ -94,39 +133,269 @@ class ApplicabilityManager(object):
                 # Get all consumer ids registered to the Pulp server
                 consumer_ids = [c['id'] for c in consumer_query_manager.find_all()]
 
-        # Iterate through each consumer to collect applicability reports
+        # Group the consumers by the repos to be checked for each of them.
+        # If repo_criteria is not specified, use repos bound to the consumer, else take intersection
+        # of repos specified in the criteria and repos bound to the consumer.
+        consumer_groups = {}
+        bindings = bind_manager.find_by_consumer_list(consumer_ids)
         for consumer_id in consumer_ids:
+            if consumer_id in result:
+                continue
             result[consumer_id] = {}
-            
-            # Find repos bound to a consumer
-            bindings = bind_manager.find_by_consumer(consumer_id)
-            bound_repo_ids = [b['repo_id'] for b in bindings]
-
-            # If repo_criteria is not specified, use repos bound to the consumer, else take intersection 
-            # of repos specified in the criteria and repos bound to the consumer.
-            if repo_criteria_ids is None:
-                repo_ids = bound_repo_ids
+            repo_ids = set([b['repo_id'] for b in bindings[consumer_id]])
+            if repo_criteria_ids is not None:
+                repo_ids &= set(repo_criteria_ids)
+            if repo_ids:
+                consumer_groups.setdefault(frozenset(repo_ids), []).append(consumer_id)
+
+        # Group by the stored profile hashes; the profiles themselves are only
+        # loaded for the consumers applicability is determined for
+        profile_manager = managers.consumer_profile_manager()
+        profile_hashes = profile_manager.find_profile_hashes(
+            [c for g in consumer_groups.values() for c in g])
+
+        resolver = _UnitKeyResolver(units)
+        profilers = {}
+        cache = _ApplicabilityCache()
+
+        # Types for which all units are checked are looked up in the cache for
+        # each distinct set of profiles; the others are determined per consumer
+        lookups = []
+        uncached = []
+        if units is None:
+            repo_unit_types = self.__repo_unit_types(set().union(*consumer_groups.keys()))
+        for repo_ids, group_consumer_ids in consumer_groups.items():
+            repo_ids = sorted(repo_ids)
+            if units is None:
+                cached_types = set()
+                for repo_id in repo_ids:
+                    cached_types.update(repo_unit_types.get(repo_id, ()))
+                uncached_types = []
             else:
-                repo_ids = list(set(bound_repo_ids) & set(repo_criteria_ids))
-
-            plugin_unit_keys = self.__parse_units(units, repo_ids)
-            if plugin_unit_keys:
-                pc = self.__profiled_consumer(consumer_id)
-                for typeid, unit_keys in plugin_unit_keys.items():
-                    # Find a profiler for each type id and find units applicable using that profiler.
-                    profiler, cfg = self.__profiler(typeid)
-                    try: 
-                        report_list = profiler.units_applicable(pc, repo_ids, typeid, unit_keys, cfg, conduit)
-                    except PulpExecutionException:
-                        report_list = None
+                cached_types = [t for t, l in units.items() if not l]
+                uncached_types = [t for t, l in units.items() if l]
+
+            profile_groups = {}
+            for consumer_id in group_consumer_ids:
+                profile_hash = _profiles_hash(profile_hashes[consumer_id])
+                profile_groups.setdefault(profile_hash, []).append(consumer_id)
+            for profile_hash, hash_consumer_ids in profile_groups.items():
+                for typeid in cached_types:
+                    key = _cache_key(profile_hash, repo_ids, typeid)
+                    lookups.append((key, profile_hash, repo_ids, typeid, hash_consumer_ids))
+            if uncached_types:
+                uncached.append((repo_ids, group_consumer_ids, uncached_types))
 
+        entries = cache.find([l[0] for l in lookups])
+        profiled_ids = set()
+        for repo_ids, group_consumer_ids, uncached_types in uncached:
+            profiled_ids.update(group_consumer_ids)
+        for key, profile_hash, repo_ids, typeid, hash_consumer_ids in lookups:
+            if not _cached(entries.get(key)):
+                profiled_ids.add(hash_consumer_ids[0])
+        profiles = profile_manager.find_profiles(list(profiled_ids))
+
+        for repo_ids, group_consumer_ids, uncached_types in uncached:
+            plugin_unit_keys = resolver.resolve(repo_ids, uncached_types)
+            consumers = [ProfiledConsumer(c, profiles[c]) for c in group_consumer_ids]
+            for typeid, unit_keys in plugin_unit_keys.items():
+                reports = self.__reports(consumers, repo_ids, typeid, unit_keys, profilers, conduit)
+                for consumer_id, report_list in reports.items():
                     if report_list is not None:
                         result[consumer_id][typeid] = report_list
-                    else: 
-                        _LOG.warn("Profiler for unit type [%s] is not returning applicability reports" % typeid)
+
+        misses = {}
+        for lookup in lookups:
+            key, profile_hash, repo_ids, typeid, hash_consumer_ids = lookup
+            entry = entries.get(key)
+            if not _cached(entry):
+                misses.setdefault((tuple(repo_ids), typeid), []).append(lookup)
+                continue
+            report_list = _decode_reports(entry['reports'])
+            if entry['stale']:
+                for consumer_id in hash_consumer_ids:
+                    result.stale.setdefault(consumer_id, []).append(typeid)
+            for consumer_id in hash_consumer_ids:
+                result[consumer_id][typeid] = report_list
+
+        # Not cached; determine it for one consumer of each distinct set of
+        # profiles, for all the sets bound to the same repos at once, and
+        # cache it
+        for (repo_ids, typeid), miss_lookups in misses.items():
+            repo_ids = list(repo_ids)
+            tokens = {}
+            consumers = []
+            for key, profile_hash, r, t, hash_consumer_ids in miss_lookups:
+                consumer_id = hash_consumer_ids[0]
+                tokens[key] = cache.claim(key, consumer_id, profile_hash, repo_ids, typeid)
+                consumers.append(ProfiledConsumer(consumer_id, profiles[consumer_id]))
+            unit_keys = resolver.resolve(repo_ids, [typeid])[typeid]
+            reports = self.__reports(consumers, repo_ids, typeid, unit_keys, profilers, conduit)
+            for key, profile_hash, r, t, hash_consumer_ids in miss_lookups:
+                consumer_id = hash_consumer_ids[0]
+                report_list = reports[consumer_id]
+                if _current_hash(profiles[consumer_id]) != profile_hash:
+                    # The profiles changed since they were grouped
+                    cache.store(key, tokens[key], None)
+                else:
+                    cache.store(key, tokens[key], report_list)
+                if report_list is not None:
+                    for consumer_id in hash_consumer_ids:
+                        result[consumer_id][typeid] = report_list
+
+        if result.stale:
+            self.__queue_refresh()
 
         return result
 
+    # -- cache maintenance -----------------------------------------------------
+
+    def invalidate_repo(self, repo_id):
+        """
+        Mark the cached applicability for the given repo as stale, to be
+        called when units are associated with, or unassociated from, the repo.
+
+        :param repo_id: The repo ID.
+        :type repo_id: str
+        """
+        _ApplicabilityCache().invalidate({'repo_ids': repo_id})
+
+    def remove_repo(self, repo_id):
+        """
+        Remove the cached applicability for the given repo, to be called when
+        the repo is deleted.
+
+        :param repo_id: The repo ID.
+        :type repo_id: str
+        """
+        _ApplicabilityCache().remove({'repo_ids': repo_id})
+
+    def remove_consumer(self, consumer_id):
+        """
+        Remove the cached applicability determined for the given consumer, to
+        be called when the consumer or its profiles are deleted. Profile
+        changes don't need to be reported since the entries are keyed by the
+        profiles' hash. Other consumers with the same profiles determine the
+        removed entries again the next time they are requested.
+
+        :param consumer_id: The consumer ID.
+        :type consumer_id: str
+        """
+        _ApplicabilityCache().remove({'consumer_id': consumer_id})
+
+    def refresh(self):
+        """
+        Re-determine the stale cached applicability. Entries for consumers
+        whose profiles or bound repos have since changed are discarded; they
+        are cached again the next time they are requested.
+        Executed in the background through the dispatch subsystem.
+        """
+        conduit = ProfilerConduit()
+        cache = _ApplicabilityCache()
+        token = cache.claim_stale()
+
+        entries = {}
+        for entry in cache.find_claimed(token):
+            entries.setdefault(entry['consumer_id'], []).append(entry)
+
+        bind_manager = managers.consumer_bind_manager()
+        profile_manager = managers.consumer_profile_manager()
+        resolver = _UnitKeyResolver(None)
+        profilers = {}
+        refreshed = 0
+        discarded = 0
+
+        for consumer_ids in paginate(entries.keys(), APPLICABILITY_BATCH_SIZE):
+            bindings = bind_manager.find_by_consumer_list(consumer_ids)
+            profile_hashes = profile_manager.find_profile_hashes(consumer_ids)
+            profiles = profile_manager.find_profiles(consumer_ids)
+            batches = {}
+            for consumer_id in consumer_ids:
+                repo_ids = sorted(set([b['repo_id'] for b in bindings[consumer_id]]))
+                profile_hash = _profiles_hash(profile_hashes[consumer_id])
+                pc = ProfiledConsumer(consumer_id, profiles[consumer_id])
+                for entry in entries[consumer_id]:
+                    if entry['profile_hash'] != profile_hash or entry['repo_ids'] != repo_ids:
+                        cache.store(entry['key'], token, None)
+                        discarded += 1
+                        continue
+                    batch = batches.setdefault((tuple(repo_ids), entry['unit_type_id']), ([], []))
+                    batch[0].append(pc)
+                    batch[1].append(entry)
+            for (repo_ids, typeid), (consumers, batch_entries) in batches.items():
+                repo_ids = list(repo_ids)
+                unit_keys = resolver.resolve(repo_ids, [typeid])[typeid]
+                reports = self.__reports(consumers, repo_ids, typeid, unit_keys, profilers, conduit)
+                for entry in batch_entries:
+                    cache.store(entry['key'], token, reports[entry['consumer_id']])
+                    refreshed += 1
+
+        _LOG.info('Refreshed %d cached applicability entries, discarded %d' % (refreshed, discarded))
+
+    def __queue_refresh(self):
+        """
+        Queue a background refresh of the stale cached applicability, unless
+        one is already waiting to run.
+        """
+        coordinator = dispatch_factory.coordinator()
+        tags = [action_tag(REFRESH_ACTION)]
+        waiting = coordinator.find_call_reports(tags=tags, state=dispatch_constants.CALL_WAITING_STATE)
+        if waiting:
+            return
+        call_request = CallRequest(self.refresh, tags=tags)
+        coordinator.execute_call_asynchronously(call_request)
+
+    # -- utils -----------------------------------------------------------------
+
+    def __reports(self, consumers, repo_ids, typeid, unit_keys, profilers, conduit):
+        """
+        Find units applicable to consumers bound to the same repos using the
+        profiler for the unit type. When the profiler fails for the batch, it
+        is asked for each consumer so that one consumer doesn't fail the others.
+
+        :param consumers: consumers bound to the repos
+        :type consumers: list of pulp.plugins.model.Consumer
+
+        :return: list of applicability reports keyed by consumer ID, None for
+                 the consumers the profiler doesn't return them for
+        :rtype: dict
+        """
+        # Find a profiler for each type id and find units applicable using that profiler.
+        if typeid not in profilers:
+            profilers[typeid] = self.__profiler(typeid)
+        profiler, cfg = profilers[typeid]
+        try:
+            reports = profiler.units_applicable_batch(consumers, repo_ids, typeid, unit_keys, cfg, conduit)
+        except PulpExecutionException:
+            reports = {}
+            if len(consumers) > 1:
+                for pc in consumers:
+                    try:
+                        reports[pc.id] = profiler.units_applicable(pc, repo_ids, typeid, unit_keys, cfg, conduit)
+                    except PulpExecutionException:
+                        pass
+
+        reports = dict([(pc.id, reports.get(pc.id)) for pc in consumers])
+        missing = len([r for r in reports.values() if r is None])
+        if missing:
+            _LOG.warn("Profiler for unit type [%s] is not returning applicability reports for %d consumer(s)"
+                      % (typeid, missing))
+        return reports
+
+    def __repo_unit_types(self, repo_ids):
+        """
+        Find the types of the units in the given repos.
+
+        :return: set of unit type ids keyed by repo id
+        :rtype: dict
+        """
+        repo_unit_types = {}
+        collection = Repo.get_collection()
+        for page in paginate(repo_ids, APPLICABILITY_BATCH_SIZE):
+            for repo in collection.find({'id': {'$in': page}}, fields=['id', 'content_unit_counts']):
+                counts = repo.get('content_unit_counts') or {}
+                repo_unit_types[repo['id']] = set([t for t, c in counts.items() if c > 0])
+        return repo_unit_types
 
     def __profiler(self, typeid):
         """
@@ -146,79 +415,251 @@ class ApplicabilityManager(object):
             cfg = {}
         return PluginWrapper(plugin), cfg
 
-    def __profiled_consumer(self, id):
+
+def _profiles_hash(profile_hashes):
+    """
+    Hash the profiles of a consumer, from the stored hashes of its profiles.
+
+    :param profile_hashes: dictionary of profile hashes keyed by content type
+    :type profile_hashes: dict
+
+    :rtype: str
+    """
+    return hashlib.sha256(json.dumps(profile_hashes, sort_keys=True)).hexdigest()
+
+
+def _current_hash(profiles):
+    """
+    Hash the given profiles of a consumer, as L{_profiles_hash} does from
+    their stored hashes.
+
+    :param profiles: dictionary of profiles keyed by content type
+    :type profiles: dict
+
+    :rtype: str
+    """
+    profile_hashes = dict([(t, UnitProfile.calculate_hash(p)) for t, p in profiles.items()])
+    return _profiles_hash(profile_hashes)
+
+
+def _cached(entry):
+    """
+    Whether a cache entry holds reports, stale or not.
+
+    :rtype: bool
+    """
+    return entry is not None and entry['reports'] is not None
+
+
+def _cache_key(profile_hash, repo_ids, unit_type_id):
+    """
+    Key of the cached applicability of the units of a type in the given
+    (sorted) repos to consumers with the given profiles.
+
+    :rtype: str
+    """
+    key = json.dumps([profile_hash, repo_ids, unit_type_id])
+    return hashlib.sha256(encode_unicode(key)).hexdigest()
+
+
+def _encode_reports(report_list):
+    return encode_value([{'summary': r.summary, 'details': r.details} for r in report_list])
+
+
+def _decode_reports(encoded):
+    return [ApplicabilityReport(r['summary'], r['details']) for r in decode_value(encoded)]
+
+
+class _ApplicabilityCache(object):
+    """
+    Persisted cache of applicability reports.
+
+    An entry is claimed, with a random token, before its reports are
+    determined, and the reports are only stored if the entry still holds the
+    token. Invalidating an entry clears the token, so reports determined from
+    profiles or repo content that changed in the meantime are never stored as
+    current.
+    """
+
+    def __init__(self):
+        self.collection = CachedApplicability.get_collection()
+
+    def find(self, keys):
+        """
+        :param keys: cache keys
+        :type keys: list
+        :return: cached entries keyed by cache key
+        :rtype: dict
         """
-        Get a profiler consumer model object.
+        entries = {}
+        for page in paginate(keys, APPLICABILITY_BATCH_SIZE):
+            for entry in self.collection.find({'key': {'$in': page}}):
+                entries[entry['key']] = entry
+        return entries
 
-        :param id: A consumer ID.
-        :type id: str
+    def claim(self, key, consumer_id, profile_hash, repo_ids, unit_type_id):
+        """
+        Claim an entry, creating it if it does not exist.
+        :return: the claim's token
+        :rtype: str
+        """
+        token = str(uuid4())
+        entry = CachedApplicability(key, consumer_id, profile_hash, repo_ids, unit_type_id)
+        entry.refresh_token = token
+        entry = dict(entry)
+        del entry['_id']
+        self.collection.update({'key': key}, {'$set': entry}, upsert=True, safe=True)
+        return token
 
-        :return: A populated profiler consumer model object.
-        :rtype: L{ProfiledConsumer}
+    def claim_stale(self):
+        """
+        Claim all the stale entries that are not already claimed.
+        :return: the claim's token
+        :rtype: str
         """
-        profiles = {}
-        manager = managers.consumer_profile_manager()
-        for p in manager.get_profiles(id):
-            typeid = p['content_type']
-            profile = p['profile']
-            profiles[typeid] = profile
-        return ProfiledConsumer(id, profiles)
+        token = str(uuid4())
+        self.collection.update({'stale': True, 'refresh_token': None},
+                               {'$set': {'refresh_token': token}}, multi=True, safe=True)
+        return token
 
-    def __parse_units(self, user_units, repo_ids):
+    def find_claimed(self, token):
         """
-        Parse units specified by user and return a dictionary of all plugin unit_keys 
-        to be considered for applicability keyed by unit_type_id.
+        :return: the entries claimed with the given token
+        :rtype: iterable
+        """
+        fields = ['key', 'consumer_id', 'profile_hash', 'repo_ids', 'unit_type_id']
+        return self.collection.find({'refresh_token': token}, fields=fields)
+
+    def store(self, key, token, report_list):
+        """
+        Store the reports of an entry, if it is still claimed with the given
+        token. The entry is removed if there are no reports.
+        """
+        spec = {'key': key, 'refresh_token': token}
+        if report_list is None:
+            self.collection.remove(spec, safe=True)
+            return
+        update = {'$set': {'reports': _encode_reports(report_list),
+                           'stale': False,
+                           'refresh_token': None}}
+        self.collection.update(spec, update, safe=True)
+
+    def remove(self, spec):
+        """
+        Remove the matching entries. Claims on them are lost, so reports being
+        determined for them are not stored.
+        """
+        self.collection.remove(spec, safe=True)
 
+    def invalidate(self, spec):
+        """
+        Mark the matching entries as stale. Entries that are already stale
+        and not claimed are left untouched.
+        """
+        spec = dict(spec)
+        spec['$or'] = [{'stale': False}, {'refresh_token': {'$ne': None}}]
+        update = {'$set': {'stale': True, 'refresh_token': None}}
+        self.collection.update(spec, update, multi=True, safe=True)
+
+
+class _UnitKeyResolver(object):
+    """
+    Resolves the keys of the units to be checked for applicability against sets
+    of repos. The repo associations are loaded once for each repo, and the unit
+    keys are loaded once for each unit, no matter how many sets of repos they
+    are shared by.
+
+    :ivar user_units: dictionary of unit metadata filters keyed by unit-type-id specified by user
+    :type user_units: dict
+    """
+
+    def __init__(self, user_units):
+        """
         :param user_units: dictionary of unit metadata filters keyed by unit-type-id specified by user
         :type user_units: dict
+        """
+        self.user_units = user_units
+        # {<repo_id>: {<unit_type_id>: set(<unit_id>)}}
+        self.repo_units = {}
+        # {<unit_type_id>: {<unit_id>: <unit_key> or None when filtered out}}
+        self.unit_keys = {}
+
+    def resolve(self, repo_ids, unit_type_ids=None):
+        """
+        Return a dictionary of all plugin unit_keys to be considered for applicability
+        in the given repos keyed by unit_type_id.
+
+        :param repo_ids: set of repo ids
+        :type repo_ids: iterable
 
-        :return: if specific units are specified, return the corresponding plugin unit_keys. If units dict is empty, 
-                 return all plugin unit_keys corresponging to units in given repo ids keyed by unit_type_id. 
-                 If units list for a particular unit type in units is empty, return all plugin unit_keys 
+        :param unit_type_ids: if specified, only resolve units of these types
+        :type unit_type_ids: list
+
+        :return: if specific units are specified, return the corresponding plugin unit_keys. If units dict is empty,
+                 return all plugin unit_keys corresponding to units in given repo ids keyed by unit_type_id.
+                 If units list for a particular unit type in units is empty, return all plugin unit_keys
                  in given repo ids with that unit type keyed by unit_type_id.
         :rtype: dict
         """
-        repo_unit_association_query_manager = managers.repo_unit_association_query_manager()
-        content_query_manager = managers.content_query_manager()
+        self.__load_associations([r for r in repo_ids if r not in self.repo_units])
 
-        result_unit_keys = {}
-        if user_units is not None:
-            for unit_type_id, unit_list in user_units.items():
-                # Get unit type specific collection
-                collection = content_query_manager.get_content_unit_collection(type_id=unit_type_id)
-                type_def = content_types_db.type_definition(unit_type_id)
-                if not unit_list:
-                    # If unit_list is empty for a unit_type, consider all units of specific type
-                    criteria = UnitAssociationCriteria(unit_fields = ['unit_id'])
-                    for repo_id in repo_ids:
-                        repo_units = repo_unit_association_query_manager.get_units_by_type(repo_id, unit_type_id, criteria)
-                        # Get unit metadata for each unit from type specific collection
-                        pulp_units = [collection.find_one({'_id': u['unit_id']}) for u in repo_units]
-                        plugin_units = [common_utils.to_plugin_unit(u, type_def) for u in pulp_units]
-                        plugin_unit_keys = [u.unit_key for u in plugin_units]
-                        result_unit_keys.setdefault(unit_type_id, []).extend(plugin_unit_keys)
-                else:
-                    for unit in unit_list:
-                        criteria = UnitAssociationCriteria(unit_filters=unit, unit_fields = ['unit_id'])
-                        for repo_id in repo_ids:
-                            repo_units = repo_unit_association_query_manager.get_units_by_type(repo_id, unit_type_id, criteria)
-                            # Get unit metadata for each unit from type specific collection
-                            pulp_units = [collection.find_one({'_id': u['unit_id']}) for u in repo_units]
-                            plugin_units = [common_utils.to_plugin_unit(u, type_def) for u in pulp_units]
-                            plugin_unit_keys = [u.unit_key for u in plugin_units]
-                            result_unit_keys.setdefault(unit_type_id, []).extend(plugin_unit_keys)
-        else:
-            # If units are not specified, consider all units in repo_ids list.
-            for repo_id in repo_ids:
-                criteria = UnitAssociationCriteria(unit_fields = ['unit_id','unit_type_id'])
-                repo_units = repo_unit_association_query_manager.get_units(repo_id, criteria)
-                # Get unit metadata for each unit from type specific collection
-                for repo_unit in repo_units:
-                    collection = content_query_manager.get_content_unit_collection(type_id=repo_unit['unit_type_id'])
-                    type_def = content_types_db.type_definition(repo_unit['unit_type_id'])
-                    pulp_unit = collection.find_one({'_id': repo_unit['unit_id']})
-                    plugin_unit = common_utils.to_plugin_unit(pulp_unit, type_def)
-                    result_unit_keys.setdefault(repo_unit['unit_type_id'], []).append(plugin_unit.unit_key)
+        result_unit_ids = {}
+        if unit_type_ids is None and self.user_units is not None:
+            unit_type_ids = self.user_units.keys()
+        for unit_type_id in unit_type_ids or ():
+            result_unit_ids[unit_type_id] = set()
+        for repo_id in repo_ids:
+            for unit_type_id, unit_ids in self.repo_units[repo_id].items():
+                if unit_type_ids is None or unit_type_id in result_unit_ids:
+                    result_unit_ids.setdefault(unit_type_id, set()).update(unit_ids)
 
+        result_unit_keys = {}
+        for unit_type_id, unit_ids in result_unit_ids.items():
+            unit_keys = self.__unit_keys(unit_type_id, unit_ids)
+            result_unit_keys[unit_type_id] = \
+                [unit_keys[i] for i in sorted(unit_ids) if unit_keys[i] is not None]
         return result_unit_keys
 
+    def __load_associations(self, repo_ids):
+        # Load the unit ids in repos not yet loaded, of the types specified by user
+        for repo_id in repo_ids:
+            self.repo_units[repo_id] = {}
+        spec = {}
+        if self.user_units is not None:
+            spec['unit_type_id'] = {'$in': self.user_units.keys()}
+        fields = ['repo_id', 'unit_id', 'unit_type_id']
+        collection = RepoContentUnit.get_collection()
+        for page in paginate(repo_ids, APPLICABILITY_BATCH_SIZE):
+            spec['repo_id'] = {'$in': page}
+            for association in collection.find(spec, fields=fields):
+                unit_ids = self.repo_units[association['repo_id']].setdefault(association['unit_type_id'], set())
+                unit_ids.add(association['unit_id'])
+
+    def __unit_keys(self, unit_type_id, unit_ids):
+        # Load the keys of the units of the given type not yet loaded,
+        # applying the unit metadata filters specified by the user
+        unit_keys = self.unit_keys.setdefault(unit_type_id, {})
+        missing = [i for i in unit_ids if i not in unit_keys]
+        if not missing:
+            return unit_keys
+
+        type_def = content_types_db.type_definition(unit_type_id)
+        if type_def is None:
+            _LOG.warn("Unit type [%s] is not defined" % unit_type_id)
+            unit_keys.update(dict.fromkeys(missing))
+            return unit_keys
+
+        content_query_manager = managers.content_query_manager()
+        collection = content_query_manager.get_content_unit_collection(type_id=unit_type_id)
+        unit_filters = (self.user_units or {}).get(unit_type_id)
+        fields = list(type_def['unit_key'])
+        for page in paginate(missing, APPLICABILITY_BATCH_SIZE):
+            spec = {'_id': {'$in': page}}
+            if unit_filters:
+                spec['$or'] = unit_filters
+            for pulp_unit in collection.find(spec, fields=fields):
+                plugin_unit = common_utils.to_plugin_unit(pulp_unit, type_def)
+                unit_keys[pulp_unit['_id']] = plugin_unit.unit_key
+            for unit_id in page:
+                unit_keys.setdefault(unit_id, None)
+        return unit_keys
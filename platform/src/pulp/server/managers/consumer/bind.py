@@ -23,10 +23,14 @@ from pymongo.errors import DuplicateKeyError
 from pulp.server.db.model.consumer import Bind
 from pulp.server.exceptions import MissingResource, InvalidValue
 from pulp.server.managers import factory
+from pulp.server.util import paginate
 
 
 _LOG = getLogger(__name__)
 
+# Maximum number of consumers in each $in query
+BIND_BATCH_SIZE = 1000
+
 
 class BindManager(object):
     """
@@ -214,6 +218,22 @@ class BindManager(object):
         cursor = collection.find(query)
         return list(cursor)
 
+    def find_by_consumer_list(self, consumer_ids):
+        """
+        Find all non-deleted bindings for a list of consumers.
+        @param consumer_ids: A list of consumer IDs.
+        @type consumer_ids: list
+        @return: A dict of: {<consumer_id>:[<Bind>]}
+        @rtype: dict
+        """
+        binds = dict([(c, []) for c in consumer_ids])
+        collection = Bind.get_collection()
+        for page in paginate(binds.keys(), BIND_BATCH_SIZE):
+            query = {'consumer_id':{'$in':page}, 'deleted':False}
+            for bind in collection.find(query):
+                binds[bind['consumer_id']].append(bind)
+        return binds
+
     def find_by_repo(self, id):
         """
         Find all non-deleted bindings by Repo ID.
@@ -17,10 +17,13 @@ import sys
 
 from pymongo.errors import DuplicateKeyError
 
+from pulp.plugins.model import Consumer as ProfiledConsumer
 from pulp.server import exceptions as pulp_exceptions
+from pulp.server.agent import PulpAgent
 from pulp.server.db.model.consumer import Consumer, ConsumerGroup
 from pulp.server.exceptions import InvalidValue
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.consumer.group import fanout
 
 # -- constants ----------------------------------------------------------------
 
@@ -226,59 +229,171 @@ class ConsumerGroupManager(object):
     # content ------------------------------------------------------------
 
     def install_content(self, consumer_group_id, units, options):
-        group_collection = validate_existing_consumer_group(consumer_group_id)
-        consumer_group = group_collection.find_one({'id': consumer_group_id})
-        agent_manager = manager_factory.consumer_agent_manager()
-
-        for consumer_id in consumer_group['consumer_ids']:
-            agent_manager.install_content(consumer_id, units, options)
-
+        """
+        Install content units on the consumers in a consumer group.
+        @param consumer_group_id: unique id of the consumer group
+        @type  consumer_group_id: str
+        @param units: A list of content units to be installed.
+        @type  units: list of:
+            { type_id:<str>, unit_key:<dict> }
+        @param options: Install options; based on unit type.
+        @type  options: dict
+        @return: group progress report, see L{fanout.GroupProgress.report}
+        @rtype:  dict
+        @raise fanout.GroupOperationFailed: when the operation failed for any of the consumers
+        """
+        return self.__content(consumer_group_id, units, options, 'install')
 
     def update_content(self, consumer_group_id, units, options):
-        group_collection = validate_existing_consumer_group(consumer_group_id)
-        consumer_group = group_collection.find_one({'id': consumer_group_id})
-        agent_manager = manager_factory.consumer_agent_manager()
-
-        for consumer_id in consumer_group['consumer_ids']:
-            agent_manager.update_content(consumer_id, units, options)
+        """
+        Update content units on the consumers in a consumer group.
+        @param consumer_group_id: unique id of the consumer group
+        @type  consumer_group_id: str
+        @param units: A list of content units to be updated.
+        @type  units: list of:
+            { type_id:<str>, unit_key:<dict> }
+        @param options: Update options; based on unit type.
+        @type  options: dict
+        @return: group progress report, see L{fanout.GroupProgress.report}
+        @rtype:  dict
+        @raise fanout.GroupOperationFailed: when the operation failed for any of the consumers
+        """
+        return self.__content(consumer_group_id, units, options, 'update')
 
     def uninstall_content(self, consumer_group_id, units, options):
-        group_collection = validate_existing_consumer_group(consumer_group_id)
-        consumer_group = group_collection.find_one({'id': consumer_group_id})
+        """
+        Uninstall content units from the consumers in a consumer group.
+        @param consumer_group_id: unique id of the consumer group
+        @type  consumer_group_id: str
+        @param units: A list of content units to be uninstalled.
+        @type  units: list of:
+            { type_id:<str>, unit_key:<dict> }
+        @param options: Uninstall options; based on unit type.
+        @type  options: dict
+        @return: group progress report, see L{fanout.GroupProgress.report}
+        @rtype:  dict
+        @raise fanout.GroupOperationFailed: when the operation failed for any of the consumers
+        """
+        return self.__content(consumer_group_id, units, options, 'uninstall')
+
+    def __content(self, consumer_group_id, units, options, action):
+        """
+        Request the agents of the consumers in a consumer group to perform
+        a content action. The consumers and their profiles are looked up in
+        bulk and the units are translated for each consumer by the calling
+        thread; the requests are sent by the fan-out's worker threads.
+        """
+        consumer_group = get_existing_consumer_group(consumer_group_id)
+        consumer_ids = consumer_group['consumer_ids']
+        consumers = fanout.find_consumers(consumer_ids)
+        profile_manager = manager_factory.consumer_profile_manager()
+        profiles = profile_manager.find_profiles(consumers.keys())
         agent_manager = manager_factory.consumer_agent_manager()
 
-        for consumer_id in consumer_group['consumer_ids']:
-            agent_manager.uninstall_content(consumer_id, units, options)
+        progress = fanout.GroupProgress(consumer_group_id, action, consumer_ids)
+        group_fanout = fanout.GroupFanOut(progress)
+        profilers = {}
+        for consumer_id in consumer_ids:
+            consumer = consumers.get(consumer_id)
+            if consumer is None:
+                progress.failed(consumer_id, pulp_exceptions.MissingResource(consumer=consumer_id))
+                continue
+            try:
+                pc = ProfiledConsumer(consumer_id, profiles[consumer_id])
+                translated = agent_manager.translate_units(pc, units, options, action, profilers)
+                # the agent is created by the calling thread so that the
+                # request is associated with the call being dispatched
+                agent = PulpAgent(consumer)
+            except Exception, e:
+                _LOG.exception(e)
+                progress.failed(consumer_id, e)
+                continue
+            group_fanout.submit(consumer_id, getattr(agent.content, action), translated, options)
+        return group_fanout.wait()
 
     # bind ------------------------------------------------------------
 
-    def bind(self, consumer_group_id, repo_id, distributor_id, notify_agent, binding_config):
-        group_collection = validate_existing_consumer_group(consumer_group_id)
-        consumer_group = group_collection.find_one({'id': consumer_group_id})
+    def bind(self, consumer_group_id, repo_id, distributor_id, notify_agent=True, binding_config=None):
+        """
+        Bind the consumers in a consumer group to a distributor associated
+        with a repository.
+        @param consumer_group_id: unique id of the consumer group
+        @type  consumer_group_id: str
+        @param repo_id: uniquely identifies the repository.
+        @type  repo_id: str
+        @param distributor_id: uniquely identifies a distributor.
+        @type  distributor_id: str
+        @param notify_agent: indicates if the agents should be notified of the bindings
+        @type  notify_agent: bool
+        @param binding_config: configuration options to use when generating the
+                               payload for the bindings
+        @type  binding_config: dict or None
+        @return: group progress report, see L{fanout.GroupProgress.report}
+        @rtype:  dict
+        @raise fanout.GroupOperationFailed: when the operation failed for any of the consumers
+        @raise MissingResource: when the repository or distributor does not exist.
+        """
+        manager = manager_factory.repo_distributor_manager()
+        manager.get_distributor(repo_id, distributor_id)
         bind_manager = manager_factory.consumer_bind_manager()
-
-        binds = []
-        for consumer_id in consumer_group['consumer_ids']:
-            bind = bind_manager.bind(consumer_id, repo_id, distributor_id, notify_agent, binding_config)
-            binds.append(bind)
-
-        return binds
+        return self.__bindings(consumer_group_id, 'bind', bind_manager.bind,
+                               repo_id, distributor_id, notify_agent, binding_config)
 
     def unbind(self, consumer_group_id, repo_id, distributor_id):
-        group_collection = validate_existing_consumer_group(consumer_group_id)
-        consumer_group = group_collection.find_one({'id': consumer_group_id})
+        """
+        Unbind the consumers in a consumer group from a distributor
+        associated with a repository.
+        @param consumer_group_id: unique id of the consumer group
+        @type  consumer_group_id: str
+        @param repo_id: uniquely identifies the repository.
+        @type  repo_id: str
+        @param distributor_id: uniquely identifies a distributor.
+        @type  distributor_id: str
+        @return: group progress report, see L{fanout.GroupProgress.report}
+        @rtype:  dict
+        @raise fanout.GroupOperationFailed: when the operation failed for any of the consumers
+        """
         bind_manager = manager_factory.consumer_bind_manager()
+        return self.__bindings(consumer_group_id, 'unbind', bind_manager.unbind,
+                               repo_id, distributor_id)
 
-        unbinds = []
-        for consumer_id in consumer_group['consumer_ids']:
-            unbind = bind_manager.unbind(consumer_id, repo_id, distributor_id)
-            unbinds.append(unbind)
+    def __bindings(self, consumer_group_id, action, call, *args):
+        """
+        Run a bind manager call for each consumer, that exists, in a
+        consumer group using the fan-out's worker threads.
+        """
+        consumer_group = get_existing_consumer_group(consumer_group_id)
+        consumer_ids = consumer_group['consumer_ids']
+        consumers = fanout.find_consumers(consumer_ids)
 
-        return unbinds
+        progress = fanout.GroupProgress(consumer_group_id, action, consumer_ids)
+        group_fanout = fanout.GroupFanOut(progress)
+        for consumer_id in consumer_ids:
+            if consumer_id not in consumers:
+                progress.failed(consumer_id, pulp_exceptions.MissingResource(consumer=consumer_id))
+                continue
+            group_fanout.submit(consumer_id, call, consumer_id, *args)
+        return group_fanout.wait()
 
 
 # utility functions ------------------------------------------------------------
 
+def get_existing_consumer_group(group_id):
+    """
+    Get a consumer group, given its id.
+    @param group_id: unique id of the consumer group
+    @type  group_id: str
+    @return: the consumer group
+    @rtype:  L{bson.SON}
+    @raise:  L{pulp.server.exceptions.MissingResource}
+    """
+    collection = ConsumerGroup.get_collection()
+    consumer_group = collection.find_one({'id': group_id})
+    if consumer_group is not None:
+        return consumer_group
+    raise pulp_exceptions.MissingResource(consumer_group=group_id)
+
+
 def validate_existing_consumer_group(group_id):
     """
     Validate the existence of a consumer group, given its id.
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the License
+# (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied, including the
+# implied warranties of MERCHANTABILITY, NON-INFRINGEMENT, or FITNESS FOR A
+# PARTICULAR PURPOSE.
+# You should have received a copy of GPLv2 along with this software; if not,
+# see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
+
+"""
+Fan-out of consumer group operations to the consumers in the group.
+
+The data the operation needs for each consumer is looked up in bulk by the
+caller, which then submits a call per consumer to a L{GroupFanOut}. The calls
+are run by a bounded pool of worker threads and their outcome is tracked by a
+group level L{GroupProgress} report.
+"""
+
+import logging
+import threading
+from gettext import gettext as _
+
+from pulp.server import config as pulp_config
+from pulp.server.db.model.consumer import Consumer
+from pulp.server.dispatch import factory as dispatch_factory
+from pulp.server.dispatch.pool import WorkerPool
+from pulp.server.exceptions import PulpExecutionException
+from pulp.server.managers import factory as manager_factory
+from pulp.server.util import paginate
+
+# -- constants ----------------------------------------------------------------
+
+# Maximum number of consumers in each $in query
+CONSUMER_BATCH_SIZE = 1000
+
+# Number of completed consumers between progress reports
+PROGRESS_INTERVAL = 100
+
+_LOG = logging.getLogger(__name__)
+
+# -- bulk lookups -------------------------------------------------------------
+
+def find_consumers(consumer_ids):
+    """
+    Find consumers by ID.
+    @param consumer_ids: list of consumer IDs
+    @type  consumer_ids: list
+    @return: the consumers that exist keyed by ID
+    @rtype:  dict
+    """
+    consumers = {}
+    collection = Consumer.get_collection()
+    for page in paginate(consumer_ids, CONSUMER_BATCH_SIZE):
+        for consumer in collection.find({'id': {'$in': page}}):
+            consumers[consumer['id']] = consumer
+    return consumers
+
+# -- exceptions ---------------------------------------------------------------
+
+class GroupOperationFailed(PulpExecutionException):
+    """
+    Raised when an operation failed for any of the consumers in a consumer
+    group, so the failure is reflected in the state of the task that ran it.
+    The group progress report lists the consumers the operation succeeded and
+    failed for.
+    """
+
+    def __init__(self, report):
+        """
+        @param report: final progress report, see L{GroupProgress.report}
+        @type  report: dict
+        """
+        PulpExecutionException.__init__(self, report)
+        self.report = report
+
+    def __str__(self):
+        msg = _('%(a)s failed for %(f)d of %(t)d consumers in consumer group [%(g)s]') % \
+              {'a': self.report['action'], 'f': len(self.report['failed']),
+               't': self.report['total'], 'g': self.report['consumer_group_id']}
+        return msg.encode('utf-8')
+
+    def data_dict(self):
+        return {'report': self.report}
+
+# -- progress -----------------------------------------------------------------
+
+class GroupProgress(object):
+    """
+    Thread safe, group level, progress report of an operation on the consumers
+    in a consumer group. Progress is also reported to the dispatch task the
+    operation is run by, if any.
+
+    @ivar group_id: consumer group ID
+    @type group_id: str
+    @ivar action: name of the operation
+    @type action: str
+    @ivar total: number of consumers in the group
+    @type total: int
+    """
+
+    def __init__(self, group_id, action, consumer_ids):
+        self.group_id = group_id
+        self.action = action
+        self.total = len(consumer_ids)
+
+        self.__lock = threading.Lock()
+        self.__succeeded = []
+        self.__failed = {}
+        # the task's callback is looked up by the calling thread as the
+        # dispatch context is thread local
+        self.__report_progress = dispatch_factory.context().report_progress
+
+    def succeeded(self, consumer_id):
+        """
+        Record that the operation succeeded for a consumer.
+        @param consumer_id: consumer ID
+        @type  consumer_id: str
+        """
+        self.__lock.acquire()
+        try:
+            self.__succeeded.append(consumer_id)
+            self.__completed()
+        finally:
+            self.__lock.release()
+
+    def failed(self, consumer_id, exception):
+        """
+        Record that the operation failed for a consumer.
+        @param consumer_id: consumer ID
+        @type  consumer_id: str
+        @param exception: reason for the failure
+        @type  exception: Exception
+        """
+        self.__lock.acquire()
+        try:
+            self.__failed[consumer_id] = str(exception) or exception.__class__.__name__
+            self.__completed()
+        finally:
+            self.__lock.release()
+
+    def report(self):
+        """
+        Snapshot of the progress of the operation.
+        @return: dictionary of the group ID, action, total number of consumers,
+                 number of completed consumers, the IDs of the consumers the
+                 operation succeeded for and the reasons it failed keyed by
+                 the IDs of the consumers it failed for
+        @rtype:  dict
+        """
+        self.__lock.acquire()
+        try:
+            return self.__report()
+        finally:
+            self.__lock.release()
+
+    def __report(self):
+        # NOTE must be called with the lock held
+        return {'consumer_group_id': self.group_id,
+                'action': self.action,
+                'total': self.total,
+                'completed': len(self.__succeeded) + len(self.__failed),
+                'succeeded': list(self.__succeeded),
+                'failed': dict(self.__failed)}
+
+    def __completed(self):
+        # NOTE must be called with the lock held
+        completed = len(self.__succeeded) + len(self.__failed)
+        if completed % PROGRESS_INTERVAL == 0 or completed == self.total:
+            self.__report_progress(self.__report())
+
+# -- fan-out ------------------------------------------------------------------
+
+class GroupFanOut(object):
+    """
+    Runs a call for each consumer in a consumer group in a bounded pool of
+    worker threads, recording the outcome of each in a L{GroupProgress}.
+    The calls are run on behalf of the principal of the calling thread.
+
+    @ivar progress: progress report of the operation
+    @type progress: L{GroupProgress}
+    """
+
+    def __init__(self, progress, max_workers=None):
+        """
+        @param progress: progress report of the operation
+        @type  progress: L{GroupProgress}
+        @param max_workers: maximum number of worker threads, defaults to the
+                            group_fanout_workers setting of the messaging
+                            section of the configuration
+        @type  max_workers: None or int
+        """
+        if max_workers is None:
+            max_workers = pulp_config.config.getint('messaging', 'group_fanout_workers')
+        self.progress = progress
+        self.__principal = manager_factory.principal_manager().get_principal()
+        self.__pool = WorkerPool('group-fanout', max(1, max_workers))
+
+    def submit(self, consumer_id, call, *args, **kwargs):
+        """
+        Submit the call for a consumer.
+        @param consumer_id: consumer ID
+        @type  consumer_id: str
+        @param call: callable to run for the consumer
+        @type  call: callable
+        """
+        self.__pool.submit(self.__run, consumer_id, call, args, kwargs)
+
+    def wait(self):
+        """
+        Wait for all the submitted calls to complete.
+        @return: final progress report, see L{GroupProgress.report}
+        @rtype:  dict
+        @raise GroupOperationFailed: when the operation failed for any of
+                                     the consumers
+        """
+        self.__pool.stop()
+        report = self.progress.report()
+        if report['failed']:
+            raise GroupOperationFailed(report)
+        return report
+
+    def __run(self, consumer_id, call, args, kwargs):
+        principal_manager = manager_factory.principal_manager()
+        principal_manager.set_principal(self.__principal)
+        try:
+            try:
+                call(*args, **kwargs)
+            except Exception, e:
+                _LOG.exception(e)
+                self.progress.failed(consumer_id, e)
+            else:
+                self.progress.succeeded(consumer_id)
+        finally:
+            principal_manager.clear_principal()
@@ -18,11 +18,15 @@ Contains profile management classes
 from pulp.server.exceptions import MissingResource
 from pulp.server.db.model.consumer import UnitProfile
 from pulp.server.managers import factory
+from pulp.server.util import paginate
 from logging import getLogger
 
 
 _LOG = getLogger(__name__)
 
+# Maximum number of consumers in each $in query
+PROFILE_BATCH_SIZE = 1000
+
 
 class ProfileManager(object):
     """
@@ -52,15 +56,23 @@ class ProfileManager(object):
         @type content_type: str
         @param profile: The unit profile
         @type profile: object
+        @return: The stored profile.
+        @rtype: L{UnitProfile}
         """
         manager = factory.consumer_manager()
         manager.get_consumer(consumer_id)
-        try:
-            p = self.get_profile(consumer_id, content_type)
-            p['profile'] = profile
-        except MissingResource:
-            p = UnitProfile(consumer_id, content_type, profile)
+        p = UnitProfile(consumer_id, content_type, profile)
         collection = UnitProfile.get_collection()
+        profile_id = dict(consumer_id=consumer_id, content_type=content_type)
+        stored = collection.find_one(profile_id, fields=['id', 'profile_hash'])
+        if stored is not None:
+            p['_id'] = stored['_id']
+            # profiles upgraded from v1 may not have an id
+            if 'id' in stored:
+                p['id'] = stored['id']
+            # An unchanged profile is not written
+            if stored.get('profile_hash') == p['profile_hash']:
+                return p
         collection.save(p, safe=True)
         return p
 
@@ -75,6 +87,7 @@ class ProfileManager(object):
         profile = self.get_profile(consumer_id, content_type)
         collection = UnitProfile.get_collection()
         collection.remove(profile, safe=True)
+        factory.consumer_applicability_manager().remove_consumer(consumer_id)
 
     def consumer_deleted(self, id):
         """
@@ -86,6 +99,7 @@ class ProfileManager(object):
         collection = UnitProfile.get_collection()
         for p in self.get_profiles(id):
             collection.remove(p, sefe=True)
+        factory.consumer_applicability_manager().remove_consumer(id)
 
     def get_profile(self, consumer_id, content_type):
         """
@@ -106,6 +120,28 @@ class ProfileManager(object):
         else:
             return profile
 
+    def get_profile_hash(self, consumer_id, content_type):
+        """
+        Get the content hash of a profile by consumer ID and content type ID,
+        without loading the profile itself.
+        @param consumer_id: uniquely identifies the consumer.
+        @type consumer_id: str
+        @param content_type: The profile (content) type ID.
+        @type content_type: str
+        @return: The profile without its content:
+            {consumer_id:<str>, content_type:<str>, profile_hash:<str>}
+        @rtype: dict
+        @raise MissingResource when profile not found.
+        """
+        collection = UnitProfile.get_collection()
+        profile_id = dict(consumer_id=consumer_id, content_type=content_type)
+        fields = ['id', 'consumer_id', 'content_type', 'profile_hash']
+        profile = collection.find_one(profile_id, fields=fields)
+        if profile is None:
+            raise MissingResource(profile_id=profile_id)
+        else:
+            return profile
+
     def get_profiles(self, consumer_id):
         """
         Get all profiles associated with a consumer.
@@ -131,10 +167,29 @@ class ProfileManager(object):
         """
         profiles = dict([(c, {}) for c in consumer_ids])
         collection = UnitProfile.get_collection()
-        for p in collection.find({'id':{'$in':profiles.keys()}}):
-            key = p['consumer_id']
-            typeid = p['content_type']
-            profile = p['profile']
-            entry = profiles[key]
-            entry[typeid] = profile
-        return profiles
\ No newline at end of file
+        for page in paginate(profiles.keys(), PROFILE_BATCH_SIZE):
+            for p in collection.find({'consumer_id':{'$in':page}}):
+                key = p['consumer_id']
+                typeid = p['content_type']
+                profile = p['profile']
+                entry = profiles[key]
+                entry[typeid] = profile
+        return profiles
+
+    def find_profile_hashes(self, consumer_ids):
+        """
+        Get the content hashes of all profiles associated with given
+        consumers, without loading the profiles themselves.
+        @param consumer_ids: A list of consumer IDs.
+        @type consumer_ids: list
+        @return: A dict of:
+            {<consumer_id>:{<content_type>:<profile_hash>}}
+        @rtype: dict
+        """
+        hashes = dict([(c, {}) for c in consumer_ids])
+        collection = UnitProfile.get_collection()
+        fields = ['consumer_id', 'content_type', 'profile_hash']
+        for page in paginate(hashes.keys(), PROFILE_BATCH_SIZE):
+            for p in collection.find({'consumer_id':{'$in':page}}, fields=fields):
+                hashes[p['consumer_id']][p['content_type']] = p.get('profile_hash')
+        return hashes
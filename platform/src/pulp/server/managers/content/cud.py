@@ -42,6 +42,28 @@ class ContentManager(object):
         collection.insert(unit_doc, safe=True)
         return unit_id
 
+    def add_content_units(self, content_type, units_metadata):
+        """
+        Add multiple content units and their metadata to the corresponding pulp
+        db collection using a single bulk insert. Ids are always generated.
+        @param content_type: unique id of content collection
+        @type content_type: str
+        @param units_metadata: list of content unit metadata
+        @type units_metadata: list of dict's
+        @return: list of generated unit ids, in the same order as the metadata
+        @rtype: list of str's
+        """
+        if not units_metadata:
+            return []
+        collection = content_types_db.type_units_collection(content_type)
+        unit_docs = []
+        for unit_metadata in units_metadata:
+            unit_doc = {'_id': str(uuid.uuid4()), '_content_type_id': content_type}
+            unit_doc.update(unit_metadata)
+            unit_docs.append(unit_doc)
+        collection.insert(unit_docs, safe=True)
+        return [d['_id'] for d in unit_docs]
+
     def update_content_unit(self, content_type, unit_id, unit_metadata_delta):
         """
         Update a content unit's stored metadata.
@@ -11,22 +11,34 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import heapq
 import logging
 import os
+import Queue
 import re
 import shutil
+import threading
 from gettext import gettext as _
 
+import pymongo
+
 from pulp.server import config as pulp_config
 from pulp.plugins.types import database as content_types_db
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.dispatch import factory as dispatch_factory
 from pulp.server.managers import factory as manager_factory
+from pulp.server.util import paginate
 
 
 _LOG = logging.getLogger(__name__)
 
 
+# Number of content units examined, and deleted, in a single pass; keeps the
+# queries well under the database's document size limits
+ORPHAN_BATCH_SIZE = 1000
+
+
 class OrphanManager(object):
 
     def list_all_orphans(self):
@@ -35,15 +47,24 @@ class OrphanManager(object):
         @return: list of content units
         @rtype:  list
         """
+        return list(self.generate_all_orphans())
+
+    def generate_all_orphans(self, fields=None):
+        """
+        Return a generator of all content units that are not associated with a
+        repository.
+        @param fields: list of fields to include in the units; None means all fields
+        @type  fields: None or list
+        @return: generator of content units
+        @rtype:  generator
+        """
 
         # iterate through all types and get the orphaned units for each
-        orphaned_units = []
         content_query_manager = manager_factory.content_query_manager()
         content_types = content_query_manager.list_content_types()
         for content_type in content_types:
-            orphaned_units_of_type = self.list_orphans_by_type(content_type)
-            orphaned_units.extend(orphaned_units_of_type)
-        return orphaned_units
+            for orphan in self.generate_orphans_by_type(content_type, fields=fields):
+                yield orphan
 
     def list_orphans_by_type(self, content_type):
         """
@@ -53,17 +74,50 @@ class OrphanManager(object):
         @return: list of content units of the given type
         @rtype:  list
         """
+        return list(self.generate_orphans_by_type(content_type))
 
-        # find units of this type that are associated with one or more repositories
-        associated_collection = RepoContentUnit.get_collection()
-        associated_units = associated_collection.find({'unit_type_id': content_type}, fields=['unit_id'])
-        associated_unit_ids = set(d['unit_id'] for d in associated_units)
+    def generate_orphans_by_type(self, content_type, fields=None):
+        """
+        Return a generator of all content units of a given type that are not
+        associated with a repository.
+
+        The units collection is walked in _id order a batch at a time and each
+        batch is checked against the repository associations with a single
+        query, so neither the memory used nor the size of any query grows with
+        the number of units.
 
-        # find units that are not associated with any repositories
+        @param content_type: content type of orphaned units
+        @type  content_type: str
+        @param fields: list of fields to include in the units; None means all fields
+        @type  fields: None or list
+        @return: generator of content units of the given type
+        @rtype:  generator
+        """
         units_collection = content_types_db.type_units_collection(content_type)
-        spec = {'_id': {'$nin': list(associated_unit_ids)}}
-        orphaned_units = units_collection.find(spec)
-        return list(orphaned_units)
+        associated_collection = RepoContentUnit.get_collection()
+
+        last_id = None
+        while True:
+            spec = {}
+            if last_id is not None:
+                spec['_id'] = {'$gt': last_id}
+            cursor = units_collection.find(spec, fields=fields)
+            cursor.sort('_id', pymongo.ASCENDING)
+            cursor.limit(ORPHAN_BATCH_SIZE)
+            units = list(cursor)
+            if not units:
+                return
+            last_id = units[-1]['_id']
+
+            # find units in this batch that are associated with one or more repositories
+            unit_ids = [u['_id'] for u in units]
+            associated_spec = {'unit_type_id': content_type, 'unit_id': {'$in': unit_ids}}
+            associated_units = associated_collection.find(associated_spec, fields=['unit_id'])
+            associated_unit_ids = set(associated_units.distinct('unit_id'))
+
+            for unit in units:
+                if unit['_id'] not in associated_unit_ids:
+                    yield unit
 
     def get_orphan(self, content_type, content_id):
         """
@@ -73,11 +127,12 @@ class OrphanManager(object):
         @param content_id: content id of the orphan
         @type  content_id: str
         """
-        orphans = self.list_orphans_by_type(content_type)
-        for orphan in orphans:
-            if content_id != orphan['_id']:
-                continue
-            return orphan
+        units_collection = content_types_db.type_units_collection(content_type)
+        orphan = units_collection.find_one({'_id': content_id})
+        if orphan is not None:
+            spec = {'unit_type_id': content_type, 'unit_id': content_id}
+            if RepoContentUnit.get_collection().find_one(spec, fields=['unit_id']) is None:
+                return orphan
         raise pulp_exceptions.MissingResource(content_type=content_type, content_id=content_id)
 
     def delete_all_orphans(self):
@@ -88,25 +143,50 @@ class OrphanManager(object):
         # iterate through the types and delete all orphans of each type
         content_query_manager = manager_factory.content_query_manager()
         content_types = content_query_manager.list_content_types()
+        progress = {}
         for content_type in content_types:
-            self.delete_orphans_by_type(content_type)
+            self.delete_orphans_by_type(content_type, progress=progress)
 
-    def delete_orphans_by_type(self, content_type):
+    def delete_orphans_by_type(self, content_type, progress=None):
         """
         Delete all orphaned content units of the given content type.
+
+        The orphans are deleted in batches. The number of units deleted so far,
+        and the number of bytes freed on disk by removing their files, are
+        reported as the progress of the dispatch task running this call.
+
         @param content_type: content type of the orphans to delete
         @type  content_type: str
+        @param progress: progress report to update; used to aggregate the
+                         progress of multiple calls
+        @type  progress: None or dict
         """
+        if progress is None:
+            progress = {}
+        type_progress = progress.setdefault(content_type, {'deleted': 0, 'bytes_freed': 0})
 
-        orphaned_units = self.list_orphans_by_type(content_type)
-        if not orphaned_units:
-            return
         collection = content_types_db.type_units_collection(content_type)
-        spec = {'_id': {'$in': [o['_id'] for o in orphaned_units]}}
-        collection.remove(spec, safe=True)
-        orphaned_paths = [o['_storage_path'] for o in orphaned_units if o['_storage_path'] is not None]
-        for path in orphaned_paths:
-            self.delete_orphaned_file(path)
+        orphans = self.generate_orphans_by_type(content_type, fields=['_id', '_storage_path'])
+        file_deleter = OrphanFileDeleter()
+
+        try:
+            # the generator walks the units in _id order starting after the last
+            # unit it examined, so removing the units it has already returned
+            # does not disturb the walk
+            for orphaned_units in paginate(orphans, ORPHAN_BATCH_SIZE):
+                spec = {'_id': {'$in': [o['_id'] for o in orphaned_units]}}
+                collection.remove(spec, safe=True)
+                for unit in orphaned_units:
+                    if unit.get('_storage_path') is not None:
+                        file_deleter.delete(unit['_storage_path'])
+
+                type_progress['deleted'] += len(orphaned_units)
+                type_progress['bytes_freed'] = file_deleter.bytes_freed
+                _report_progress(progress)
+
+        finally:
+            type_progress['bytes_freed'] = file_deleter.finish()
+            _report_progress(progress)
 
     def delete_orphans_by_id(self, orphans):
         """
@@ -126,58 +206,224 @@ class OrphanManager(object):
 
         # iterate through the types and ids
         content_query_manager = manager_factory.content_query_manager()
+        progress = {}
         for content_type, content_id_list in orphans_by_id.items():
+            type_progress = progress.setdefault(content_type, {'deleted': 0, 'bytes_freed': 0})
+            collection = content_types_db.type_units_collection(content_type)
+            file_deleter = OrphanFileDeleter()
 
-            # build a list of the on-disk contents
-            orphaned_paths = []
-            for unit_id in content_id_list:
-                content_unit = content_query_manager.get_content_unit_by_id(content_type, unit_id, model_fields=['_storage_path'])
-                if content_unit['_storage_path'] is not None:
-                    orphaned_paths.append(content_unit['_storage_path'])
+            try:
+                for id_batch in paginate(content_id_list, ORPHAN_BATCH_SIZE):
 
-            # remove the orphans from the db
-            collection = content_types_db.type_units_collection(content_type)
-            spec = {'_id': {'$in': content_id_list}}
-            collection.remove(spec, safe=True)
+                    # look up the on-disk contents of the whole batch at once
+                    content_units = content_query_manager.get_multiple_units_by_ids(
+                        content_type, id_batch, model_fields=['_storage_path'])
+
+                    # remove the orphans from the db
+                    spec = {'_id': {'$in': id_batch}}
+                    collection.remove(spec, safe=True)
+
+                    # hand the on-disk contents off to be deleted
+                    for content_unit in content_units:
+                        if content_unit.get('_storage_path') is not None:
+                            file_deleter.delete(content_unit['_storage_path'])
+
+                    type_progress['deleted'] += len(content_units)
 
-            # delete the on-disk contents
-            for path in orphaned_paths:
-                self.delete_orphaned_file(path)
+            finally:
+                type_progress['bytes_freed'] = file_deleter.finish()
+
+            _report_progress(progress)
 
     def delete_orphaned_file(self, path):
         """
         Delete an orphaned file and any parent directories that become empty.
         @param path: absolute path to the file to delete
         @type  path: str
+        @return: number of bytes freed by deleting the file
+        @rtype:  int
         """
-        assert os.path.isabs(path)
+        bytes_freed = _delete_path(path)
+        _prune_empty_directories([os.path.dirname(path)])
+        return bytes_freed
 
-        _LOG.debug(_('Deleting orphaned file: %(p)s') % {'p': path})
+# orphaned file deletion -------------------------------------------------------
 
-        if not os.path.exists(path):
-            _LOG.warn(_('Cannot delete orphaned file: %(p)s, No such file') % {'p': path})
-            return
+class OrphanFileDeleter(object):
+    """
+    Deletes the on-disk contents of orphaned content units using a bounded pool
+    of worker threads.
 
-        if not os.access(path, os.W_OK):
-            _LOG.warn(_('Cannot delete orphaned file: %(p)s, Insufficient permissions') % {'p': path})
-            return
+    Paths are handed to the workers through a bounded queue, so adding paths
+    blocks once the workers fall behind instead of buffering an entire
+    deletion in memory. The parent directories of the deleted paths are
+    collected while the workers run and are pruned, each a single time, once
+    all of the paths have been deleted.
+
+    Typical usage::
 
-        if os.path.isfile(path) or os.path.islink(path):
-            os.unlink(path)
-        elif os.path.isdir(path):
-            shutil.rmtree(path)
+        deleter = OrphanFileDeleter()
+        try:
+            for path in paths:
+                deleter.delete(path)
+        finally:
+            bytes_freed = deleter.finish()
 
-        # delete parent directories on the path as long as they fall empty
-        storage_dir = pulp_config.config.get('server', 'storage_dir')
-        root_content_regex = re.compile(os.path.join(storage_dir, 'content', '[^/]+/?'))
+    @ivar bytes_freed: number of bytes freed by the paths deleted so far
+    @type bytes_freed: int
+    """
+
+    def __init__(self, num_workers=None):
+        """
+        @param num_workers: number of worker threads deleting paths; defaults
+                            to the server's orphan_file_workers setting
+        @type  num_workers: None or int
+        """
+        if num_workers is None:
+            num_workers = pulp_config.config.getint('server', 'orphan_file_workers')
+        num_workers = max(1, num_workers)
+
+        self.bytes_freed = 0
+
+        self._queue = Queue.Queue(maxsize=ORPHAN_BATCH_SIZE)
+        self._lock = threading.Lock()
+        self._parent_dirs = set()
+        self._finished = False
+
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._run)
+            worker.setDaemon(True)
+            worker.start()
+            self._workers.append(worker)
+
+    def delete(self, path):
+        """
+        Queue a file or directory to be deleted.
+        @param path: absolute path to the file or directory to delete
+        @type  path: str
+        """
+        assert not self._finished
+        assert os.path.isabs(path)
+        self._queue.put(path)
+
+    def finish(self):
+        """
+        Wait for all of the queued paths to be deleted, stop the worker threads
+        and prune the parent directories that have fallen empty.
+        @return: total number of bytes freed
+        @rtype:  int
+        """
+        if not self._finished:
+            self._finished = True
+            for worker in self._workers:
+                self._queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            _prune_empty_directories(self._parent_dirs)
+        return self.bytes_freed
+
+    def _run(self):
+        """
+        Worker thread body: delete queued paths until a None sentinel is found.
+        """
         while True:
-            path = os.path.dirname(path)
-            if root_content_regex.match(path):
-                break
-            contents = os.listdir(path)
-            if contents:
-                break
-            if not os.access(path, os.W_OK):
-                break
-            os.rmdir(path)
+            path = self._queue.get()
+            if path is None:
+                return
+            try:
+                bytes_freed = _delete_path(path)
+            except Exception:
+                _LOG.exception(_('Error deleting orphaned file: %(p)s') % {'p': path})
+                continue
+            self._lock.acquire()
+            try:
+                self.bytes_freed += bytes_freed
+                self._parent_dirs.add(os.path.dirname(path))
+            finally:
+                self._lock.release()
+
+# utility functions ------------------------------------------------------------
+
+def _report_progress(progress):
+    """
+    Report the progress of an orphan deletion to the dispatch task, if any,
+    running the deletion.
+    @param progress: map of content type to deletion statistics
+    @type  progress: dict
+    """
+    dispatch_factory.context().report_progress(progress)
+
+
+def _delete_path(path):
+    """
+    Delete an orphaned file, link or directory tree.
+    @param path: absolute path to delete
+    @type  path: str
+    @return: number of bytes freed
+    @rtype:  int
+    """
+    assert os.path.isabs(path)
+
+    _LOG.debug(_('Deleting orphaned file: %(p)s') % {'p': path})
 
+    if not os.path.lexists(path):
+        _LOG.warn(_('Cannot delete orphaned file: %(p)s, No such file') % {'p': path})
+        return 0
+
+    if not os.access(path, os.W_OK):
+        _LOG.warn(_('Cannot delete orphaned file: %(p)s, Insufficient permissions') % {'p': path})
+        return 0
+
+    bytes_freed = 0
+    if os.path.isfile(path) or os.path.islink(path):
+        bytes_freed = os.lstat(path).st_size
+        os.unlink(path)
+    elif os.path.isdir(path):
+        for dir_path, dir_names, file_names in os.walk(path):
+            for name in file_names:
+                try:
+                    bytes_freed += os.lstat(os.path.join(dir_path, name)).st_size
+                except OSError:
+                    pass
+        shutil.rmtree(path)
+    return bytes_freed
+
+
+def _prune_empty_directories(directories):
+    """
+    Remove the given directories, and their parents, as long as they fall
+    empty. Directories are examined deepest first and each directory is
+    examined only once, so a directory is never checked before all of the
+    directories beneath it have been pruned. Pruning stops at the root of each
+    content type's storage.
+    @param directories: absolute paths of directories to prune
+    @type  directories: iterable
+    """
+    storage_dir = pulp_config.config.get('server', 'storage_dir')
+    root_content_regex = re.compile(os.path.join(storage_dir, 'content', '[^/]+/?$'))
+
+    # heap of (negative depth, path) so the deepest directories come out first
+    heap = []
+    for path in set(directories):
+        heapq.heappush(heap, (-path.count(os.sep), path))
+
+    examined = set()
+    while heap:
+        depth, path = heapq.heappop(heap)
+        if path in examined:
+            continue
+        examined.add(path)
+        if root_content_regex.match(path) or path == os.path.dirname(path):
+            continue
+        if not os.path.isdir(path) or os.listdir(path):
+            continue
+        if not os.access(path, os.W_OK):
+            continue
+        try:
+            os.rmdir(path)
+        except OSError:
+            _LOG.warn(_('Cannot remove empty directory: %(p)s') % {'p': path})
+            continue
+        parent = os.path.dirname(path)
+        heapq.heappush(heap, (-parent.count(os.sep), parent))
@@ -224,13 +224,19 @@ class ContentUploadManager(object):
 
         # Invoke the importer
         try:
-            importer_instance.upload_unit(transfer_repo, unit_type_id, unit_key, unit_metadata, file_path, conduit, call_config)
-        except PulpException:
-            _LOG.exception('Error from the importer while importing uploaded unit to repository [%s]' % repo_id)
-            raise
-        except Exception, e:
-            _LOG.exception('Error from the importer while importing uploaded unit to repository [%s]' % repo_id)
-            raise PulpExecutionException(e), None, sys.exc_info()[2]
+            try:
+                importer_instance.upload_unit(transfer_repo, unit_type_id, unit_key, unit_metadata, file_path, conduit, call_config)
+            except PulpException:
+                _LOG.exception('Error from the importer while importing uploaded unit to repository [%s]' % repo_id)
+                raise
+            except Exception, e:
+                _LOG.exception('Error from the importer while importing uploaded unit to repository [%s]' % repo_id)
+                raise PulpExecutionException(e), None, sys.exc_info()[2]
+        finally:
+            # The conduit defers invalidating the cached applicability so it
+            # happens once for the upload, even if the importer failed part way
+            if conduit._applicability_stale:
+                manager_factory.consumer_applicability_manager().invalidate_repo(repo_id)
 
         # TODO: Add support for tracking the report as a history entry on the repo
 
@@ -267,6 +267,9 @@ class RepoManager(object):
 
             # Remove all associations from the repo
             RepoContentUnit.get_collection().remove({'repo_id' : repo_id}, safe=True)
+
+            # Remove the cached applicability of the repo's content
+            manager_factory.consumer_applicability_manager().remove_repo(repo_id)
         except Exception, e:
             _LOG.exception('Error updating one or more database collections while removing repo [%s]' % repo_id)
             error_tuples.append( (_('Database Removal Error'), e.args))
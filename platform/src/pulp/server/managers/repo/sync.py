@@ -109,7 +109,13 @@ class RepoSyncManager(object):
         # Fire an events around the call
         fire_manager = manager_factory.event_fire_manager()
         fire_manager.fire_repo_sync_started(repo_id)
-        sync_result = self._do_sync(repo, importer_instance, transfer_repo, conduit, call_config)
+        try:
+            sync_result = self._do_sync(repo, importer_instance, transfer_repo, conduit, call_config)
+        finally:
+            # The conduit defers invalidating the cached applicability so it
+            # happens once for the sync, even if the importer failed part way
+            if conduit._applicability_stale:
+                manager_factory.consumer_applicability_manager().invalidate_repo(repo_id)
         fire_manager.fire_repo_sync_finished(sync_result)
 
         dispatch_context.clear_cancel_control_hook()
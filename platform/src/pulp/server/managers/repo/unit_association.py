@@ -16,8 +16,10 @@ Contains the manager class and exceptions for handling the mappings between
 repositories and content units.
 """
 
+import copy
 import logging
 import pymongo
+from pymongo.errors import DuplicateKeyError
 import sys
 
 import pulp.plugins.conduits._common as conduit_common_utils
@@ -30,6 +32,7 @@ from pulp.server.db.model.repository import RepoContentUnit
 import pulp.server.managers.factory as manager_factory
 import pulp.server.exceptions as exceptions
 import pulp.server.managers.repo._common as common_utils
+from pulp.server.util import paginate
 
 # -- constants ----------------------------------------------------------------
 
@@ -56,6 +59,15 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Maximum number of units handled in a single database call by the bulk
+# association and unassociation calls
+ASSOCIATION_BATCH_SIZE = 1000
+
+# Key in an importer's metadata indicating units can be associated into its
+# repositories directly by the server in associate_from_repo; see the
+# Importer.metadata documentation
+SERVER_SIDE_COPY = 'server_side_copy'
+
 # -- manager ------------------------------------------------------------------
 
 class RepoUnitAssociationManager(object):
@@ -68,7 +80,7 @@ class RepoUnitAssociationManager(object):
     # -- association manipulation ---------------------------------------------
 
     def associate_unit_by_id(self, repo_id, unit_type_id, unit_id, owner_type,
-                             owner_id, update_unit_count=True):
+                             owner_id, update_unit_count=True, invalidate_applicability=True):
         """
         Creates an association between the given repository and content unit.
 
@@ -104,6 +116,18 @@ class RepoUnitAssociationManager(object):
                                   defaults to True
         @type  update_unit_count: bool
 
+        @param invalidate_applicability: if True, marks the applicability
+                                         cached for the repo as stale when its
+                                         units change. Set this to False when
+                                         making many calls as part of a single
+                                         operation, and make one call to
+                                         invalidate the repo at the end.
+                                         defaults to True
+        @type  invalidate_applicability: bool
+
+        @return: True if the association was created; False if it already existed
+        @rtype:  bool
+
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
 
@@ -118,7 +142,7 @@ class RepoUnitAssociationManager(object):
                 'owner_id' : owner_id,}
         existing_association = RepoContentUnit.get_collection().find_one(spec)
         if existing_association is not None:
-            return
+            return False
 
         similar_exists = False
         if update_unit_count:
@@ -133,7 +157,13 @@ class RepoUnitAssociationManager(object):
             manager = manager_factory.repo_manager()
             manager.update_unit_count(repo_id, unit_type_id, 1)
 
-    def associate_all_by_ids(self, repo_id, unit_type_id, unit_id_list, owner_type, owner_id):
+        if invalidate_applicability and not similar_exists:
+            manager_factory.consumer_applicability_manager().invalidate_repo(repo_id)
+
+        return True
+
+    def associate_all_by_ids(self, repo_id, unit_type_id, unit_id_list, owner_type, owner_id,
+                             invalidate_applicability=True):
         """
         Creates multiple associations between the given repo and content units.
 
@@ -156,23 +186,73 @@ class RepoUnitAssociationManager(object):
                          the importer ID or user login
         @type  owner_id: str
 
+        @param invalidate_applicability: if True, marks the applicability
+                                         cached for the repo as stale when units
+                                         are added. Set this to False when
+                                         making many calls as part of a single
+                                         operation, and make one call to
+                                         invalidate the repo at the end.
+                                         defaults to True
+        @type  invalidate_applicability: bool
+
+        @return: number of units that were not associated with the repo before
+        @rtype:  int
+
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
 
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
+        if owner_type not in _OWNER_TYPES:
+            raise exceptions.InvalidValue(['owner_type'])
+
+        collection = RepoContentUnit.get_collection()
 
+        # Remove duplicate IDs while preserving the order they were given in
+        seen = set()
+        unit_id_list = [i for i in unit_id_list if not (i in seen or seen.add(i))]
+
+        # Each batch costs one query to find the existing associations and one
+        # bulk insert for the new ones; the unit count is updated once at the end
         unique_count = 0
-        for unit_id in unit_id_list:
-            if not self.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, owner_type, owner_id, False)
+        for page in paginate(unit_id_list, ASSOCIATION_BATCH_SIZE):
+            spec = {'repo_id' : repo_id,
+                    'unit_type_id' : unit_type_id,
+                    'unit_id' : {'$in' : page}}
+            fields = ['unit_id', 'owner_type', 'owner_id']
+
+            associated_ids = set()
+            owned_ids = set()
+            for association in collection.find(spec, fields=fields):
+                associated_ids.add(association['unit_id'])
+                if association['owner_type'] == owner_type and association['owner_id'] == owner_id:
+                    owned_ids.add(association['unit_id'])
+
+            new_associations = [RepoContentUnit(repo_id, unit_id, unit_type_id, owner_type, owner_id)
+                                for unit_id in page if unit_id not in owned_ids]
+            if not new_associations:
+                continue
+
+            try:
+                collection.insert(new_associations, safe=True)
+            except DuplicateKeyError:
+                # A concurrent call created one of the associations between the
+                # query and the insert; fall back to saving them individually
+                # so the rest of the batch isn't lost
+                for association in new_associations:
+                    try:
+                        collection.insert(association, safe=True)
+                    except DuplicateKeyError:
+                        pass
+
+            unique_count += len([i for i in page if i not in associated_ids])
 
         # update the count of associated units on the repo object
         if unique_count:
             manager_factory.repo_manager().update_unit_count(
                 repo_id, unit_type_id, unique_count)
+            if invalidate_applicability:
+                manager_factory.consumer_applicability_manager().invalidate_repo(repo_id)
+
+        return unique_count
 
     def associate_from_repo(self, source_repo_id, dest_repo_id, criteria=None, import_config_override=None):
         """
@@ -193,6 +273,10 @@ class RepoUnitAssociationManager(object):
         If criteria is None, the effect of this call is to copy the source
         repository's associations into the destination repository.
 
+        If the destination repository's importer declares server_side_copy in
+        its metadata, the importer is not called. Instead, the associations
+        are copied directly from the source repository in batches.
+
         @param source_repo_id: identifies the source repository
         @type  source_repo_id: str
 
@@ -224,7 +308,16 @@ class RepoUnitAssociationManager(object):
 
         # The docs are incorrect on the list_importer_types call; it actually
         # returns a dict with the types under key "types" for some reason.
-        supported_type_ids = plugin_api.list_importer_types(dest_repo_importer['importer_type_id'])['types']
+        importer_metadata = plugin_api.list_importer_types(dest_repo_importer['importer_type_id'])
+        supported_type_ids = importer_metadata['types']
+
+        # Importers that need no per-unit processing let the server copy the
+        # associations directly without involving the importer at all
+        if importer_metadata.get(SERVER_SIDE_COPY, False):
+            login = manager_factory.principal_manager().get_principal()['login']
+            self._copy_associations(source_repo_id, dest_repo_id, criteria, supported_type_ids,
+                                    RepoContentUnit.OWNER_TYPE_USER, login)
+            return
 
         # If criteria is specified, retrieve the list of units now
         associate_us = None
@@ -264,12 +357,95 @@ class RepoUnitAssociationManager(object):
         conduit = ImportUnitConduit(source_repo_id, dest_repo_id, source_repo_importer['id'], dest_repo_importer['id'], RepoContentUnit.OWNER_TYPE_USER, login)
 
         try:
-            importer_instance.import_units(transfer_source_repo, transfer_dest_repo, conduit, call_config, units=transfer_units)
-        except Exception:
-            _LOG.exception('Exception from importer [%s] while importing units into repository [%s]' % (dest_repo_importer['importer_type_id'], dest_repo_id))
-            raise exceptions.PulpExecutionException(), None, sys.exc_info()[2]
+            try:
+                importer_instance.import_units(transfer_source_repo, transfer_dest_repo, conduit, call_config, units=transfer_units)
+            except Exception:
+                _LOG.exception('Exception from importer [%s] while importing units into repository [%s]' % (dest_repo_importer['importer_type_id'], dest_repo_id))
+                raise exceptions.PulpExecutionException(), None, sys.exc_info()[2]
+        finally:
+            # The conduit defers invalidating the cached applicability so it
+            # happens once for the import, even if the importer failed part way
+            if conduit._applicability_stale:
+                manager_factory.consumer_applicability_manager().invalidate_repo(dest_repo_id)
+
+    def _copy_associations(self, source_repo_id, dest_repo_id, criteria,
+                           supported_type_ids, owner_type, owner_id):
+        """
+        Server-side implementation of associate_from_repo for importers that
+        do not need to process each unit. Only the unit IDs and types are
+        read from the source repository; the associations are then created in
+        the destination repository in batches through associate_all_by_ids,
+        which also updates the destination's unit counts.
+
+        @param source_repo_id: identifies the source repository
+        @type  source_repo_id: str
+
+        @param dest_repo_id: identifies the destination repository
+        @type  dest_repo_id: str
+
+        @param criteria: optional; if specified, will filter the units retrieved
+                         from the source repository
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @param supported_type_ids: unit types the destination importer supports
+        @type  supported_type_ids: list of str
+
+        @param owner_type: category of the caller making the associations
+        @type  owner_type: str
+
+        @param owner_id: identifies the caller making the associations
+        @type  owner_id: str
+
+        @raise InvalidValue: if the source repository has units, of the
+               criteria's types if specified, the destination's importer does
+               not support; checked before any unit is copied
+        """
+
+        # Only the types in the source repository can be copied; if the
+        # criteria limits the types, only those need to be supported
+        associated_unit_type_ids = calculate_associated_type_ids(source_repo_id, None)
+        if criteria is not None and criteria.type_ids is not None:
+            associated_unit_type_ids = [t for t in associated_unit_type_ids if t in criteria.type_ids]
+
+        unsupported_types = [t for t in associated_unit_type_ids if t not in supported_type_ids]
+        if len(unsupported_types) > 0:
+            raise exceptions.InvalidValue(['types'])
 
-    def unassociate_unit_by_id(self, repo_id, unit_type_id, unit_id, owner_type, owner_id, notify_plugins=True):
+        if criteria is None:
+            spec = {'repo_id' : source_repo_id}
+            units = RepoContentUnit.get_collection().find(spec, fields=['unit_id', 'unit_type_id'])
+        else:
+            # Only the identity of the units is needed, not their metadata;
+            # the units are still looked up so the unit filters are applied.
+            # The unit fields only limit the lookup for single type queries.
+            # The created date is needed to remove duplicate associations.
+            # The caller's criteria is left untouched.
+            criteria = copy.copy(criteria)
+            criteria.association_fields = ['unit_id', 'unit_type_id', 'created']
+            criteria.unit_fields = ['_id']
+
+            association_query_manager = manager_factory.repo_unit_association_query_manager()
+            units = association_query_manager.get_units_iter(source_repo_id, criteria=criteria,
+                                                             page_size=ASSOCIATION_BATCH_SIZE)
+
+        # The units are consumed, and associated, a page at a time; the
+        # destination's cached applicability is invalidated once at the end
+        added_count = 0
+        try:
+            for page in paginate(units, ASSOCIATION_BATCH_SIZE):
+                unit_ids_by_type = {}
+                for u in page:
+                    unit_ids_by_type.setdefault(u['unit_type_id'], []).append(u['unit_id'])
+
+                for unit_type_id, unit_ids in unit_ids_by_type.items():
+                    added_count += self.associate_all_by_ids(dest_repo_id, unit_type_id, unit_ids, owner_type, owner_id,
+                                                             invalidate_applicability=False)
+        finally:
+            if added_count:
+                manager_factory.consumer_applicability_manager().invalidate_repo(dest_repo_id)
+
+    def unassociate_unit_by_id(self, repo_id, unit_type_id, unit_id, owner_type, owner_id, notify_plugins=True,
+                               invalidate_applicability=True):
         """
         Removes the association between a repo and the given unit. Only the
         association made by the given owner will be removed. It is possible the
@@ -298,10 +474,25 @@ class RepoUnitAssociationManager(object):
         @param notify_plugins: if true, relevant plugins will be informed of the
                removal
         @type  notify_plugins: bool
+
+        @param invalidate_applicability: if True, marks the applicability
+                                         cached for the repo as stale when units
+                                         are removed. Set this to False when
+                                         making many calls as part of a single
+                                         operation, and make one call to
+                                         invalidate the repo at the end.
+                                         defaults to True
+        @type  invalidate_applicability: bool
+
+        @return: number of units no longer associated with the repo
+        @rtype:  int
         """
-        self.unassociate_all_by_ids(repo_id, unit_type_id, [unit_id], owner_type, owner_id, notify_plugins=notify_plugins)
+        return self.unassociate_all_by_ids(repo_id, unit_type_id, [unit_id], owner_type, owner_id,
+                                           notify_plugins=notify_plugins,
+                                           invalidate_applicability=invalidate_applicability)
 
-    def unassociate_all_by_ids(self, repo_id, unit_type_id, unit_id_list, owner_type, owner_id, notify_plugins=True):
+    def unassociate_all_by_ids(self, repo_id, unit_type_id, unit_id_list, owner_type, owner_id, notify_plugins=True,
+                               invalidate_applicability=True):
         """
         Removes the association between a repo and a number of units. Only the
         association made by the given owner will be removed. It is possible the
@@ -327,13 +518,33 @@ class RepoUnitAssociationManager(object):
         @param notify_plugins: if true, relevant plugins will be informed of the
                removal
         @type  notify_plugins: bool
+
+        @param invalidate_applicability: if True, marks the applicability
+                                         cached for the repo as stale when units
+                                         are removed. Set this to False when
+                                         making many calls as part of a single
+                                         operation, and make one call to
+                                         invalidate the repo at the end.
+                                         defaults to True
+        @type  invalidate_applicability: bool
+
+        @return: number of units no longer associated with the repo
+        @rtype:  int
         """
+        if not notify_plugins:
+            # The units don't need to be loaded to be handed to the importer,
+            # so the associations can be removed directly
+            return self._remove_associations(repo_id, unit_type_id, unit_id_list, owner_type, owner_id,
+                                             invalidate_applicability)
+
         association_filters = {'unit_id' : {'$in' : unit_id_list}}
         criteria = UnitAssociationCriteria(type_ids=[unit_type_id], association_filters=association_filters)
 
-        self.unassociate_by_criteria(repo_id, criteria, owner_type, owner_id, notify_plugins=notify_plugins)
+        return self.unassociate_by_criteria(repo_id, criteria, owner_type, owner_id, notify_plugins=notify_plugins,
+                                            invalidate_applicability=invalidate_applicability)
 
-    def unassociate_by_criteria(self, repo_id, criteria, owner_type, owner_id, notify_plugins=True):
+    def unassociate_by_criteria(self, repo_id, criteria, owner_type, owner_id, notify_plugins=True,
+                                invalidate_applicability=True):
         """
         Unassociate units that are matched by the given criteria.
         @param repo_id: identifies the repo
@@ -346,12 +557,17 @@ class RepoUnitAssociationManager(object):
         @param notify_plugins: if true, relevant plugins will be informed of the
                removal
         @type  notify_plugins: bool
+        @param invalidate_applicability: if true, the applicability cached for
+               the repo is marked as stale when units are removed
+        @type  invalidate_applicability: bool
+        @return: number of units no longer associated with the repo
+        @rtype:  int
         """
         association_query_manager = manager_factory.repo_unit_association_query_manager()
         unassociate_units = association_query_manager.get_units(repo_id, criteria=criteria)
 
         if len(unassociate_units) is 0:
-            return
+            return 0
 
         unit_map = {} # maps unit_type_id to a list of unit_ids
 
@@ -359,26 +575,77 @@ class RepoUnitAssociationManager(object):
             id_list = unit_map.setdefault(unit['unit_type_id'], [])
             id_list.append(unit['unit_id'])
 
+        removed_count = 0
+        for unit_type_id, unit_ids in unit_map.items():
+            removed_count += self._remove_associations(repo_id, unit_type_id, unit_ids, owner_type, owner_id,
+                                                       invalidate_applicability)
+
+        if notify_plugins:
+            remove_from_importer(repo_id, unassociate_units)
+
+        return removed_count
+
+    def _remove_associations(self, repo_id, unit_type_id, unit_id_list, owner_type, owner_id,
+                             invalidate_applicability=True):
+        """
+        Removes the given owner's associations between a repo and a number of
+        units of the same type, in batches. Each batch costs one query to find
+        the owner's associations, one remove and one query to determine which
+        units are still associated by another owner. The repo's unit count is
+        updated once at the end for the units no longer associated at all.
+
+        @param repo_id: identifies the repo
+        @type  repo_id: str
+
+        @param unit_type_id: identifies the type of units being removed
+        @type  unit_type_id: str
+
+        @param unit_id_list: list of unique identifiers for units within the given type
+        @type  unit_id_list: list of str
+
+        @param owner_type: category of the caller who created the association
+        @type  owner_type: str
+
+        @param owner_id: identifies the caller who created the association
+        @type  owner_id: str
+
+        @param invalidate_applicability: if True, marks the applicability
+                                         cached for the repo as stale when
+                                         units are removed
+        @type  invalidate_applicability: bool
+
+        @return: number of units no longer associated with the repo
+        @rtype:  int
+        """
         collection = RepoContentUnit.get_collection()
-        repo_manager = manager_factory.repo_manager()
 
-        for unit_type_id, unit_ids in unit_map.items():
-            spec = {'repo_id': repo_id,
-                    'unit_type_id': unit_type_id,
-                    'unit_id': {'$in': unit_ids},
-                    'owner_type': owner_type,
-                    'owner_id': owner_id}
+        removed_count = 0
+        for page in paginate(set(unit_id_list), ASSOCIATION_BATCH_SIZE):
+            spec = {'repo_id' : repo_id,
+                    'unit_type_id' : unit_type_id,
+                    'unit_id' : {'$in' : page},
+                    'owner_type' : owner_type,
+                    'owner_id' : owner_id}
+            owned_ids = set(collection.find(spec, fields=['unit_id']).distinct('unit_id'))
+            if not owned_ids:
+                continue
+
+            spec['unit_id'] = {'$in' : list(owned_ids)}
             collection.remove(spec, safe=True)
 
-            unique_count = sum(1 for unit_id in unit_ids
-                               if not self.association_exists(repo_id, unit_id, unit_type_id))
-            if not unique_count:
-                continue
+            remaining_spec = {'repo_id' : repo_id,
+                              'unit_type_id' : unit_type_id,
+                              'unit_id' : {'$in' : list(owned_ids)}}
+            remaining_ids = set(collection.find(remaining_spec, fields=['unit_id']).distinct('unit_id'))
 
-            repo_manager.update_unit_count(repo_id, unit_type_id, -unique_count)
+            removed_count += len(owned_ids - remaining_ids)
 
-        if notify_plugins:
-            remove_from_importer(repo_id, unassociate_units)
+        if removed_count:
+            manager_factory.repo_manager().update_unit_count(repo_id, unit_type_id, -removed_count)
+            if invalidate_applicability:
+                manager_factory.consumer_applicability_manager().invalidate_repo(repo_id)
+
+        return removed_count
 
     @staticmethod
     def association_exists(repo_id, unit_id, unit_type_id):
@@ -427,13 +694,11 @@ def calculate_associated_type_ids(source_repo_id, associated_units):
     if associated_units is not None:
         associated_unit_type_ids = set([u['unit_type_id'] for u in associated_units])
     else:
-        association_query_manager = manager_factory.repo_unit_association_query_manager()
-
-        # We may want to make a call here that only retrieves the unique
-        # type IDs instead of all of the units, but for now it doesn't exist
-        # and I'm not entirely sure this will be a huge problem.
-        all_units = association_query_manager.get_units(source_repo_id)
-        associated_unit_type_ids = set(u['unit_type_id'] for u in all_units)
+        # Let the database determine the unique type IDs rather than loading
+        # all of the units in the repository
+        spec = {'repo_id' : source_repo_id}
+        cursor = RepoContentUnit.get_collection().find(spec, fields=['unit_type_id'])
+        associated_unit_type_ids = set(cursor.distinct('unit_type_id'))
 
     return associated_unit_type_ids
 
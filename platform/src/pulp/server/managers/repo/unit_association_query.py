@@ -16,12 +16,14 @@ Contains the manager class for performing queries for repo-unit associations.
 """
 
 import copy
+import itertools
 import logging
 import pymongo
 
 import pulp.plugins.types.database as types_db
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.util import paginate
 
 # -- constants ----------------------------------------------------------------
 
@@ -41,6 +43,10 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Maximum number of unit IDs sent in a single $in query when looking up unit
+# metadata; keeps the query document well under the BSON size limit
+UNIT_METADATA_PAGE_SIZE = 1000
+
 # -- manager ------------------------------------------------------------------
 
 class RepoUnitAssociationQueryManager(object):
@@ -117,6 +123,34 @@ class RepoUnitAssociationQueryManager(object):
         else:
             return self.get_units_across_types(repo_id, criteria=criteria)
 
+    def get_units_iter(self, repo_id, criteria=None, page_size=UNIT_METADATA_PAGE_SIZE):
+        """
+        Generator variant of get_units. Delegates to the appropriate
+        get_units_*_iter call depending on the contents of the criteria.
+
+        @param repo_id: identifies the repository
+        @type  repo_id: str
+
+        @param criteria: if specified will drive the query
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @param page_size: number of units read from the database in each batch
+        @type  page_size: int
+
+        @return: generator of association dicts with the unit metadata merged
+                 in under the "metadata" key
+        @rtype:  generator
+        """
+
+        if criteria is not None and\
+           criteria.type_ids is not None and\
+           len(criteria.type_ids) == 1:
+
+            type_id = criteria.type_ids[0]
+            return self.get_units_by_type_iter(repo_id, type_id, criteria=criteria, page_size=page_size)
+        else:
+            return self.get_units_across_types_iter(repo_id, criteria=criteria, page_size=page_size)
+
     def get_units_across_types(self, repo_id, criteria=None):
         """
         Retrieves data describing units associated with the given repository
@@ -144,6 +178,81 @@ class RepoUnitAssociationQueryManager(object):
         if criteria is None:
             criteria = UnitAssociationCriteria()
 
+        cursor = self._associations_across_types_cursor(repo_id, criteria)
+
+        # Finally do the query and assemble the associations structure
+        units = list(cursor)
+
+        # -- remove multiple associations -------------------------------------
+
+        if criteria.remove_duplicates:
+            units = self._remove_duplicate_associations(units)
+
+        # -- unit lookups -----------------------------------------------------
+
+        # By this point, we've applied all of the filters, sorting, and limits.
+        # We simply need to look up the unit metadata itself and merge it into the
+        # combined association and unit metadata dictionary.
+
+        self._merge_unit_metadata(units)
+
+        return units
+
+    def get_units_across_types_iter(self, repo_id, criteria=None,
+                                    page_size=UNIT_METADATA_PAGE_SIZE):
+        """
+        Generator variant of get_units_across_types. The associations are read
+        from the database and merged with their unit metadata one page at a
+        time, so only a single page of units is held in memory at once.
+
+        Sorting, limit and skip behave exactly as in get_units_across_types.
+        If duplicate removal is requested, the (lightweight) association
+        documents must all be loaded before the first unit can be yielded; the
+        unit metadata is still streamed a page at a time.
+
+        @param repo_id: identifies the repository
+        @type  repo_id: str
+
+        @param criteria: if specified will drive the query
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @param page_size: number of associations merged with their metadata
+                          in each pass
+        @type  page_size: int
+
+        @return: generator of association dicts with the unit metadata merged
+                 in under the "metadata" key
+        @rtype:  generator
+        """
+
+        if criteria is None:
+            criteria = UnitAssociationCriteria()
+
+        associations = self._associations_across_types_cursor(repo_id, criteria)
+
+        if criteria.remove_duplicates:
+            associations = self._remove_duplicate_associations(list(associations))
+
+        for page in paginate(associations, page_size):
+            self._merge_unit_metadata(page)
+            for u in page:
+                yield u
+
+    def _associations_across_types_cursor(self, repo_id, criteria):
+        """
+        Builds the association collection cursor used by the get_units_across_types
+        calls, applying the criteria's association filters, sort, limit and skip.
+
+        @param repo_id: identifies the repository
+        @type  repo_id: str
+
+        @param criteria: drives the query
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @return: cursor over the matching associations
+        @rtype:  pymongo.cursor.Cursor
+        """
+
         # -- association collection lookup ------------------------------------
 
         spec = {'repo_id' : repo_id}
@@ -180,26 +289,50 @@ class RepoUnitAssociationQueryManager(object):
         if criteria.skip is not None:
             cursor.skip(criteria.skip)
 
-        # Finally do the query and assemble the associations structure
-        units = list(cursor)
+        return cursor
 
-        # -- remove multiple associations -------------------------------------
+    def _merge_unit_metadata(self, units, unit_fields=None,
+                             page_size=UNIT_METADATA_PAGE_SIZE):
+        """
+        Looks up the unit metadata for the given associations and stores it in
+        each association under the "metadata" key. Rather than querying for
+        each unit individually, the associations are grouped by unit type and
+        the metadata is retrieved with one $in query per page of unit IDs.
 
-        if criteria.remove_duplicates:
-            units = self._remove_duplicate_associations(units)
+        The order of the units list is not changed. Associations whose unit
+        cannot be found will have their metadata set to None.
 
-        # -- unit lookups -----------------------------------------------------
+        @param units: association dicts retrieved from the database; updated
+                      in place
+        @type  units: list of dict
 
-        # By this point, we've applied all of the filters, sorting, and limits.
-        # We simply need to look up the unit metadata itself and merge it into the
-        # combined association and unit metadata dictionary.
+        @param unit_fields: if specified, only these unit fields are retrieved
+        @type  unit_fields: list of str
+
+        @param page_size: maximum number of unit IDs in a single query
+        @type  page_size: int
+        """
 
+        unit_ids_by_type = {}
         for u in units:
-            type_collection = types_db.type_units_collection(u['unit_type_id'])
-            metadata = type_collection.find_one({'_id' : u['unit_id']})
-            u['metadata'] = metadata
+            unit_ids_by_type.setdefault(u['unit_type_id'], set()).add(u['unit_id'])
 
-        return units
+        # The _id is used to merge the metadata back in, so it must be retrieved
+        if unit_fields is not None and '_id' not in unit_fields:
+            unit_fields = list(unit_fields) + ['_id']
+
+        metadata_by_type = {}
+        for type_id, unit_ids in unit_ids_by_type.items():
+            type_collection = types_db.type_units_collection(type_id)
+            metadata_by_id = metadata_by_type.setdefault(type_id, {})
+
+            for page in paginate(unit_ids, page_size):
+                spec = {'_id' : {'$in' : page}}
+                for metadata in type_collection.find(spec, fields=unit_fields):
+                    metadata_by_id[metadata['_id']] = metadata
+
+        for u in units:
+            u['metadata'] = metadata_by_type[u['unit_type_id']].get(u['unit_id'])
 
     def get_units_by_type(self, repo_id, type_id, criteria=None):
         """
@@ -223,6 +356,41 @@ class RepoUnitAssociationQueryManager(object):
         @param criteria: if specified will drive the query
         @type  criteria: L{UnitAssociationCriteria}
         """
+        return list(self.get_units_by_type_iter(repo_id, type_id, criteria=criteria))
+
+    def get_units_by_type_iter(self, repo_id, type_id, criteria=None,
+                               page_size=UNIT_METADATA_PAGE_SIZE):
+        """
+        Generator variant of get_units_by_type. Units are yielded as they are
+        read from the database rather than being assembled into a list, so the
+        unit metadata is never held in memory all at once.
+
+        When sorting on the unit metadata, the IDs of the associated units are
+        sorted by the database up front and the unit metadata is read a page
+        of IDs at a time as the units are consumed. When sorting on the
+        association data and removing duplicates, the (lightweight)
+        association documents must all be loaded before the first unit can be
+        yielded.
+
+        The sorting, filtering, limit and skip rules are the same as those
+        described in get_units_by_type.
+
+        @param repo_id: identifies the repository
+        @type  repo_id: str
+
+        @param type_id: limits returned units to the given type
+        @type  type_id: str
+
+        @param criteria: if specified will drive the query
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @param page_size: number of units read from the database in each batch
+        @type  page_size: int
+
+        @return: generator of association dicts with the unit metadata merged
+                 in under the "metadata" key
+        @rtype:  generator
+        """
 
         # For simplicity, create a criteria if one is not provided and use its defaults
         if criteria is None:
@@ -241,38 +409,6 @@ class RepoUnitAssociationQueryManager(object):
         # Merge in the given association filters
         spec.update(association_spec)
 
-        cursor = RepoContentUnit.get_collection().find(spec, fields=criteria.association_fields)
-
-        # If the sort clause applies to the association metadata, we
-        # apply the limit and skips here as well. If the sort is not
-        # provided, it will be defaulted at the unit type level.
-
-        association_sorted = False # flag so we can know this later
-
-        association_sort = criteria.association_sort
-        if association_sort is not None:
-            association_sorted = True
-
-            cursor.sort(association_sort)
-
-            if criteria.limit is not None:
-                cursor.limit(criteria.limit)
-
-            if criteria.skip is not None:
-                cursor.skip(criteria.skip)
-
-        unit_associations = list(cursor)
-
-        # -- remove multiple associations -------------------------------------
-
-        if criteria.remove_duplicates:
-            unit_associations = self._remove_duplicate_associations(unit_associations)
-
-        # -- unit lookups -----------------------------------------------------
-
-        # If the sorting was not done on association fields, we do it here. If
-        # specified, we can use those fields. If not, we default to the unit key.
-
         type_collection = types_db.type_units_collection(type_id)
         unit_spec = criteria.unit_filters
 
@@ -281,63 +417,161 @@ class RepoUnitAssociationQueryManager(object):
         # tested individually and we need to make sure QE knows the role of
         # the sort in determining which code branch is followed.
 
-        if association_sorted:
+        if criteria.association_sort is not None:
+            # The sort clause applies to the association metadata, so we sort
+            # here. The limit and skip cannot be applied yet since the unit
+            # filters may still exclude some of the associations.
+
+            cursor = RepoContentUnit.get_collection().find(spec, fields=criteria.association_fields)
+            cursor.sort(criteria.association_sort)
+
+            unit_associations = cursor
+
+            # -- remove multiple associations ---------------------------------
+
+            if criteria.remove_duplicates:
+                unit_associations = self._remove_duplicate_associations(list(unit_associations))
+
+            # -- unit lookups -------------------------------------------------
+
             # The units are already sorted, so we have to maintain the order in
-            # the units list.
+            # the units list. The associations are walked a page at a time and
+            # the metadata for each page is retrieved in a single query. Units
+            # that don't match the unit filters are dropped before the skip
+            # and limit are applied so pagination remains accurate.
+
+            skip = criteria.skip or 0
+            merged_count = 0
 
-            for u in unit_associations:
+            for page in paginate(unit_associations, page_size):
                 spec = copy.copy(unit_spec)
-                spec['_id'] = u['unit_id']
-                metadata = type_collection.find_one(spec, fields=criteria.unit_fields)
-                u['metadata'] = metadata
+                spec['_id'] = {'$in' : [u['unit_id'] for u in page]}
+                cursor = type_collection.find(spec, fields=criteria.unit_fields)
+                metadata_by_id = dict([(m['_id'], m) for m in cursor])
 
-            return unit_associations
+                for u in page:
+                    metadata = metadata_by_id.get(u['unit_id'])
+                    if metadata is None:
+                        continue
 
-        else:
-            # Sorting will be done in the units collection. Since the type is
-            # consistent, we can rely on the unit's _id for uniqueness. That
-            # means we can transform the associations into a simple dict lookup
-            # by _id when we need to merge in the association data.
+                    if skip > 0:
+                        skip -= 1
+                        continue
 
-            # Restructure the associations by ID so we can look them up later and
-            # so we have a list of all unit IDs to pass as a filter.
-            associations_by_id = dict([(u['unit_id'], u) for u in unit_associations])
+                    u['metadata'] = metadata
+                    merged_count += 1
+                    yield u
 
-            # We only want to return units with an association, so add in all of
-            # the unit IDs we found earlier.
-            unit_spec['_id'] = {'$in' : associations_by_id.keys()}
+                    # a limit of 0 means no limit, as it does to the database
+                    if criteria.limit and merged_count >= criteria.limit:
+                        return
 
-            cursor = type_collection.find(unit_spec, fields=criteria.unit_fields)
+        else:
+            # Sorting will be done in the units collection. If specified, we
+            # can use the criteria's unit sort. If not, we default to the unit
+            # key.
 
-            # Determine what our sort criteria will look like
             if criteria.unit_sort is None:
-                # Default the sort to the unit key
                 unit_key_fields = types_db.type_units_unit_key(type_id)
                 sort_spec = [(u, SORT_ASCENDING) for u in unit_key_fields]
-                cursor.sort(sort_spec)
             else:
-                cursor.sort(criteria.unit_sort)
+                sort_spec = criteria.unit_sort
+
+            # The database sorts the IDs of the matching units in a single
+            # query; only those associated with the repository are kept and the
+            # unit metadata is then read a page of IDs at a time. When the
+            # associated IDs fit in a single page they restrict the query,
+            # otherwise they're matched here so no $in query holds more than a
+            # page of IDs. The IDs are read in full up front so no cursor is
+            # left open while the units are consumed.
+
+            associated_ids = set(self._associated_unit_ids(spec))
+
+            id_spec = copy.copy(unit_spec)
+            if len(associated_ids) <= page_size:
+                id_spec['_id'] = {'$in' : list(associated_ids)}
+            cursor = type_collection.find(id_spec, fields=['_id'])
+            cursor.sort(sort_spec)
+
+            unit_ids = (u['_id'] for u in cursor if u['_id'] in associated_ids)
+
+            # a limit of 0 means no limit, as it does to the database
+            window = None
+            if criteria.limit:
+                window = (criteria.skip or 0) + criteria.limit
+            unit_ids = list(itertools.islice(unit_ids, criteria.skip or 0, window))
+
+            # Merge in the unit metadata and association data a page at a time
+            for page in paginate(unit_ids, page_size):
+                cursor = type_collection.find({'_id' : {'$in' : page}}, fields=criteria.unit_fields)
+                metadata_by_id = dict([(m['_id'], m) for m in cursor])
+                associations_by_id = self._associations_by_unit_id(spec, page, criteria)
+
+                for unit_id in page:
+                    metadata = metadata_by_id.get(unit_id)
+                    association = associations_by_id.get(unit_id)
+                    # removed since the IDs were read
+                    if metadata is None or association is None:
+                        continue
+                    association['metadata'] = metadata
+                    yield association
+
+    def _associated_unit_ids(self, spec):
+        """
+        Generates the IDs of the units of the associations matching the given
+        spec, each unit ID only once.
+
+        @param spec: association collection query
+        @type  spec: dict
+
+        @return: generator of unit IDs
+        @rtype:  generator
+        """
+
+        cursor = RepoContentUnit.get_collection().find(spec, fields=['unit_id'])
+        cursor.sort('unit_id', SORT_ASCENDING)
 
-            # Since the sorting is done here, this is the only place we can
-            # apply the limit/skip.
-            if criteria.limit is not None:
-                cursor.limit(criteria.limit)
+        # Sorted by unit ID, so multiple associations to a unit are adjacent
+        previous_unit_id = None
+        for association in cursor:
+            if association['unit_id'] != previous_unit_id:
+                previous_unit_id = association['unit_id']
+                yield previous_unit_id
+
+    def _associations_by_unit_id(self, spec, unit_ids, criteria):
+        """
+        Looks up the associations matching the given spec for the given unit
+        IDs. If a unit is associated more than once, the association with the
+        earliest created date is used if the criteria removes duplicates.
+
+        @param spec: association collection query
+        @type  spec: dict
+
+        @param unit_ids: IDs of the units to look up the associations for
+        @type  unit_ids: list of str
+
+        @param criteria: drives the query
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @return: association dicts keyed by unit ID
+        @rtype:  dict
+        """
 
-            if criteria.skip is not None:
-                cursor.skip(criteria.skip)
+        spec = copy.copy(spec)
+        spec['unit_id'] = {'$in' : unit_ids}
 
-            # This will load all of the units and they will be filtered,
-            # limited, and sorted.
-            units = list(cursor)
+        fields = criteria.association_fields
+        if fields is not None and criteria.remove_duplicates and 'created' not in fields:
+            fields = list(fields) + ['created']
 
-            # Now we just need to merge in the association data
-            merged_units = []
-            for u in units:
-                association = associations_by_id[u['_id']]
-                association['metadata'] = u
-                merged_units.append(association)
+        associations_by_id = {}
+        for association in RepoContentUnit.get_collection().find(spec, fields=fields):
+            previous = associations_by_id.get(association['unit_id'])
+            if previous is None or not criteria.remove_duplicates or \
+               association['created'] <= previous['created']:
+                associations_by_id[association['unit_id']] = association
 
-            return merged_units
+        return associations_by_id
 
     def _remove_duplicate_associations(self, units):
         """
@@ -71,6 +71,31 @@ class subdict(dict):
         n = dict((k, v) for k, v in d.items() if k in keys)
         super(subdict, self).__init__(n)
 
+# batching ---------------------------------------------------------------------
+
+def paginate(iterable, page_size):
+    """
+    Break an iterable into successive lists of at most page_size items. The
+    iterable is consumed lazily, so only a single page is held in memory at
+    any one time. This is primarily used to keep $in queries and bulk writes
+    under the database's document size limits.
+    @param iterable: items to break into pages
+    @type  iterable: iterable
+    @param page_size: maximum number of items in each page
+    @type  page_size: int
+    @return: generator of lists of items
+    @rtype:  generator
+    """
+    assert page_size > 0
+    page = []
+    for item in iterable:
+        page.append(item)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
 # topological sorting ----------------------------------------------------------
 
 class TopologicalSortError(PulpExecutionException):
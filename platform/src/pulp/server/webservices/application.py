@@ -43,6 +43,7 @@ from pulp.plugins.loader import api as plugin_api
 from pulp.server.agent.direct.services import Services as AgentServices
 
 from pulp.plugins.loader import api as plugin_api
+from pulp.plugins.types import database as types_db
 from pulp.server.db import reaper
 from pulp.server.debugging import StacktraceDumper
 from pulp.server.dispatch import factory as dispatch_factory
@@ -120,6 +121,10 @@ def _initialize_pulp():
         msg += 'Error message: %s' % str(e)
         raise InitializationException(msg), None, sys.exc_info()[2]
 
+    # The type definitions only change when pulp-manage-db is run, so keep
+    # them in memory rather than looking them up on every request
+    types_db.load_type_definition_cache()
+
     # There's a significantly smaller chance the following calls will fail.
     # The previous two are likely user errors, but the remainder represent
     # something gone horribly wrong. As such, I'm not going to account for each
@@ -273,16 +273,20 @@ class ConsumerGroupBindings(JSONController):
         consumer by id included in the URL path and a repo-distributor
         specified in the POST body: {repo_id:<str>, distributor_id:<str>}.
         Designed to be itempotent so only MissingResource is expected to
-        be raised by manager.
+        be raised by manager, or GroupOperationFailed, carrying the group
+        progress report, when the bind fails for any of the consumers.
         @param consumer_group_id: The consumer to bind.
         @type consumer_group_id: str
-        @return: The created bind model object:
-            {consumer_group_id:<str>, repo_id:<str>, distributor_id:<str>}
+        @return: The group progress report:
+            {consumer_group_id:<str>, action:<str>, total:<int>, completed:<int>,
+             succeeded:<list>, failed:<dict>}
         @rtype: dict
         """
         body = self.params()
         repo_id = body.get('repo_id')
         distributor_id = body.get('distributor_id')
+        binding_config = body.get('binding_config', None)
+        notify_agent = body.get('notify_agent', True)
 
         collection = ConsumerGroup.get_collection()
         consumer_group = collection.find_one({'id': consumer_group_id})
@@ -299,6 +303,8 @@ class ConsumerGroupBindings(JSONController):
             consumer_group_id,
             repo_id,
             distributor_id,
+            notify_agent,
+            binding_config,
         ]
         manager = managers_factory.consumer_group_manager()
         call_request = CallRequest(
@@ -350,15 +356,17 @@ class ConsumerGroupBinding(JSONController):
         """
         Delete a bind association between the specified
         consumer and repo-distributor.  Designed to be idempotent.
+        GroupOperationFailed, carrying the group progress report, is
+        raised when the unbind fails for any of the consumers.
         @param consumer_group_id: A consumer ID.
         @type consumer_group_id: str
         @param repo_id: A repo ID.
         @type repo_id: str
         @param distributor_id: A distributor ID.
         @type distributor_id: str
-        @return: The deleted bind model object:
-            {consumer_group_id:<str>, repo_id:<str>, distributor_id:<str>}
-            Or, None if bind does not exist.
+        @return: The group progress report:
+            {consumer_group_id:<str>, action:<str>, total:<int>, completed:<int>,
+             succeeded:<list>, failed:<dict>}
         @rtype: dict
         """
         manager = managers_factory.consumer_group_manager()
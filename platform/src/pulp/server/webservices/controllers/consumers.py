@@ -37,6 +37,7 @@ from pulp.server.webservices.controllers.search import SearchController
 from pulp.server.webservices.controllers.base import JSONController
 from pulp.server.webservices.controllers.decorators import auth_required
 from pulp.server.webservices import execution
+from pulp.server.webservices import http
 from pulp.server.webservices import serialization
 
 # -- constants ----------------------------------------------------------------
@@ -593,11 +594,37 @@ class Profile(JSONController):
         return self.ok(execution.execute(call_request))
 
 
+class ProfileHash(JSONController):
+    """
+    The content hash of a consumer's installed content unit profile,
+    used by consumers to only send profiles that changed.
+    """
+
+    @auth_required(READ)
+    def GET(self, consumer_id, content_type):
+        """
+        @param consumer_id: The consumer ID.
+        @type consumer_id: str
+        @param content_type: The content type ID.
+        @type content_type: str
+        @return: The profile without its content:
+            {consumer_id:<str>, content_type:<str>, profile_hash:<str>}
+        @rtype: dict
+        """
+        manager = managers.consumer_profile_manager()
+        profile = manager.get_profile_hash(consumer_id, content_type)
+        serialized = serialization.consumer.profile(profile)
+        return self.ok(serialized)
+
+
 class ContentApplicability(JSONController):
     """
     Determine content applicability.
     """
 
+    STALE_HEADER = 'Pulp-Stale-Applicability'
+    STALE_KEY = 'stale'
+
     @auth_required(READ)
     def POST(self):
         """
@@ -614,6 +641,10 @@ class ContentApplicability(JSONController):
                 { <unit_type_id1> : [<ApplicabilityReport>],
                   <unit_type_id1> : [<ApplicabilityReport>]},
                 }
+            The report of a consumer with reports that are being refreshed
+            in the background also lists their unit type IDs under the
+            'stale' key, and the number of such consumers is returned in the
+            Pulp-Stale-Applicability header.
                 
         :rtype: dict
         """
@@ -635,6 +666,10 @@ class ContentApplicability(JSONController):
         for consumer_report in report.values():
             for unit_type_id, report_list in consumer_report.items():
                 consumer_report[unit_type_id] = [serialization.consumer.applicability_report(r) for r in report_list]
+        for consumer_id, unit_type_ids in report.stale.items():
+            report[consumer_id][self.STALE_KEY] = sorted(unit_type_ids)
+        if report.stale:
+            http.header(self.STALE_HEADER, str(len(report.stale)))
         return self.ok(report)
 
 
@@ -1032,6 +1067,7 @@ urls = (
     '/([^/]+)/bindings/([^/]+)/([^/]+)/$', Binding,
     '/([^/]+)/profiles/$', Profiles,
     '/([^/]+)/profiles/([^/]+)/$', Profile,
+    '/([^/]+)/profiles/([^/]+)/hash/$', ProfileHash,
     '/([^/]+)/schedules/content/install/', UnitInstallScheduleCollection,
     '/([^/]+)/schedules/content/install/([^/]+)/', UnitInstallScheduleResource,
     '/([^/]+)/schedules/content/update/', UnitUpdateScheduleCollection,
@@ -114,6 +114,14 @@ class TaskResource(JSONController):
         serialized_call_report.update(serialization.link.current_link_obj())
         return self.accepted(serialized_call_report)
 
+
+class TaskWorkerPoolCollection(JSONController):
+
+    @auth_required(authorization.READ)
+    def GET(self):
+        utilization = dispatch_factory.worker_pool_utilization()
+        return self.ok(utilization.values())
+
 # queued call controllers ------------------------------------------------------
 
 class QueuedCallCollection(JSONController):
@@ -215,6 +223,7 @@ class TaskGroupResource(JSONController):
 
 TASK_URLS = (
     '/', TaskCollection,
+    '/worker_pools/', TaskWorkerPoolCollection,
     '/([^/]+)/', TaskResource,
 )
 
@@ -17,7 +17,10 @@ Unauthenticated status API so that other can make sure we're up (to no good).
 
 import web
 
+from pulp.server.auth import authorization
+from pulp.server.auth.cache import authentication_cache
 from pulp.server.webservices.controllers.base import JSONController
+from pulp.server.webservices.controllers.decorators import auth_required
 
 # status controller ------------------------------------------------------------
 
@@ -27,8 +30,16 @@ class StatusController(JSONController):
         status_data = {'api_version': '2'}
         return self.ok(status_data)
 
+
+class AuthCacheStatusController(JSONController):
+
+    @auth_required(authorization.READ)
+    def GET(self):
+        return self.ok(authentication_cache().metrics())
+
 # web.py application -----------------------------------------------------------
 
-URLS = ('/', StatusController)
+URLS = ('/', StatusController,
+        '/auth_cache/', AuthCacheStatusController)
 
 application = web.application(URLS, globals())
@@ -25,6 +25,7 @@ import mock
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.loader import exceptions as plugin_exceptions
 from pulp.plugins.model import SyncReport, PublishReport, ApplicabilityReport
+from pulp.plugins.profiler import Profiler
 
 # -- constants ----------------------------------------------------------------
 
@@ -223,6 +224,9 @@ def install():
             mock.Mock(side_effect=lambda i,u,o,c,x: sorted(u))
         profiler.units_applicable = \
             mock.Mock(side_effect=lambda i,r,t,u,c,x: [ApplicabilityReport('mocked-summary', 'mocked-details')])
+        # the default implementation, calling units_applicable for each consumer
+        profiler.units_applicable_batch = \
+            mock.Mock(side_effect=lambda i,r,t,u,c,x,p=profiler: Profiler.units_applicable_batch.im_func(p,i,r,t,u,c,x))
 
 def reset():
     """
@@ -24,6 +24,7 @@ srcdir = os.path.abspath(os.path.dirname(__file__)) + "/../../../src/"
 sys.path.insert(0, srcdir)
 
 from pulp.common.compat import json
+from pulp.plugins.types import database as types_db
 from pulp.server import config
 from pulp.server.db import connection
 from pulp.server.db.model.auth import User
@@ -72,6 +73,7 @@ class PulpServerTests(unittest.TestCase):
         PulpServerTests.CONFIG = load_test_config()
         connection.initialize()
         manager_factory.initialize()
+        types_db.TYPE_DEFINITION_CACHE.invalidate()
 
     def setUp(self):
         super(PulpServerTests, self).setUp()
@@ -173,6 +173,19 @@ class AgentManagerTests(base.PulpServerTests):
         self.assertEquals(pargs[1], units[3:4])
         self.assertEquals(pargs[2], options)
 
+    def test_content_install_translated(self):
+        # Setup
+        self.populate()
+        # Test
+        units = [{'type_id':'rpm', 'unit_key':{'name':'zsh', 'version':'1.0'}}]
+        options = dict(importkeys=True)
+        manager = factory.consumer_agent_manager()
+        manager.install_content(self.CONSUMER_ID, units, options, translated=True)
+        # Verify
+        mock_agent.Content.install.assert_called_with(units, options)
+        profiler = plugin_api.get_profiler_by_type('rpm')[0]
+        self.assertFalse(profiler.install_units.called)
+
     def test_install_invalid_units(self):
         # Setup
         self.populate()
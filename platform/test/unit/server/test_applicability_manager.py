@@ -14,10 +14,12 @@
 import base
 import mock_plugins
 
-from mock import Mock
+from mock import Mock, patch
 from pulp.plugins.loader import api as plugins
+from pulp.plugins.types import database as types_database, model as types_model
 from pulp.server.db.model.criteria import Criteria
-from pulp.server.db.model.consumer import Consumer, UnitProfile
+from pulp.server.db.model.consumer import Bind, CachedApplicability, Consumer, UnitProfile
+from pulp.server.db.model.repository import Repo, RepoContentUnit
 from pulp.plugins.conduits.profiler import ProfilerConduit
 from pulp.plugins.model import ApplicabilityReport
 from pulp.server.managers import factory as factory
@@ -33,6 +35,9 @@ class ApplicabilityManagerTests(base.PulpServerTests):
     CONSUMER_CRITERIA = Criteria(filters=FILTER, sort=SORT)
     REPO_CRITERIA = None
     PROFILE = [{'name':'zsh', 'version':'1.0'}, {'name':'ksh', 'version':'1.0'}]
+    REPO_IDS = ['repo-1', 'repo-2']
+    UNIT_NAMES = ['zsh', 'ksh', 'bash']
+    TYPE_DEF = types_model.TypeDefinition('rpm', 'RPM', 'RPM', ['name'], [], [])
 
     def setUp(self):
         base.PulpServerTests.setUp(self)
@@ -49,6 +54,11 @@ class ApplicabilityManagerTests(base.PulpServerTests):
         base.PulpServerTests.tearDown(self)
         Consumer.get_collection().remove()
         UnitProfile.get_collection().remove()
+        Bind.get_collection().remove()
+        CachedApplicability.get_collection().remove()
+        Repo.get_collection().remove()
+        RepoContentUnit.get_collection().remove()
+        types_database.clean()
         mock_plugins.reset()
 
     def populate(self):
@@ -59,6 +69,23 @@ class ApplicabilityManagerTests(base.PulpServerTests):
         for id in self.CONSUMER_IDS:
             manager.create(id, 'rpm', self.PROFILE)
 
+    def populate_repos(self):
+        manager = factory.repo_manager()
+        for repo_id in self.REPO_IDS:
+            manager.create_repo(repo_id)
+        types_database.update_database([self.TYPE_DEF])
+        manager = factory.content_manager()
+        collection = RepoContentUnit.get_collection()
+        for name in self.UNIT_NAMES:
+            unit_id = manager.add_content_unit('rpm', None, {'name':name})
+            # every unit is in both repos
+            for repo_id in self.REPO_IDS:
+                collection.save(RepoContentUnit(repo_id, unit_id, 'rpm', 'user', 'admin'), safe=True)
+        collection = Bind.get_collection()
+        for consumer_id in self.CONSUMER_IDS:
+            for repo_id in self.REPO_IDS:
+                collection.save(Bind(consumer_id, repo_id, 'dist-1', False, {}), safe=True)
+
     def test_profiler_no_exception(self):
         # Setup
         self.populate()
@@ -86,3 +113,185 @@ class ApplicabilityManagerTests(base.PulpServerTests):
         result = manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
         self.assertTrue('test-1' in result.keys())
         self.assertTrue('test-2' in result.keys())
+
+    def test_units_applicable(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        # Test
+        units = {'rpm': []}
+        manager = factory.consumer_applicability_manager()
+        result = manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Verify
+        self.assertEqual(sorted(result.keys()), self.CONSUMER_IDS)
+        for consumer_id in self.CONSUMER_IDS:
+            self.assertEqual(len(result[consumer_id]['rpm']), 1)
+        # consumers with the same profiles and repos share the result
+        self.assertEqual(profiler.units_applicable.call_count, 1)
+        consumer, repo_ids, type_id, unit_keys = profiler.units_applicable.call_args[0][:4]
+        self.assertTrue(consumer.id in self.CONSUMER_IDS)
+        self.assertEqual(consumer.profiles, {'rpm': self.PROFILE})
+        self.assertEqual(repo_ids, self.REPO_IDS)
+        self.assertEqual(type_id, 'rpm')
+        # units in more than one of the repos are only checked once
+        self.assertEqual(sorted(k['name'] for k in unit_keys), sorted(self.UNIT_NAMES))
+
+    def test_units_applicable_filtered(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        # Test
+        units = {'rpm': [{'name':'zsh'}, {'name':'bash'}]}
+        manager = factory.consumer_applicability_manager()
+        criteria = Criteria(filters={'id':'repo-2'})
+        result = manager.units_applicable(self.CONSUMER_CRITERIA, criteria, units)
+        # Verify
+        self.assertEqual(profiler.units_applicable.call_count, 2)
+        for call in profiler.units_applicable.call_args_list:
+            repo_ids, type_id, unit_keys = call[0][1:4]
+            self.assertEqual(repo_ids, ['repo-2'])
+            self.assertEqual(sorted(k['name'] for k in unit_keys), ['bash', 'zsh'])
+
+    def test_units_applicable_batch(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        # Test
+        units = {'rpm': [{'name':'zsh'}]}
+        manager = factory.consumer_applicability_manager()
+        manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Verify
+        # consumers bound to the same repos are evaluated together
+        self.assertEqual(profiler.units_applicable_batch.call_count, 1)
+        consumers, repo_ids, type_id, unit_keys = profiler.units_applicable_batch.call_args[0][:4]
+        self.assertEqual(sorted(c.id for c in consumers), self.CONSUMER_IDS)
+        self.assertEqual(repo_ids, self.REPO_IDS)
+        self.assertEqual(unit_keys, [{'name':'zsh'}])
+
+    def test_units_applicable_batch_failed(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        profiler.units_applicable_batch = Mock(side_effect=KeyError)
+        # Test
+        units = {'rpm': [{'name':'zsh'}]}
+        manager = factory.consumer_applicability_manager()
+        result = manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Verify
+        # each consumer is evaluated on its own instead
+        self.assertEqual(profiler.units_applicable.call_count, 2)
+        for consumer_id in self.CONSUMER_IDS:
+            self.assertEqual(len(result[consumer_id]['rpm']), 1)
+
+    def test_units_applicable_cached(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        units = {'rpm': []}
+        manager = factory.consumer_applicability_manager()
+        manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Test
+        result = manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Verify
+        self.assertEqual(profiler.units_applicable.call_count, 1)
+        self.assertEqual(result.stale, {})
+        for consumer_id in self.CONSUMER_IDS:
+            self.assertEqual(result[consumer_id]['rpm'][0].summary, 'mysummary')
+            self.assertEqual(result[consumer_id]['rpm'][0].details, 'mydetails')
+
+    @patch('pulp.server.dispatch.factory.coordinator')
+    def test_units_applicable_stale(self, mock_coordinator):
+        # Setup
+        mock_coordinator.return_value.find_call_reports.return_value = []
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        units = {'rpm': []}
+        manager = factory.consumer_applicability_manager()
+        manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Test
+        manager.invalidate_repo('repo-2')
+        result = manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Verify
+        self.assertEqual(profiler.units_applicable.call_count, 1)
+        self.assertEqual(result.stale, {'test-1': ['rpm'], 'test-2': ['rpm']})
+        self.assertEqual(len(result['test-1']['rpm']), 1)
+        self.assertEqual(mock_coordinator.return_value.execute_call_asynchronously.call_count, 1)
+        # Test
+        manager.refresh()
+        result = manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Verify
+        self.assertEqual(profiler.units_applicable.call_count, 2)
+        self.assertEqual(result.stale, {})
+
+    def test_profile_changed(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        units = {'rpm': []}
+        manager = factory.consumer_applicability_manager()
+        manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        entry = CachedApplicability.get_collection().find_one()
+        other_id = [c for c in self.CONSUMER_IDS if c != entry['consumer_id']][0]
+        # Test
+        profile = [{'name':'zsh', 'version':'2.0'}]
+        factory.consumer_profile_manager().update(entry['consumer_id'], 'rpm', profile)
+        result = manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        # Verify
+        # the consumer with the changed profile is determined again while the
+        # entry still serves the other consumer
+        self.assertEqual(profiler.units_applicable.call_count, 2)
+        self.assertEqual(result.stale, {})
+        self.assertEqual(len(result[other_id]['rpm']), 1)
+        self.assertEqual(CachedApplicability.get_collection().find().count(), 2)
+
+    def test_refresh_profile_changed(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        units = {'rpm': []}
+        manager = factory.consumer_applicability_manager()
+        manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        entry = CachedApplicability.get_collection().find_one()
+        # Test
+        profile = [{'name':'zsh', 'version':'2.0'}]
+        factory.consumer_profile_manager().update(entry['consumer_id'], 'rpm', profile)
+        manager.invalidate_repo('repo-1')
+        manager.refresh()
+        # Verify
+        # the entry no longer matches the profiles of the consumer it was determined for
+        self.assertEqual(CachedApplicability.get_collection().find().count(), 0)
+        self.assertEqual(profiler.units_applicable.call_count, 1)
+
+    def test_remove_consumer(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        units = {'rpm': []}
+        manager = factory.consumer_applicability_manager()
+        manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        entry = CachedApplicability.get_collection().find_one()
+        # Test
+        factory.consumer_profile_manager().consumer_deleted(entry['consumer_id'])
+        # Verify
+        self.assertEqual(CachedApplicability.get_collection().find().count(), 0)
+
+    def test_remove_repo(self):
+        # Setup
+        self.populate()
+        self.populate_repos()
+        units = {'rpm': []}
+        manager = factory.consumer_applicability_manager()
+        manager.units_applicable(self.CONSUMER_CRITERIA, self.REPO_CRITERIA, units)
+        self.assertEqual(CachedApplicability.get_collection().find().count(), 1)
+        # Test
+        factory.repo_manager().delete_repo('repo-2')
+        # Verify
+        self.assertEqual(CachedApplicability.get_collection().find().count(), 0)
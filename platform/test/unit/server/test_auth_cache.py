@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import mock
+
+import base
+
+from pulp.server.auth.cache import AuthenticationCache
+
+# authentication cache tests ---------------------------------------------------
+
+class AuthenticationCacheTests(base.PulpServerTests):
+
+    def setUp(self):
+        super(AuthenticationCacheTests, self).setUp()
+        self.cache = AuthenticationCache(3, 60)
+
+    def test_key(self):
+        key = self.cache.key('password', 'entry', 'secret')
+        self.assertEqual(key, self.cache.key('password', 'entry', 'secret'))
+        self.assertNotEqual(key, self.cache.key('password', 'entry', 'other'))
+        self.assertNotEqual(key, self.cache.key('password', 'entrysecret'))
+        self.assertFalse('secret' in key)
+        # keys are only meaningful to the cache that generated them
+        self.assertNotEqual(key, AuthenticationCache(3, 60).key('password', 'entry', 'secret'))
+
+    def test_get_put(self):
+        key = self.cache.key('user_cert', 'pem')
+        self.assertTrue(self.cache.get(key) is None)
+        self.cache.put(key, 'admin', owner='admin')
+        self.assertEqual(self.cache.get(key), 'admin')
+
+    @mock.patch('time.time')
+    def test_expiration(self, mock_time):
+        mock_time.return_value = 1000.0
+        key = self.cache.key('user_cert', 'pem')
+        self.cache.put(key, 'admin')
+        mock_time.return_value = 1059.0
+        self.assertEqual(self.cache.get(key), 'admin')
+        mock_time.return_value = 1060.0
+        self.assertTrue(self.cache.get(key) is None)
+        self.assertEqual(self.cache.metrics()['size'], 0)
+
+    @mock.patch('time.time')
+    def test_expiration_capped(self, mock_time):
+        mock_time.return_value = 1000.0
+        key = self.cache.key('user_cert', 'pem')
+        # the certificate expires before the time to live
+        self.cache.put(key, 'admin', expires=1010.0)
+        mock_time.return_value = 1009.0
+        self.assertEqual(self.cache.get(key), 'admin')
+        mock_time.return_value = 1010.0
+        self.assertTrue(self.cache.get(key) is None)
+
+    def test_eviction(self):
+        keys = [self.cache.key('consumer_cert', str(i)) for i in range(4)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, str(i))
+        self.assertTrue(self.cache.get(keys[0]) is None)
+        for i, key in enumerate(keys[1:]):
+            self.assertEqual(self.cache.get(key), str(i + 1))
+        metrics = self.cache.metrics()
+        self.assertEqual(metrics['size'], 3)
+        self.assertEqual(metrics['evictions'], 1)
+
+    def test_eviction_replaced(self):
+        key_1 = self.cache.key('consumer_cert', '1')
+        key_2 = self.cache.key('consumer_cert', '2')
+        key_3 = self.cache.key('consumer_cert', '3')
+        key_4 = self.cache.key('consumer_cert', '4')
+        self.cache.put(key_1, '1')
+        self.cache.put(key_2, '2')
+        self.cache.put(key_1, '1')
+        self.cache.put(key_3, '3')
+        self.cache.put(key_4, '4')
+        # key 1 was re-cached after key 2
+        self.assertTrue(self.cache.get(key_2) is None)
+        self.assertEqual(self.cache.get(key_1), '1')
+
+    def test_invalidate_owner(self):
+        key_1 = self.cache.key('user_cert', '1')
+        key_2 = self.cache.key('user_cert', '2')
+        self.cache.put(key_1, 'admin', owner='admin')
+        self.cache.put(key_2, 'user', owner='user')
+        self.cache.invalidate('admin')
+        self.assertTrue(self.cache.get(key_1) is None)
+        self.assertEqual(self.cache.get(key_2), 'user')
+
+    def test_invalidate_all(self):
+        key = self.cache.key('user_cert', '1')
+        self.cache.put(key, 'admin', owner='admin')
+        self.cache.invalidate()
+        self.assertTrue(self.cache.get(key) is None)
+        self.assertEqual(self.cache.metrics()['invalidations'], 1)
+
+    def test_put_after_invalidation(self):
+        key = self.cache.key('user_cert', '1')
+        generation = self.cache.generation()
+        # the user is changed while its certificate is being verified
+        self.cache.invalidate('admin')
+        self.cache.put(key, 'admin', owner='admin', generation=generation)
+        self.assertTrue(self.cache.get(key) is None)
+
+    def test_disabled(self):
+        for cache in (AuthenticationCache(0, 60), AuthenticationCache(3, 0)):
+            key = cache.key('user_cert', '1')
+            cache.put(key, 'admin')
+            self.assertTrue(cache.get(key) is None)
+
+    def test_metrics(self):
+        key = self.cache.key('user_cert', '1')
+        self.cache.get(key)
+        self.cache.put(key, 'admin')
+        self.cache.get(key)
+        self.cache.get(key)
+        self.cache.get(key)
+        metrics = self.cache.metrics()
+        self.assertEqual(metrics['hits'], 3)
+        self.assertEqual(metrics['misses'], 1)
+        self.assertEqual(metrics['hit_rate'], 0.75)
+        self.assertEqual(metrics['max_size'], 3)
+        self.assertEqual(metrics['ttl'], 60)
@@ -178,6 +178,22 @@ class BindManagerTests(base.PulpAsyncServerTests):
         self.assertEqual(bind['notify_agent'], self.NOTIFY_AGENT)
         self.assertEqual(bind['binding_config'], self.BINDING_CONFIG)
 
+    def test_find_by_consumer_list(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_bind_manager()
+        manager.bind(self.CONSUMER_ID, self.REPO_ID, self.DISTRIBUTOR_ID,
+                     self.NOTIFY_AGENT, self.BINDING_CONFIG)
+        # Test
+        binds = manager.find_by_consumer_list([self.CONSUMER_ID, 'other-consumer'])
+        # Verify
+        self.assertEqual(binds['other-consumer'], [])
+        self.assertEqual(len(binds[self.CONSUMER_ID]), 1)
+        bind = binds[self.CONSUMER_ID][0]
+        self.assertEqual(bind['consumer_id'], self.CONSUMER_ID)
+        self.assertEqual(bind['repo_id'], self.REPO_ID)
+        self.assertEqual(bind['distributor_id'], self.DISTRIBUTOR_ID)
+
     def test_find_by_criteria(self):
         # Setup
         self.populate()
@@ -14,10 +14,21 @@
 #
 
 import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
 import unittest
+from datetime import datetime, timedelta
 
+import mock
+
+from pulp.common import dateutils
+from pulp.server.auth.cache import AuthenticationCache
 from pulp.server.managers import factory as manager_factory
-from pulp.server.managers.auth.cert.cert_generator import SerialNumber, _make_priv_key
+from pulp.server.managers.auth.authentication import AuthenticationManager
+from pulp.server.managers.auth.cert.cert_generator import CAStore, SerialNumber, _make_priv_key
 
 
 SerialNumber.PATH = '/tmp/sn.dat'
@@ -26,8 +37,8 @@ sn.reset()
 
 
 # The following certificate was signed by the pulp CA
-# (<code root>/etc/pki/pulp/ca.crt)
-VALID_CERT = '''
+# (<code root>/etc/pki/pulp/ca.crt) and expired on 2011-08-25
+EXPIRED_CERT = '''
 -----BEGIN CERTIFICATE-----
 MIID2jCCAsICAQEwDQYJKoZIhvcNAQEFBQAwFDESMBAGA1UEAxMJbG9jYWxob3N0
 MB4XDTEwMDgyNTEyNTkzNVoXDTExMDgyNTEyNTkzNVowUjELMAkGA1UEBhMCVVMx
@@ -119,12 +130,168 @@ class TestCertGeneration(unittest.TestCase):
 
     def test_verify(self):
         # Test
-        valid_result = self.cert_gen_manager.verify_cert(VALID_CERT)
+        valid_result = self.cert_gen_manager.verify_cert(self.cert_gen_manager.make_cert('verify', 7)[1])
         self.assertTrue(valid_result)
 
         invalid_result = self.cert_gen_manager.verify_cert(INVALID_CERT)
         self.assertTrue(not invalid_result)
 
+    def test_verify_expired(self):
+        # Test
+        result = self.cert_gen_manager.verify_cert(EXPIRED_CERT)
+
+        # Verify
+        self.assertFalse(result)
+
+
+class TestCAStore(unittest.TestCase):
+
+    def setUp(self):
+        super(TestCAStore, self).setUp()
+        self.store = CAStore()
+        self.working_dir = tempfile.mkdtemp(prefix='ca-store-')
+        self.ca_key, self.ca_cert = self._make_cert('test-ca')
+
+    def tearDown(self):
+        super(TestCAStore, self).tearDown()
+        shutil.rmtree(self.working_dir)
+
+    def _openssl(self, *args, **kwargs):
+        p = subprocess.Popen(('openssl',) + args, stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate(input=kwargs.get('input'))
+        if p.returncode != 0:
+            raise Exception(stderr)
+        return stdout
+
+    def _make_cert(self, cn, issuer=None, ca=False):
+        # returns the paths of the key and certificate; self signed CA
+        # certificates are created when no issuer is given
+        key_path = os.path.join(self.working_dir, cn + '.key')
+        cert_path = os.path.join(self.working_dir, cn + '.crt')
+        if issuer is None:
+            self._openssl('req', '-x509', '-newkey', 'rsa:1024', '-nodes', '-days', '1',
+                          '-subj', '/CN=%s' % cn, '-keyout', key_path, '-out', cert_path)
+            return key_path, cert_path
+        request = self._openssl('req', '-new', '-newkey', 'rsa:1024', '-nodes',
+                                '-subj', '/CN=%s' % cn, '-keyout', key_path)
+        args = ['x509', '-req', '-days', '1', '-set_serial', str(abs(hash(cn))),
+                '-CA', issuer[1], '-CAkey', issuer[0], '-out', cert_path]
+        if ca:
+            ext_path = os.path.join(self.working_dir, cn + '.ext')
+            fp = open(ext_path, 'w')
+            fp.write('basicConstraints=CA:TRUE\n')
+            fp.close()
+            args.extend(['-extfile', ext_path])
+        self._openssl(input=request, *args)
+        return key_path, cert_path
+
+    def _ca_file(self, *cert_paths):
+        ca_path = os.path.join(self.working_dir, 'ca-bundle.crt')
+        fp = open(ca_path, 'w')
+        for cert_path in cert_paths:
+            fp.write(open(cert_path).read())
+        fp.close()
+        return ca_path
+
+    def test_verify(self):
+        # Setup
+        cert_pem = open(self._make_cert('consumer', self.ca_cert)[1]).read()
+        ca_path = self._ca_file(self.ca_cert[1])
+
+        # Test
+        self.assertTrue(self.store.verify(ca_path, cert_pem))
+        self.assertFalse(self.store.verify(ca_path, INVALID_CERT))
+
+    def test_verify_cached(self):
+        # Setup
+        cert_pem = open(self._make_cert('consumer', self.ca_cert)[1]).read()
+        ca_path = self._ca_file(self.ca_cert[1])
+        self.store.verify(ca_path, cert_pem)
+        hits = self.store.verified.metrics()['hits']
+
+        # Test
+        result = self.store.verify(ca_path, cert_pem)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertEqual(self.store.verified.metrics()['hits'], hits + 1)
+
+    def test_verify_cached_until_expired(self):
+        # Setup
+        cert_pem = open(self._make_cert('consumer', self.ca_cert)[1]).read()
+        ca_path = self._ca_file(self.ca_cert[1])
+        self.assertTrue(self.store.verify(ca_path, cert_pem))
+        key = self.store.verified.key(cert_pem)
+
+        # Test
+        # the certificates are valid for a day, less than a day is cached
+        # when the time to live is longer
+        self.assertTrue(self.store.verified.get(key) is not None)
+        with mock.patch('time.time') as mock_time:
+            mock_time.return_value = time.time() + 86400 + 60
+            self.assertTrue(self.store.verified.get(key) is None)
+
+    @mock.patch('pulp.server.managers.auth.authentication.authentication_cache')
+    def test_authentication_cached_until_expired(self, mock_cache):
+        # Setup
+        cert_pem = open(self._make_cert('consumer', self.ca_cert)[1]).read()
+        ca_path = self._ca_file(self.ca_cert[1])
+        # the time to live is longer than the certificate is valid
+        mock_cache.return_value = AuthenticationCache(10, 86400 * 7)
+        manager = AuthenticationManager()
+        expired = datetime.now(dateutils.utc_tz()) + timedelta(days=1, minutes=1)
+
+        # Test
+        with mock.patch('pulp.server.config.config.get') as mock_get:
+            mock_get.return_value = ca_path
+            self.assertEqual(manager.check_consumer_cert(cert_pem), 'consumer')
+            with mock.patch('time.time') as mock_time:
+                mock_time.return_value = time.time() + 86400 + 60
+                with mock.patch('pulp.server.managers.auth.cert.cert_generator.datetime') as mock_datetime:
+                    mock_datetime.now.return_value = expired
+                    result = manager.check_consumer_cert(cert_pem)
+
+        # Verify
+        self.assertTrue(result is None)
+
+    def test_verify_intermediate(self):
+        # Setup
+        intermediate = self._make_cert('intermediate', self.ca_cert, ca=True)
+        cert_pem = open(self._make_cert('consumer', intermediate)[1]).read()
+
+        # Test
+        self.assertFalse(self.store.verify(self._ca_file(self.ca_cert[1]), cert_pem))
+        self.assertTrue(self.store.verify(self._ca_file(self.ca_cert[1], intermediate[1]), cert_pem))
+
+    def test_verify_issuer_not_ca(self):
+        # Setup
+        not_ca = self._make_cert('not-ca', self.ca_cert)
+        cert_pem = open(self._make_cert('consumer', not_ca)[1]).read()
+
+        # Test
+        self.assertFalse(self.store.verify(self._ca_file(self.ca_cert[1], not_ca[1]), cert_pem))
+
+    def test_verify_reload(self):
+        # Setup
+        cert_pem = open(self._make_cert('consumer', self.ca_cert)[1]).read()
+        ca_path = os.path.join(self.working_dir, 'ca.crt')
+
+        # Test
+        # missing CA file
+        self.assertFalse(self.store.verify(ca_path, cert_pem))
+
+        # CA file without the issuer
+        fp = open(ca_path, 'w')
+        fp.write(INVALID_CERT)
+        fp.close()
+        self.assertFalse(self.store.verify(ca_path, cert_pem))
+
+        # CA file replaced with one containing the issuer
+        shutil.copy(self.ca_cert[1], ca_path)
+        self.assertTrue(self.store.verify(ca_path, cert_pem))
+        self.assertFalse(self.store.verify(ca_path, INVALID_CERT))
+
 if __name__ == '__main__':
     logging.root.addHandler(logging.StreamHandler())
     logging.root.setLevel(logging.INFO)
@@ -140,6 +140,44 @@ class SingleRepoUnitsMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.DistributorConduitException, self.mixin.get_units)
 
+    @mock.patch('pulp.plugins.types.database.type_definition')
+    @mock.patch('pulp.server.managers.repo.unit_association_query.RepoUnitAssociationQueryManager.get_units_iter')
+    def test_get_units_iter(self, mock_query_call, mock_type_def_call):
+        # Setup
+        mock_query_call.return_value = iter([
+            {'unit_type_id' : 'type-1', 'metadata' : {'m' : 'm1', 'k1' : 'v1'}},
+            {'unit_type_id' : 'type-1', 'metadata' : {'m' : 'm1', 'k1' : 'v2'}},
+        ])
+
+        mock_type_def_call.return_value = {
+            'id' : 'mock-type-def',
+            'unit_key' : ['k1']
+        }
+
+        fake_criteria = 'fake-criteria'
+
+        # Test
+        units = self.mixin.get_units_iter(criteria=fake_criteria, batch_size=5)
+
+        # Verify
+        self.assertEqual(0, mock_query_call.call_count) # nothing is loaded until iterated
+        units = list(units)
+        self.assertEqual(2, len(units))
+        self.assertEqual(['v1', 'v2'], [u.unit_key['k1'] for u in units])
+        self.assertEqual(1, mock_query_call.call_count)
+        self.assertEqual(mock_query_call.call_args[0][0], self.repo_id)
+        self.assertEqual(mock_query_call.call_args[1]['criteria'], fake_criteria)
+        self.assertEqual(mock_query_call.call_args[1]['page_size'], 5)
+        self.assertEqual(1, mock_type_def_call.call_count) # type definitions are cached
+
+    @mock.patch('pulp.server.managers.repo.unit_association_query.RepoUnitAssociationQueryManager.get_units_iter')
+    def test_get_units_iter_server_error(self, mock_query_call):
+        # Setup
+        mock_query_call.side_effect = Exception()
+
+        # Test
+        self.assertRaises(mixins.DistributorConduitException, list, self.mixin.get_units_iter())
+
 
 class MultipleRepoUnitsMixinTests(unittest.TestCase):
 
@@ -434,6 +472,10 @@ class AddUnitMixinTests(unittest.TestCase):
         self.assertEqual(0, self.mixin._updated_count)
         self.assertEqual(saved.id, 'new-unit-id')
 
+        # the applicability is invalidated once, at the end of the operation
+        self.assertFalse(mock_associate.call_args[1]['invalidate_applicability'])
+        self.assertTrue(self.mixin._applicability_stale)
+
     @mock.patch('pulp.server.managers.content.query.ContentQueryManager.request_content_unit_file_path')
     @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_content_unit_by_keys_dict')
     @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_unit')
@@ -456,6 +498,22 @@ class AddUnitMixinTests(unittest.TestCase):
         self.assertEqual(1, self.mixin._updated_count)
         self.assertEqual(saved.id, 'existing')
 
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.request_content_unit_file_path')
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_content_unit_by_keys_dict')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_unit')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.associate_unit_by_id')
+    def test_save_unit_already_associated(self, mock_associate, mock_update, mock_get, mock_path):
+        # Setup
+        unit = self.mixin.init_unit('t', {'k' : 'v'}, {'m' : 'm1'}, '/bar')
+        mock_get.return_value = {'_id' : 'existing'}
+        mock_associate.return_value = False
+
+        # Test
+        self.mixin.save_unit(unit)
+
+        # Verify
+        self.assertFalse(self.mixin._applicability_stale)
+
     @mock.patch('pulp.server.managers.content.query.ContentQueryManager.request_content_unit_file_path')
     @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_content_unit_by_keys_dict')
     @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_unit')
@@ -468,6 +526,102 @@ class AddUnitMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.ImporterConduitException, self.mixin.save_unit, None)
 
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.request_content_unit_file_path')
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_content_unit_collection')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_unit')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.add_content_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.associate_all_by_ids')
+    def test_save_units(self, mock_associate, mock_add, mock_update, mock_collection, mock_path):
+        # Setup
+        mock_path.return_value = '/bar'
+        new_unit = self.mixin.init_unit('t', {'k' : 'new'}, {'m' : 'm1'}, 'new')
+        duplicate_unit = self.mixin.init_unit('t', {'k' : 'new'}, {'m' : 'm1'}, 'new')
+        changed_unit = self.mixin.init_unit('t', {'k' : 'changed'}, {'m' : 'm2'}, 'changed')
+        same_unit = self.mixin.init_unit('t', {'k' : 'same'}, {'m' : 'm1'}, 'same')
+        other_type_unit = self.mixin.init_unit('t2', {'k' : 'other'}, {'m' : 'm1'}, 'other')
+
+        def collection(type_id):
+            existing = ()
+            if type_id == 't':
+                existing = ({'_id' : 'changed-id', 'k' : 'changed', 'm' : 'm1', '_storage_path' : '/bar'},
+                            {'_id' : 'same-id', 'k' : 'same', 'm' : 'm1', '_storage_path' : '/bar'})
+            mock_type_collection = mock.Mock()
+            mock_type_collection.find.return_value = iter(existing)
+            return mock_type_collection
+        mock_collection.side_effect = collection
+
+        def add_units(type_id, units_metadata):
+            return ['%s-added-%d' % (type_id, i) for i in range(len(units_metadata))]
+        mock_add.side_effect = add_units
+
+        # Test
+        units = [new_unit, duplicate_unit, changed_unit, same_unit, other_type_unit]
+        saved = self.mixin.save_units(iter(units), batch_size=10)
+
+        # Verify
+        self.assertEqual(saved, units)
+        self.assertEqual(new_unit.id, 't-added-0')
+        self.assertEqual(duplicate_unit.id, 't-added-0')
+        self.assertEqual(changed_unit.id, 'changed-id')
+        self.assertEqual(same_unit.id, 'same-id')
+        self.assertEqual(other_type_unit.id, 't2-added-0')
+
+        self.assertEqual(2, mock_collection.call_count) # one query per type
+        self.assertEqual(2, mock_add.call_count) # one per type
+        self.assertEqual(1, mock_update.call_count) # unchanged unit is not written
+        self.assertEqual('changed-id', mock_update.call_args[0][1])
+
+        self.assertEqual(2, mock_associate.call_count)
+        for call_args in mock_associate.call_args_list:
+            self.assertEqual(self.repo_id, call_args[0][0])
+            self.assertEqual(self.association_owner_type, call_args[0][3])
+            self.assertEqual(self.association_owner_id, call_args[0][4])
+        associated_ids = set()
+        for call_args in mock_associate.call_args_list:
+            associated_ids.update(call_args[0][2])
+        self.assertEqual(associated_ids, set(['t-added-0', 'changed-id', 'same-id', 't2-added-0']))
+
+        self.assertEqual(2, self.mixin._added_count)
+        self.assertEqual(2, self.mixin._updated_count)
+
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.request_content_unit_file_path')
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_content_unit_collection')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_unit')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.add_content_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.associate_all_by_ids')
+    def test_save_units_exact_keys(self, mock_associate, mock_add, mock_update, mock_collection, mock_path):
+        # Setup
+        mock_path.return_value = '/bar'
+        # unhashable unit key values
+        unit_1 = self.mixin.init_unit('t', {'k' : 'a', 'l' : [1, 2]}, {'m' : 'm1'}, 'a')
+        unit_2 = self.mixin.init_unit('t', {'k' : 'b', 'l' : [3]}, {'m' : 'm1'}, 'b')
+        mock_type_collection = mock_collection.return_value
+        mock_type_collection.find.return_value = iter((
+            {'_id' : 'a-id', 'k' : 'a', 'l' : [1, 2], 'm' : 'm1', '_storage_path' : '/bar'},))
+        mock_add.return_value = ['b-id']
+
+        # Test
+        self.mixin.save_units([unit_1, unit_2])
+
+        # Verify
+        self.assertEqual(unit_1.id, 'a-id')
+        self.assertEqual(unit_2.id, 'b-id')
+        self.assertFalse(mock_update.called)
+
+        spec = mock_type_collection.find.call_args[0][0]
+        self.assertEqual(sorted(spec['$or']), sorted([{'k' : 'a', 'l' : [1, 2]}, {'k' : 'b', 'l' : [3]}]))
+        fields = mock_type_collection.find.call_args[1]['fields']
+        self.assertEqual(sorted(fields), ['_id', '_storage_path', 'k', 'l', 'm'])
+
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_content_unit_collection')
+    def test_save_units_with_error(self, mock_collection):
+        # Setup
+        mock_collection.side_effect = Exception()
+        unit = Unit('t', {'k' : 'v'}, {'m' : 'm1'}, None)
+
+        # Test
+        self.assertRaises(mixins.ImporterConduitException, self.mixin.save_units, [unit])
+
     @mock.patch('pulp.server.managers.content.cud.ContentManager.link_referenced_content_units')
     def test_link_unit(self, mock_link):
         # Setup
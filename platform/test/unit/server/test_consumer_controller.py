@@ -22,6 +22,7 @@ from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.model import ApplicabilityReport
 from pulp.server.compat import ObjectId
 from pulp.server.managers import factory
+from pulp.server.managers.consumer.applicability import ApplicabilityResult
 from pulp.server.db.model.consumer import Consumer, Bind, UnitProfile
 from pulp.server.db.model.dispatch import ScheduledCall
 from pulp.server.db.model.repository import Repo, RepoDistributor
@@ -901,6 +902,27 @@ class TestProfiles(base.PulpWebserviceTests):
         status, body = self.get(path)
         self.assertEqual(status, 404)
 
+    def test_get_hash(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.create(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Test
+        path = '/v2/consumers/%s/profiles/%s/hash/' % (self.CONSUMER_ID, self.TYPE_1)
+        status, body = self.get(path)
+        # Verify
+        self.assertEqual(status, 200)
+        self.assertEqual(body['consumer_id'], self.CONSUMER_ID)
+        self.assertEqual(body['content_type'], self.TYPE_1)
+        self.assertEqual(body['profile_hash'], UnitProfile.calculate_hash(self.PROFILE_1))
+        self.assertFalse('profile' in body)
+
+    def test_get_hash_not_found(self):
+        # Test
+        path = '/v2/consumers/%s/profiles/unknown/hash/' % self.CONSUMER_ID
+        status, body = self.get(path)
+        self.assertEqual(status, 404)
+
     def test_delete_not_found(self):
         # Test
         path = '/v2/consumers/%s/profiles/unknown/' % self.CONSUMER_ID
@@ -966,6 +988,24 @@ class TestApplicability(base.PulpWebserviceTests):
         self.assertEquals(status, 200)
         self.assertEquals(len(body), 0)
 
+    @mock.patch('pulp.server.managers.consumer.applicability.ApplicabilityManager.units_applicable')
+    def test_stale(self, mock_applicable):
+        # Setup
+        result = ApplicabilityResult()
+        report = ApplicabilityReport(self.SUMMARY, self.DETAILS)
+        result['test-1'] = {'errata': [report], 'rpm': [report]}
+        result['test-2'] = {'errata': [report]}
+        result.stale['test-1'] = ['rpm', 'errata']
+        mock_applicable.return_value = result
+        # Test
+        body = dict(consumer_criteria=self.CONSUMER_CRITERIA)
+        status, body = self.post(self.PATH, body)
+        # Verify
+        self.assertEquals(status, 200)
+        self.assertEquals(body['test-1']['stale'], ['errata', 'rpm'])
+        self.assertEquals(len(body['test-1']['rpm']), 1)
+        self.assertFalse('stale' in body['test-2'])
+
 # scheduled content management tests -------------------------------------------
 
 class ScheduledUnitInstallTests(base.PulpWebserviceTests):
@@ -14,6 +14,7 @@ import mock_agent
 
 from mock import patch
 from base import PulpItineraryTests
+from pulp.plugins.loader import api as plugin_api
 from pulp.server.managers import factory
 from pulp.server.dispatch import constants as dispatch_constants
 from pulp.server.db.model.consumer import Consumer, ConsumerGroup
@@ -153,3 +154,25 @@ class TestContent(PulpItineraryTests):
             self.assertTrue(call_report.result['succeeded'])
             self.assertEqual(call_report.result['details'], report.details)
             self.assertEqual(call_report.result['reboot'], report.reboot)
+
+    def test_install_translated(self):
+        # Setup
+        self.populate()
+        collection = ConsumerGroup.get_collection()
+        collection.update({'id': self.GROUP_ID}, {'$push': {'consumer_ids': 'missing'}}, safe=True)
+        unit_key = dict(name='zsh')
+        unit = dict(type_id='rpm', unit_key=unit_key)
+        units = [unit,]
+        options = dict(importkeys=True)
+        # Test
+        itineraries = consumer_group_content_install_itinerary(self.GROUP_ID, units, options)
+        # Verify
+        # the units are translated up front for the consumers that exist,
+        # the missing consumer's call fails when it is run
+        self.assertEqual(len(itineraries), 3)
+        translated = [i.kwargs['translated'] for i in itineraries]
+        self.assertEqual(translated, [True, True, False])
+        profiler = plugin_api.get_profiler_by_type('rpm')[0]
+        self.assertEqual(profiler.install_units.call_count, 2)
+        for itinerary in itineraries[:2]:
+            self.assertEqual(itinerary.kwargs['units'], units)
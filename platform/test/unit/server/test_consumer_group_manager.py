@@ -16,13 +16,15 @@ import shutil
 import traceback
 import unittest
 
+import mock
+
 from base import PulpAsyncServerTests
 
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.db.model.consumer import Consumer, ConsumerGroup
 from pulp.server.managers import factory as managers_factory
-from pulp.server.managers.consumer.group import cud
+from pulp.server.managers.consumer.group import cud, fanout
 
 
 class ConsumerGroupManagerInstantiationTests(unittest.TestCase):
@@ -223,4 +225,137 @@ class ConsumerGroupMembershipTests(ConsumerGroupTests):
         self.assertTrue(consumer_1['id'] in group['consumer_ids'])
         self.assertTrue(consumer_2['id'] in group['consumer_ids'])
 
+    # content and bind fan-out -------------------------------------------------
+
+    UNITS = [{'type_id': 'unsupported', 'unit_key': {'name': 'zsh'}}]
+
+    def _create_fanout_group(self, group_id):
+        self._create_consumer('consumer_1')
+        self._create_consumer('consumer_2')
+        consumer_ids = ['consumer_1', 'consumer_2', 'missing']
+        self.manager.create_consumer_group(group_id, consumer_ids=consumer_ids)
 
+    def _failed_report(self, call, *args):
+        try:
+            call(*args)
+        except fanout.GroupOperationFailed, e:
+            return e.report
+        self.fail('GroupOperationFailed not raised')
+
+    @mock.patch('pulp.server.managers.consumer.group.cud.PulpAgent')
+    def test_install_content(self, mock_agent):
+        group_id = 'install_group'
+        self._create_fanout_group(group_id)
+
+        report = self._failed_report(self.manager.install_content, group_id, self.UNITS, {'importkeys': True})
+
+        install = mock_agent.return_value.content.install
+        self.assertEqual(install.call_count, 2)
+        install.assert_called_with(self.UNITS, {'importkeys': True})
+        agent_consumers = sorted(c[0][0]['id'] for c in mock_agent.call_args_list)
+        self.assertEqual(agent_consumers, ['consumer_1', 'consumer_2'])
+        self.assertEqual(report['consumer_group_id'], group_id)
+        self.assertEqual(report['action'], 'install')
+        self.assertEqual(report['total'], 3)
+        self.assertEqual(report['completed'], 3)
+        self.assertEqual(sorted(report['succeeded']), ['consumer_1', 'consumer_2'])
+        self.assertEqual(report['failed'].keys(), ['missing'])
+
+    @mock.patch('pulp.server.managers.consumer.group.cud.PulpAgent')
+    def test_uninstall_content_failed(self, mock_agent):
+        group_id = 'uninstall_group'
+        self._create_fanout_group(group_id)
+        mock_agent.return_value.content.uninstall.side_effect = Exception('not reachable')
+
+        report = self._failed_report(self.manager.uninstall_content, group_id, self.UNITS, {})
+
+        self.assertEqual(report['succeeded'], [])
+        self.assertEqual(sorted(report['failed'].keys()), ['consumer_1', 'consumer_2', 'missing'])
+        self.assertEqual(report['failed']['consumer_1'], 'not reachable')
+
+    @mock.patch('pulp.server.managers.consumer.group.cud.PulpAgent')
+    def test_update_content(self, mock_agent):
+        group_id = 'update_group'
+        self._create_consumer('consumer_1')
+        self.manager.create_consumer_group(group_id, consumer_ids=['consumer_1'])
+
+        report = self.manager.update_content(group_id, self.UNITS, {})
+
+        mock_agent.return_value.content.update.assert_called_with(self.UNITS, {})
+        self.assertEqual(report['succeeded'], ['consumer_1'])
+        self.assertEqual(report['failed'], {})
+
+    def test_install_content_missing_group(self):
+        self.assertRaises(pulp_exceptions.MissingResource, self.manager.install_content,
+                          'missing_group', self.UNITS, {})
+
+    def test_unbind(self):
+        group_id = 'unbind_group'
+        self._create_fanout_group(group_id)
+
+        report = self._failed_report(self.manager.unbind, group_id, 'repo_1', 'dist_1')
+
+        self.assertEqual(report['action'], 'unbind')
+        self.assertEqual(sorted(report['succeeded']), ['consumer_1', 'consumer_2'])
+        self.assertEqual(report['failed'].keys(), ['missing'])
+
+    def test_bind_missing_distributor(self):
+        group_id = 'bind_group'
+        self._create_fanout_group(group_id)
+        self.assertRaises(pulp_exceptions.MissingResource, self.manager.bind,
+                          group_id, 'repo_1', 'dist_1', True, None)
+
+
+class GroupFanOutTests(unittest.TestCase):
+
+    def test_progress(self):
+        progress = fanout.GroupProgress('group_1', 'install', ['consumer_1', 'consumer_2'])
+        progress.succeeded('consumer_1')
+        progress.failed('consumer_2', ValueError())
+        report = progress.report()
+        self.assertEqual(report['total'], 2)
+        self.assertEqual(report['completed'], 2)
+        self.assertEqual(report['succeeded'], ['consumer_1'])
+        self.assertEqual(report['failed'], {'consumer_2': 'ValueError'})
+
+    def test_operation_failed(self):
+        progress = fanout.GroupProgress('group_1', 'install', ['consumer_1'])
+        progress.failed('consumer_1', ValueError('failed'))
+        e = fanout.GroupOperationFailed(progress.report())
+        self.assertEqual(str(e), 'install failed for 1 of 1 consumers in consumer group [group_1]')
+        self.assertEqual(e.data_dict()['report']['failed'], {'consumer_1': 'failed'})
+
+    @mock.patch('pulp.server.dispatch.factory.context')
+    def test_progress_reported(self, mock_context):
+        consumer_ids = ['consumer_%d' % i for i in range(fanout.PROGRESS_INTERVAL + 1)]
+        progress = fanout.GroupProgress('group_1', 'install', consumer_ids)
+        for consumer_id in consumer_ids:
+            progress.succeeded(consumer_id)
+        report_progress = mock_context.return_value.report_progress
+        # every interval and on completion
+        self.assertEqual(report_progress.call_count, 2)
+        self.assertEqual(report_progress.call_args[0][0]['completed'], len(consumer_ids))
+
+    def test_fanout(self):
+        principal_manager = managers_factory.principal_manager()
+        principal = {'login': 'admin'}
+        principal_manager.set_principal(principal)
+        try:
+            principals = []
+            def call(consumer_id):
+                principals.append(principal_manager.get_principal())
+                if consumer_id == 'consumer_2':
+                    raise ValueError('failed')
+            consumer_ids = ['consumer_1', 'consumer_2', 'consumer_3']
+            progress = fanout.GroupProgress('group_1', 'bind', consumer_ids)
+            group_fanout = fanout.GroupFanOut(progress, max_workers=2)
+            for consumer_id in consumer_ids:
+                group_fanout.submit(consumer_id, call, consumer_id)
+            self.assertRaises(fanout.GroupOperationFailed, group_fanout.wait)
+            report = progress.report()
+        finally:
+            principal_manager.clear_principal()
+        self.assertEqual(sorted(report['succeeded']), ['consumer_1', 'consumer_3'])
+        self.assertEqual(report['failed'], {'consumer_2': 'failed'})
+        # calls are made on behalf of the submitting thread's principal
+        self.assertEqual(principals, [principal] * 3)
@@ -73,6 +73,13 @@ class PulpContentCUDTests(PulpContentTests):
         units = self.query_manager.list_content_units(TYPE_1_DEF.id)
         self.assertEqual(len(units), 1)
 
+    def test_add_content_units(self):
+        unit_ids = self.cud_manager.add_content_units(TYPE_1_DEF.id, TYPE_1_UNITS[:2])
+        self.assertEqual(len(unit_ids), 2)
+        units = self.query_manager.get_multiple_units_by_ids(TYPE_1_DEF.id, unit_ids)
+        self.assertEqual(len(units), 2)
+        self.assertEqual(self.cud_manager.add_content_units(TYPE_1_DEF.id, []), [])
+
     def test_update_content_unit(self):
         unit_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
         unit = self.query_manager.get_content_unit_by_id(TYPE_1_DEF.id, unit_id)
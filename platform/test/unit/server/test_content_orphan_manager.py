@@ -18,13 +18,14 @@ import tempfile
 import traceback
 
 import base
+import mock
 
 from pulp.server import exceptions as pulp_exceptions
 from pulp.plugins.types import database as content_type_db
 from pulp.plugins.types.model import TypeDefinition
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.managers import factory as manager_factory
-from pulp.server.managers.content.orphan import OrphanManager
+from pulp.server.managers.content.orphan import OrphanFileDeleter, OrphanManager
 
 import mock_plugins
 
@@ -171,6 +172,23 @@ class OrphanManagerTests(base.PulpServerTests):
         orphans = self.orphan_manager.list_all_orphans()
         self.assertTrue(len(orphans) == 1)
 
+    def test_get_associated_orphan(self):
+        unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
+        associate_content_unit_with_repo(unit)
+        self.assertRaises(pulp_exceptions.MissingResource,
+                          self.orphan_manager.get_orphan,
+                          PHONY_TYPE_1.id, unit['_id'])
+
+    @mock.patch('pulp.server.managers.content.orphan.ORPHAN_BATCH_SIZE', 2)
+    def test_generate_orphans_by_type_batches(self):
+        units = [gen_content_unit(PHONY_TYPE_1.id, self.content_root) for i in range(5)]
+        for unit in units[1::2]:
+            associate_content_unit_with_repo(unit)
+        orphans = list(self.orphan_manager.generate_orphans_by_type(PHONY_TYPE_1.id, fields=['_id']))
+        expected_ids = sorted(u['_id'] for u in units[0::2])
+        self.assertEqual(expected_ids, [o['_id'] for o in orphans])
+        self.assertEqual(set(['_id']), set(orphans[0].keys()))
+
     # delete test methods ------------------------------------------------------
 
     def test_delete_one_orphan(self):
@@ -197,6 +215,20 @@ class OrphanManagerTests(base.PulpServerTests):
         self.assertFalse(os.path.exists(unit_1['_storage_path']))
         self.assertTrue(os.path.exists(unit_2['_storage_path']))
 
+    @mock.patch('pulp.server.managers.content.orphan.ORPHAN_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.managers.content.orphan._report_progress')
+    def test_delete_by_type_batches(self, mock_report):
+        units = [gen_content_unit(PHONY_TYPE_1.id, self.content_root) for i in range(5)]
+        associate_content_unit_with_repo(units[0])
+        self.orphan_manager.delete_orphans_by_type(PHONY_TYPE_1.id)
+        orphans = self.orphan_manager.list_all_orphans()
+        self.assertEqual(0, len(orphans))
+        self.assertTrue(os.path.exists(units[0]['_storage_path']))
+        self.assertEqual(1, self.number_of_files_in_content_root())
+        self.assertEqual(3, mock_report.call_count)
+        self.assertEqual({PHONY_TYPE_1.id: {'deleted': 4, 'bytes_freed': 0}},
+                         mock_report.call_args[0][0])
+
     def test_delete_by_id(self):
         unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
         json_obj = {'content_type_id': unit['_content_type_id'],
@@ -206,3 +238,64 @@ class OrphanManagerTests(base.PulpServerTests):
         self.assertTrue(len(orphans) == 0)
         self.assertTrue(self.number_of_files_in_content_root() == 0)
 
+
+    @mock.patch('pulp.server.managers.content.orphan.ORPHAN_BATCH_SIZE', 2)
+    def test_delete_by_id_batches(self):
+        units = [gen_content_unit(PHONY_TYPE_1.id, self.content_root) for i in range(3)]
+        json_objs = [{'content_type_id': u['_content_type_id'], 'unit_id': u['_id']} for u in units]
+        self.orphan_manager.delete_orphans_by_id(json_objs)
+        orphans = self.orphan_manager.list_all_orphans()
+        self.assertEqual(0, len(orphans))
+        self.assertEqual(0, self.number_of_files_in_content_root())
+
+# file deleter tests -----------------------------------------------------------
+
+class OrphanFileDeleterTests(base.PulpServerTests):
+
+    def setUp(self):
+        super(OrphanFileDeleterTests, self).setUp()
+        self.content_root = tempfile.mkdtemp(prefix='content_orphan_deleter_unittests-')
+
+    def tearDown(self):
+        super(OrphanFileDeleterTests, self).tearDown()
+        if os.path.exists(self.content_root):
+            shutil.rmtree(self.content_root)
+
+    def _write_file(self, relative_path, size):
+        path = os.path.join(self.content_root, relative_path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(path, 'w')
+        f.write('x' * size)
+        f.close()
+        return path
+
+    def test_delete_files(self):
+        paths = [self._write_file(os.path.join('a', str(i)), 10) for i in range(5)]
+        paths.append(self._write_file(os.path.join('b', 'c', 'd'), 7))
+        self._write_file(os.path.join('b', 'keep'), 1)
+        deleter = OrphanFileDeleter(num_workers=3)
+        for path in paths:
+            deleter.delete(path)
+        bytes_freed = deleter.finish()
+        self.assertEqual(57, bytes_freed)
+        for path in paths:
+            self.assertFalse(os.path.exists(path))
+        # empty parent directories are pruned, non-empty ones are left alone
+        self.assertFalse(os.path.exists(os.path.join(self.content_root, 'a')))
+        self.assertFalse(os.path.exists(os.path.join(self.content_root, 'b', 'c')))
+        self.assertTrue(os.path.exists(os.path.join(self.content_root, 'b', 'keep')))
+
+    def test_delete_directory(self):
+        self._write_file(os.path.join('dir', 'one'), 3)
+        self._write_file(os.path.join('dir', 'sub', 'two'), 4)
+        self._write_file('keep', 0)
+        deleter = OrphanFileDeleter(num_workers=1)
+        deleter.delete(os.path.join(self.content_root, 'dir'))
+        self.assertEqual(7, deleter.finish())
+        self.assertEqual(['keep'], os.listdir(self.content_root))
+
+    def test_delete_missing_file(self):
+        deleter = OrphanFileDeleter(num_workers=2)
+        deleter.delete(os.path.join(self.content_root, 'missing'))
+        self.assertEqual(0, deleter.finish())
@@ -11,10 +11,15 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import datetime
+import pickle
+
 import base
 
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import serialization
 from pulp.server.dispatch.call import CallReport, CallRequest
+from pulp.server.managers.auth.user import system
 
 # call test api ----------------------------------------------------------------
 
@@ -38,6 +43,10 @@ class Class(object):
 def function(*args, **kwargs):
     pass
 
+
+def registered_function(*args, **kwargs):
+    pass
+
 # call request testing ---------------------------------------------------------
 
 class CallRequestTests(base.PulpServerTests):
@@ -138,6 +147,81 @@ class CallRequestTests(base.PulpServerTests):
         self.assertTrue(isinstance(call_request_2, CallRequest))
         self.assertTrue(call_request_2.execution_hooks[key][0] == function)
 
+    def test_serialize_format(self):
+        call_request = CallRequest(function, ['fee', 1, None], {'fie': {'foe': [2.0]}})
+        data = call_request.serialize()
+        self.assertEqual(data['format_version'], CallRequest.serialization_format_version)
+        self.assertEqual(data['call'], {serialization.CODEC_KEY: 'global',
+                                        'path': '%s:function' % __name__})
+        self.assertEqual(data['args'], ['fee', 1, None])
+        self.assertEqual(data['kwargs'], {'fie': {'foe': [2.0]}})
+
+    def test_serialize_deserialize_method(self):
+        call_request = CallRequest(Class().method)
+        data = call_request.serialize()
+        self.assertEqual(data['call'][serialization.CODEC_KEY], 'method')
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(isinstance(call_request_2.call.im_self, Class))
+        self.assertEqual(call_request_2.call.im_func, Class.method.im_func)
+
+    def test_serialize_deserialize_callable_object(self):
+        functor = Functor()
+        functor('fee', fie='foe')
+        call_request = CallRequest(functor)
+        data = call_request.serialize()
+        self.assertEqual(data['call'][serialization.CODEC_KEY], 'object')
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(isinstance(call_request_2.call, Functor))
+        self.assertEqual(call_request_2.call.args, ['fee'])
+        self.assertEqual(call_request_2.call.kwargs, {'fie': 'foe'})
+
+    def test_serialize_deserialize_args(self):
+        now = datetime.datetime(2013, 1, 1)
+        args = [('fee', 'fie'), set(['foe']), now]
+        kwargs = {'foo': {'bar': ('baz',)}, 1: 'one'}
+        call_request = CallRequest(function, args, kwargs)
+        data = call_request.serialize()
+        self.assertEqual(data['args'][0], {serialization.CODEC_KEY: 'tuple', 'items': ['fee', 'fie']})
+        self.assertEqual(data['args'][1][serialization.CODEC_KEY], 'pickle')
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertEqual(call_request_2.args, args)
+        self.assertEqual(call_request_2.kwargs, kwargs)
+
+    def test_serialize_deserialize_kwargs_keys(self):
+        call_request = CallRequest(function, kwargs={u'fee': 'fie'})
+        call_request_2 = CallRequest.deserialize(call_request.serialize())
+        self.assertEqual(call_request_2.kwargs.keys(), ['fee'])
+        self.assertTrue(isinstance(call_request_2.kwargs.keys()[0], str))
+
+    def test_serialize_deserialize_registered_callable(self):
+        serialization.register_callable('test_registered_function', registered_function)
+        call_request = CallRequest(registered_function)
+        data = call_request.serialize()
+        self.assertEqual(data['call'], {serialization.CODEC_KEY: 'registered', 'name': 'test_registered_function'})
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(call_request_2.call is registered_function)
+
+    def test_serialize_deserialize_system_principal(self):
+        call_request = CallRequest(function, principal=system.SystemUser())
+        data = call_request.serialize()
+        self.assertEqual(data['principal'], {serialization.CODEC_KEY: 'system_principal'})
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(call_request_2.principal is system.SystemUser())
+
+    def test_deserialize_pickled_format(self):
+        key = dispatch_constants.CALL_CANCEL_CONTROL_HOOK
+        call_request = CallRequest(function, ['fee'], {'fie': 'foe'})
+        call_request.add_control_hook(key, function)
+        data = call_request.serialize()
+        data.pop('format_version')
+        for field in CallRequest.pickled_fields:
+            data[field] = pickle.dumps(getattr(call_request, field))
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(call_request_2.call is function)
+        self.assertEqual(call_request_2.args, ['fee'])
+        self.assertEqual(call_request_2.kwargs, {'fie': 'foe'})
+        self.assertTrue(call_request_2.control_hooks[key] is function)
+
     def test_call_report_instantiation(self):
         try:
             call_report = CallReport()
@@ -12,6 +12,7 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import datetime
+import threading
 import traceback
 import unittest
 
@@ -25,7 +26,9 @@ from pulp.server.dispatch import constants as dispatch_constants
 from pulp.server.dispatch import call
 from pulp.server.dispatch import coordinator
 from pulp.server.dispatch import factory as dispatch_factory
+from pulp.server.dispatch import pickling
 from pulp.server.dispatch.task import Task
+from pulp.server.dispatch.taskqueue import TaskQueue
 from pulp.server.exceptions import OperationTimedOut
 from pulp.server.util import CycleExists, topological_sort
 
@@ -55,6 +58,7 @@ class CoordinatorTests(base.PulpServerTests):
         self.coordinator = None
         dispatch_factory._task_queue = self._task_queue_factory
         self._task_queue_factory = None
+        coordinator.CALL_RESOURCE_TABLE.clear()
         self.collection.drop()
         self.collection = None
         QueuedCall.get_collection().drop()
@@ -129,6 +133,57 @@ class OrQueryTests(CoordinatorTests):
         cursor = self.collection.find({'$or': or_query})
         self.assertTrue(cursor.count() == 2, '%d' % cursor.count())
 
+# call resource table tests ---------------------------------------------------
+
+class CallResourceTableTests(CoordinatorTests):
+
+    def setUp(self):
+        super(CallResourceTableTests, self).setUp()
+        self.table = coordinator.CallResourceTable()
+
+    def tearDown(self):
+        self.table.clear()
+        self.table = None
+        super(CallResourceTableTests, self).tearDown()
+
+    def _call_resources(self, call_request_id, resources):
+        call_resources = coordinator.resource_dict_to_call_resources(resources)
+        coordinator.set_call_request_id_on_call_resources(call_request_id, call_resources)
+        return call_resources
+
+    def test_find(self):
+        repo_resources = {dispatch_constants.RESOURCE_REPOSITORY_TYPE: {'repo': dispatch_constants.RESOURCE_READ_OPERATION}}
+        cds_resources = {dispatch_constants.RESOURCE_CDS_TYPE: {'cds': dispatch_constants.RESOURCE_UPDATE_OPERATION}}
+        self.table.add(self._call_resources('call_1', repo_resources))
+        self.table.add(self._call_resources('call_2', repo_resources))
+        self.table.add(self._call_resources('call_3', cds_resources))
+
+        found = self.table.find(coordinator.resource_dict_to_call_resources(repo_resources))
+        self.assertEqual(sorted(r['call_request_id'] for r in found), ['call_1', 'call_2'])
+
+        self.table.remove('call_1')
+        found = self.table.find(coordinator.resource_dict_to_call_resources(repo_resources))
+        self.assertEqual([r['call_request_id'] for r in found], ['call_2'])
+
+    def test_write_behind(self):
+        resources = {dispatch_constants.RESOURCE_REPOSITORY_TYPE: {'repo_1': dispatch_constants.RESOURCE_READ_OPERATION,
+                                                                   'repo_2': dispatch_constants.RESOURCE_UPDATE_OPERATION}}
+        self.table.add(self._call_resources('call_1', resources))
+        self.table.add(self._call_resources('call_2', resources))
+        self.table.remove('call_1')
+        self.table.flush()
+        persisted = list(self.collection.find())
+        self.assertEqual(len(persisted), 2)
+        self.assertTrue(all(r['call_request_id'] == 'call_2' for r in persisted))
+
+    def test_clear(self):
+        resources = {dispatch_constants.RESOURCE_REPOSITORY_TYPE: {'repo': dispatch_constants.RESOURCE_READ_OPERATION}}
+        call_resources = self._call_resources('call_1', resources)
+        self.table.add(call_resources)
+        self.table.clear()
+        self.assertEqual(self.table.find(call_resources), [])
+        self.assertEqual(self.collection.find().count(), 0)
+
 # conflicting operations tests -------------------------------------------------
 
 class ConflictingOperationsTests(base.PulpServerTests):
@@ -206,7 +261,7 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
 
         call_resources = coordinator.resource_dict_to_call_resources(resources)
         coordinator.set_call_request_id_on_call_resources(task_id, call_resources)
-        self.collection.insert(call_resources, safe=True)
+        self.coordinator.call_resource_table.add(call_resources)
 
         response, blockers, reasons, call_resources = self.coordinator._find_conflicts(resources)
 
@@ -229,7 +284,7 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
         }
         existing_task_resources = coordinator.resource_dict_to_call_resources(existing_resources)
         coordinator.set_call_request_id_on_call_resources(task_id, existing_task_resources)
-        self.collection.insert(existing_task_resources, safe=True)
+        self.coordinator.call_resource_table.add(existing_task_resources)
 
         # delete on content unit is postponed by read
 
@@ -276,8 +331,8 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
         task_2_resources = coordinator.resource_dict_to_call_resources(bind_2_resources)
         coordinator.set_call_request_id_on_call_resources(call_2_id, task_2_resources)
 
-        self.collection.insert(task_1_resources, safe=True)
-        self.collection.insert(task_2_resources, safe=True)
+        self.coordinator.call_resource_table.add(task_1_resources)
+        self.coordinator.call_resource_table.add(task_2_resources)
 
         # deleting the repository should be postponed by both binds
 
@@ -305,7 +360,7 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
         }
         deletion_task_resources = coordinator.resource_dict_to_call_resources(deletion_resources)
         coordinator.set_call_request_id_on_call_resources(task_id, deletion_task_resources)
-        self.collection.insert(deletion_task_resources, safe=True)
+        self.coordinator.call_resource_table.add(deletion_task_resources)
 
         # a cds sync should be rejected by the deletion
 
@@ -364,6 +419,15 @@ class CoordinatorWaitForTaskTests(CoordinatorTests):
                           self.coordinator._run_task,
                           task, timeout)
 
+    def test_wait_for_task_wakes(self):
+        task = Task(call.CallRequest(dummy_call, kwargs={'progress': None, 'success': None, 'failure': None}))
+        thread = threading.Timer(0.05, task._run)
+        thread.start()
+        coordinator.wait_for_task(task, dispatch_constants.CALL_COMPLETE_STATES,
+                                  timeout=datetime.timedelta(seconds=5))
+        thread.join()
+        self.assertTrue(task.call_report.state in dispatch_constants.CALL_COMPLETE_STATES)
+
 
 class CoordinatorCallExecutionTests(CoordinatorTests):
 
@@ -527,10 +591,13 @@ def find_dummy_call(*args, **kwargs):
 class CoordinatorFindCallReportsTests(CoordinatorTests):
 
     def set_task_queue(self, task_list):
-        mocked_task_queue = mock.Mock()
-        mocked_task_queue.all_tasks = mock.Mock(return_value=task_list)
+        pickling.initialize()
+        # the queue is not started, so the tasks are never run
+        task_queue = TaskQueue(1)
+        for task in task_list:
+            task_queue.enqueue(task)
         # this gets cleaned up by the base class tearDown method
-        dispatch_factory._task_queue = mock.Mock(return_value=mocked_task_queue)
+        dispatch_factory._task_queue = mock.Mock(return_value=task_queue)
 
     def test_find_by_schedule_id(self):
         schedule_id = str(ObjectId())
@@ -553,3 +620,25 @@ class CoordinatorFindCallReportsTests(CoordinatorTests):
         self.assertEqual(len(call_report_list), 1)
         self.assertEqual(call_report_list[0].call_request_id, call_request.id)
 
+    def test_find_by_call_request_group_id(self):
+        call_request_1 = call.CallRequest(find_dummy_call)
+        call_request_1.group_id = 'group'
+        call_request_2 = call.CallRequest(find_dummy_call)
+        self.set_task_queue([Task(call_request_1), Task(call_request_2)])
+
+        call_report_list = self.coordinator.find_call_reports(call_request_group_id='group')
+        self.assertEqual(len(call_report_list), 1)
+        self.assertEqual(call_report_list[0].call_request_id, call_request_1.id)
+
+    def test_find_by_tags(self):
+        call_request_1 = call.CallRequest(find_dummy_call, tags=['one', 'two'])
+        call_request_2 = call.CallRequest(find_dummy_call, tags=['two'])
+        self.set_task_queue([Task(call_request_1), Task(call_request_2)])
+
+        call_report_list = self.coordinator.find_call_reports(tags=['two'])
+        self.assertEqual([call_request_1.id, call_request_2.id],
+                         [r.call_request_id for r in call_report_list])
+
+        call_report_list = self.coordinator.find_call_reports(tags=['one', 'two'], state=dispatch_constants.CALL_WAITING_STATE)
+        self.assertEqual([call_request_1.id], [r.call_request_id for r in call_report_list])
+
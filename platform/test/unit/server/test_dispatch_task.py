@@ -12,16 +12,18 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import datetime
+import threading
 import traceback
 import types
 
 import mock
 import base
 
-from pulp.common import dateutils
+from pulp.common import dateutils, tags
 from pulp.server.db.model.auth import User
 from pulp.server.db.model.dispatch import ArchivedCall
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import pool as dispatch_pool
 from pulp.server.dispatch.call import CallReport, CallRequest
 from pulp.server.dispatch.task import AsyncTask, Task
 from pulp.server.managers.auth.principal import PrincipalManager
@@ -152,6 +154,94 @@ class TaskTests(base.PulpServerTests):
         for h in hooks:
             self.assertTrue(h.call_count == 1)
 
+    def test_wait_for_state(self):
+        thread = threading.Timer(0.05, self.task._run)
+        thread.start()
+        self.assertTrue(self.task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, 5))
+        thread.join()
+        self.assertTrue(self.call_report.state is dispatch_constants.CALL_FINISHED_STATE)
+
+    def test_wait_for_state_timeout(self):
+        self.assertFalse(self.task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, 0.01))
+        self.assertTrue(self.task.wait_for_state([dispatch_constants.CALL_WAITING_STATE], 0.01))
+
+# worker pool testing ----------------------------------------------------------
+
+class WorkerPoolTests(base.PulpServerTests):
+
+    def test_thread_reuse(self):
+        pool = dispatch_pool.WorkerPool('test', 2)
+        event = threading.Event()
+        for i in range(5):
+            pool.submit(event.wait)
+        utilization = pool.utilization()
+        self.assertEqual(utilization['workers'], 2)
+        self.assertEqual(utilization['max_workers'], 2)
+        event.set()
+        pool.stop()
+        utilization = pool.utilization()
+        self.assertEqual(utilization['completed'], 5)
+        self.assertEqual(utilization['busy'], 0)
+        self.assertEqual(utilization['queued'], 0)
+
+    def test_failed_work(self):
+        pool = dispatch_pool.WorkerPool('test', 1)
+        pool.submit(fail)
+        pool.submit(call_without_callbacks)
+        pool.stop()
+        self.assertEqual(pool.utilization()['completed'], 2)
+
+    def test_task_lane(self):
+        long_actions = ['sync', 'publish']
+        sync_task = Task(CallRequest(call_without_callbacks, tags=[tags.action_tag('sync')]))
+        create_task = Task(CallRequest(call_without_callbacks, tags=[tags.action_tag('create')]))
+        self.assertEqual(dispatch_pool.task_lane(sync_task, long_actions), dispatch_pool.LONG_LANE)
+        self.assertEqual(dispatch_pool.task_lane(create_task, long_actions), dispatch_pool.SHORT_LANE)
+
+    def test_run_in_worker_pool(self):
+        worker_pools = dispatch_pool.TaskWorkerPools(1, 1, ['sync'])
+        task = Task(CallRequest(call_without_callbacks, tags=[tags.action_tag('sync')]))
+        with mock.patch('pulp.server.dispatch.factory._WORKER_POOLS', worker_pools):
+            task.run()
+            self.assertTrue(task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, 5))
+        worker_pools.stop()
+        utilization = worker_pools.utilization()
+        self.assertEqual(utilization[dispatch_pool.LONG_LANE]['completed'], 1)
+        self.assertEqual(utilization[dispatch_pool.SHORT_LANE]['workers'], 0)
+
+    def test_running_once_started(self):
+        worker_pools = dispatch_pool.TaskWorkerPools(1, 1, [])
+        event = threading.Event()
+        blocking_task = Task(CallRequest(event.wait))
+        call = Call()
+        waiting_task = Task(CallRequest(call))
+        with mock.patch('pulp.server.dispatch.factory._WORKER_POOLS', worker_pools):
+            blocking_task.run()
+            waiting_task.run()
+            self.assertTrue(blocking_task.wait_for_state([dispatch_constants.CALL_RUNNING_STATE], 5))
+            # still waiting for the only worker
+            self.assertEqual(waiting_task.call_report.state, dispatch_constants.CALL_WAITING_STATE)
+            event.set()
+            self.assertTrue(waiting_task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, 5))
+        worker_pools.stop()
+        self.assertEqual(waiting_task.call_report.state, dispatch_constants.CALL_FINISHED_STATE)
+        self.assertEqual(call.call_count, 1)
+
+    def test_cancel_waiting_for_worker(self):
+        worker_pools = dispatch_pool.TaskWorkerPools(1, 1, [])
+        event = threading.Event()
+        blocking_task = Task(CallRequest(event.wait))
+        call = Call()
+        waiting_task = Task(CallRequest(call))
+        with mock.patch('pulp.server.dispatch.factory._WORKER_POOLS', worker_pools):
+            blocking_task.run()
+            waiting_task.run()
+            self.assertTrue(waiting_task.cancel())
+            event.set()
+        worker_pools.stop()
+        self.assertEqual(waiting_task.call_report.state, dispatch_constants.CALL_CANCELED_STATE)
+        self.assertEqual(call.call_count, 0)
+
 # run failure testing ----------------------------------------------------------
 
 class FailTests(base.PulpServerTests):
@@ -11,6 +11,7 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import datetime
 import mock
 import os
 import sys
@@ -20,9 +21,13 @@ import traceback
 
 import base
 
-from pulp.server.db.model.dispatch import QueuedCall
+from pulp.common import dateutils
+from pulp.common.tags import action_tag
+from pulp.server.db.model.dispatch import ArchivedCall, QueuedCall
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import coordinator
 from pulp.server.dispatch import pickling
+from pulp.server.dispatch import policy
 from pulp.server.dispatch.call import CallRequest, OBFUSCATED_VALUE
 from pulp.server.dispatch.task import AsyncTask, Task
 from pulp.server.dispatch.taskqueue import TaskQueue
@@ -43,6 +48,11 @@ def call_with_result(*args, **kwargs):
 def error(*args, **kwargs):
     raise Exception()
 
+LARGE_RESULT = ['result'] * 10000
+
+def call_with_large_result(*args, **kwargs):
+    return LARGE_RESULT
+
 # instantiation testing --------------------------------------------------------
 
 class TaskQueueInstantiationTests(base.PulpServerTests):
@@ -117,6 +127,44 @@ class TaskQueueTests(base.PulpServerTests):
                 continue
             self.fail('Task [%s] failed to complete after %.2f seconds' % (task.id, timeout))
 
+    def wait_for_task_trimmed(self, task, interval=0.1, timeout=1.0):
+        elapsed = 0.0
+        while not task.trimmed:
+            time.sleep(interval)
+            elapsed += interval
+            if elapsed < timeout:
+                continue
+            self.fail('Task [%s] was not trimmed after %.2f seconds' % (task.id, timeout))
+
+class TaskQueueDispatchTests(TaskQueueTests):
+
+    def setUp(self):
+        super(TaskQueueDispatchTests, self).setUp()
+        # a dispatch interval this long would time the tests out if it were polled
+        self.queue = TaskQueue(2, dispatch_interval=60)
+        self.queue.start()
+
+    def tearDown(self):
+        self.queue.stop()
+        super(TaskQueueDispatchTests, self).tearDown()
+
+    def test_enqueue_dispatches(self):
+        task = self.gen_task(call_with_result)
+        self.queue.enqueue(task)
+        self.assertTrue(task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, 5))
+        self.assertEqual(CALL_RESULT, task.call_report.result)
+
+    def test_complete_dispatches_blocked(self):
+        task_1 = self.gen_async_task()
+        task_2 = self.gen_task()
+        task_2.call_request.dependencies[task_1.call_request.id] = dispatch_constants.CALL_COMPLETE_STATES
+        self.queue.enqueue(task_1)
+        self.queue.enqueue(task_2)
+        self.assertTrue(task_1.wait_for_state([dispatch_constants.CALL_RUNNING_STATE], 5))
+        self.assertTrue(task_2.call_report.state is dispatch_constants.CALL_WAITING_STATE)
+        task_1._succeeded()
+        self.assertTrue(task_2.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, 5))
+
 # task queue control flow tests ------------------------------------------------
 
 class TaskQueueControlFlowTests(TaskQueueTests):
@@ -284,6 +332,93 @@ class TaskQueueControlFlowTests(TaskQueueTests):
         self.wait_for_task_to_complete(task_2)
         self.assertEqual(task_2.call_request_exit_state, dispatch_constants.CALL_SKIPPED_STATE)
 
+    def test_run_ready_task_blocked_skip_weight(self):
+        task_1 = self.gen_task(call=error)
+        task_2 = self.gen_task()
+        task_2.call_request.dependencies[task_1.call_request.id] = [dispatch_constants.CALL_FINISHED_STATE]
+        self.queue.enqueue(task_1)
+        self.queue.enqueue(task_2)
+        self.queue._run_ready_task(task_1)
+        self.wait_for_task_to_complete(task_1)
+        self.wait_for_task_to_complete(task_2)
+        # the skipped task never ran, so it must not give back any weight
+        self.assertEqual(0, self.queue._TaskQueue__running_weight)
+        self.assertEqual({}, self.queue._TaskQueue__dependents_index)
+
+    def test_purge_completed_task_cache(self):
+        self.queue.completed_task_cache_life = datetime.timedelta(seconds=0)
+        task = self.gen_task()
+        task.call_request.tags.append('TAG')
+        self.queue.enqueue(task)
+        self.queue._run_ready_task(task)
+        self.wait_for_task_to_complete(task)
+        self.assertTrue(self.queue.get(task.call_request.id) is task)
+        self.queue._purge_completed_task_cache()
+        self.assertTrue(self.queue.get(task.call_request.id) is None)
+        self.assertEqual([], self.queue.find('TAG'))
+        self.assertEqual([], self.queue.completed_tasks())
+
+    def test_completed_task_cache_budget(self):
+        self.queue.completed_task_cache_budget = 1
+        task_1 = self.gen_task(call=call_with_result)
+        task_2 = self.gen_task(call=call_with_result)
+        self.queue.batch_enqueue([task_1, task_2])
+        self.queue._run_ready_task(task_1)
+        self.wait_for_task_to_complete(task_1)
+        # the most recently completed task is always cached
+        self.assertEqual([task_1], self.queue.completed_tasks())
+        self.queue._run_ready_task(task_2)
+        self.wait_for_task_to_complete(task_2)
+        self.assertEqual([task_2], self.queue.completed_tasks())
+        self.assertTrue(self.queue.get(task_1.call_request.id) is None)
+
+    def test_archived_completed_task_trimmed(self):
+        task = self.gen_task(call=call_with_large_result)
+        task.call_request.archive = True
+        call_report = task.call_report
+        self.queue.enqueue(task)
+        self.queue._run_ready_task(task)
+        self.wait_for_task_trimmed(task)
+        self.assertTrue(self.queue.get(task.call_request.id) is task)
+        self.assertTrue(task.call_report.result is None)
+        # the original call report is left untouched
+        self.assertEqual(call_report.result, LARGE_RESULT)
+        self.assertEqual(coordinator.task_call_report(task).result, LARGE_RESULT)
+        self.assertTrue(self.queue._TaskQueue__completed_task_cache_size < 4096)
+        ArchivedCall.get_collection().drop()
+
+    @mock.patch('pulp.server.dispatch.history.find_archived_calls')
+    def test_trimmed_call_report_result_not_serialized(self, mock_find):
+        # calls with unserialized results are archived without a result
+        archived_calls = mock.Mock()
+        archived_calls.count.return_value = 1
+        archived_calls.__getitem__ = lambda self, i: {'serialized_call_report': {'progress': {'step': 'done'}}}
+        mock_find.return_value = archived_calls
+        task = self.gen_task(call=call_with_result)
+        task.call_report.serialize_result = False
+        task.call_report.result = 'result'
+        task.trimmed = True
+        call_report = coordinator.task_call_report(task)
+        self.assertEqual(call_report.result, 'result')
+        self.assertEqual(call_report.progress, {'step': 'done'})
+
+    def test_archived_completed_task_not_trimmed(self):
+        task = self.gen_task(call=call_with_result)
+        task.call_request.archive = True
+        archive_callback = mock.Mock(wraps=self.queue._archived)
+        self.queue.enqueue(task)
+        task.archive_callback = archive_callback
+        self.queue._run_ready_task(task)
+        self.wait_for_task_to_complete(task)
+        for i in range(10):
+            if archive_callback.call_count:
+                break
+            time.sleep(0.1)
+        self.assertEqual(archive_callback.call_count, 1)
+        self.assertFalse(task.trimmed)
+        self.assertEqual(task.call_report.result, CALL_RESULT)
+        ArchivedCall.get_collection().drop()
+
     def test_task_dequeue(self):
         task = self.gen_task()
         self.queue.enqueue(task)
@@ -291,6 +426,26 @@ class TaskQueueControlFlowTests(TaskQueueTests):
         self.queue.dequeue(task)
         self.assertFalse(task in self.queue.all_tasks())
 
+    def test_task_dequeue_queued_call_removal(self):
+        task = self.gen_task()
+        self.queue.enqueue(task)
+        queued_call_id = task.queued_call_id
+        self.queue.dequeue(task)
+        self.assertTrue(task.queued_call_id is None)
+        self.queue.flush_queued_call_removals()
+        collection = QueuedCall.get_collection()
+        self.assertTrue(collection.find_one({'_id': queued_call_id}) is None)
+
+    def test_batch_enqueue_single_insert(self):
+        tasks = [self.gen_task(), self.gen_task(), self.gen_task()]
+        collection = QueuedCall.get_collection()
+        with mock.patch.object(self.queue.queued_call_collection, 'insert',
+                               wraps=self.queue.queued_call_collection.insert) as insert:
+            self.queue.batch_enqueue(tasks)
+        self.assertEqual(insert.call_count, 1)
+        self.assertEqual(collection.find({'_id': {'$in': [t.queued_call_id for t in tasks]}}).count(), 3)
+        self.assertEqual(self.queue.waiting_tasks(), tasks)
+
     def test_task_dequeue_execution_hook(self):
         task = self.gen_task()
         hook = NamedMock()
@@ -353,3 +508,114 @@ class TaskQueueQueryTests(TaskQueueTests):
         self.assertTrue(task_2 in task_list, str(task_2.call_request.tags))
         self.assertFalse(task_3 in task_list)
 
+
+    def test_find_no_match(self):
+        task = self.gen_task()
+        task.call_request.tags.extend(['one', 'two'])
+        self.queue.enqueue(task)
+        self.assertEqual([], self.queue.find('one', 'three'))
+
+    def test_find_queue_order(self):
+        task_1 = self.gen_async_task()
+        task_2 = self.gen_task()
+        for t in (task_1, task_2):
+            t.call_request.tags.append('TAG')
+            self.queue.enqueue(t)
+        self.assertEqual([task_1, task_2], self.queue.find('TAG'))
+        # completed tasks are listed before waiting tasks
+        self.queue._run_ready_task(task_2)
+        self.wait_for_task_to_complete(task_2)
+        self.assertEqual([task_2, task_1], self.queue.find('TAG'))
+
+    def test_get_multiple(self):
+        task_1 = self.gen_task()
+        task_2 = self.gen_task()
+        task_3 = self.gen_task()
+        for t in (task_1, task_2, task_3):
+            self.queue.enqueue(t)
+        self.queue._run_ready_task(task_1)
+        self.wait_for_task_to_complete(task_1)
+        ids = [task_1.call_request.id, task_3.call_request.id, 'not-there']
+        self.assertEqual([task_1, task_3], self.queue.get_multiple(ids))
+        self.assertEqual([task_3], self.queue.get_multiple(ids, include_completed=False))
+
+    def test_find_by_call_request_group_id(self):
+        task_1 = self.gen_task()
+        task_1.call_request.group_id = 'GROUP'
+        task_2 = self.gen_task()
+        for t in (task_1, task_2):
+            self.queue.enqueue(t)
+        self.assertEqual([task_1], self.queue.find_by_call_request_group_id('GROUP'))
+        self.queue.dequeue(task_1)
+        self.assertEqual([], self.queue.find_by_call_request_group_id('GROUP'))
+
+    def test_find_by_schedule_id(self):
+        task = self.gen_task()
+        task.call_report.schedule_id = 'SCHEDULE'
+        self.queue.enqueue(task)
+        self.assertEqual([task], self.queue.find_by_schedule_id('SCHEDULE'))
+
+# scheduling policy tests ------------------------------------------------------
+
+class TaskQueuePriorityPolicyTests(TaskQueueTests):
+
+    def setUp(self):
+        super(TaskQueuePriorityPolicyTests, self).setUp()
+        self.policy = policy.PriorityPolicy(aging_interval=60)
+        self.queue = TaskQueue(2, scheduling_policy=self.policy)
+
+    def gen_tagged_task(self, action, weight=1):
+        return Task(CallRequest(call, tags=[action_tag(action)], weight=weight))
+
+    def test_task_priority(self):
+        self.assertEqual(self.policy.task_priority(self.gen_task()), 0)
+        self.assertEqual(self.policy.task_priority(self.gen_tagged_task('unit_install')), 1)
+        self.assertEqual(self.policy.task_priority(self.gen_tagged_task('publish')), 2)
+        self.assertEqual(self.policy.task_priority(self.gen_tagged_task('sync')), 3)
+
+    def test_priority_order(self):
+        sync_task = self.gen_tagged_task('sync', 2)
+        create_task = self.gen_tagged_task('create', 1)
+        self.queue.enqueue(sync_task)
+        self.queue.enqueue(create_task)
+        task_list = self.queue._get_ready_tasks()
+        self.assertEqual(task_list, [create_task])
+
+    def test_aging(self):
+        sync_task = self.gen_tagged_task('sync', 2)
+        publish_task = self.gen_tagged_task('publish', 1)
+        self.queue.enqueue(sync_task)
+        self.queue.enqueue(publish_task)
+        sync_task.enqueue_time = datetime.datetime.now(dateutils.utc_tz()) - datetime.timedelta(minutes=2)
+        task_list = self.queue._get_ready_tasks()
+        self.assertEqual(task_list, [sync_task])
+
+    def test_aging_yields_to_highest_class(self):
+        sync_task = self.gen_tagged_task('sync', 1)
+        create_task = self.gen_tagged_task('create', 1)
+        self.queue.enqueue(sync_task)
+        self.queue.enqueue(create_task)
+        sync_task.enqueue_time = datetime.datetime.now(dateutils.utc_tz()) - datetime.timedelta(minutes=5)
+        task_list = self.queue._get_ready_tasks()
+        self.assertEqual(task_list, [create_task, sync_task])
+
+    def test_starving_task_reserves_weight(self):
+        waiting_tasks = [self.gen_tagged_task('sync', 2), self.gen_tagged_task('publish', 1)]
+        now = datetime.datetime.now(dateutils.utc_tz())
+        waiting_tasks[0].enqueue_time = now - datetime.timedelta(minutes=5)
+        waiting_tasks[1].enqueue_time = now
+        # the sync does not fit, but the publish must not take the freed weight
+        task_list = self.policy.ready_tasks(waiting_tasks, [], 1, now)
+        self.assertEqual(task_list, [])
+
+    def test_concurrency_caps(self):
+        self.policy.concurrency_caps = {action_tag('sync'): 1}
+        running_task = self.gen_tagged_task('sync', 0)
+        waiting_tasks = [self.gen_tagged_task('sync', 0), self.gen_tagged_task('sync', 0)]
+        self.assertEqual(self.policy.ready_tasks(waiting_tasks, [running_task], 2), [])
+        self.assertEqual(self.policy.ready_tasks(waiting_tasks, [], 2), waiting_tasks[:1])
+
+    def test_parse_concurrency_caps(self):
+        caps = policy.parse_concurrency_caps('pulp:action:sync=4, pulp:action:publish=2,')
+        self.assertEqual(caps, {'pulp:action:sync': 4, 'pulp:action:publish': 2})
+        self.assertRaises(ValueError, policy.parse_concurrency_caps, 'pulp:action:sync')
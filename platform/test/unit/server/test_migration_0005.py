@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import pickle
+
+from pulp.server.db.migrate.models import MigrationModule
+from pulp.server.db.model.dispatch import ArchivedCall
+from pulp.server.dispatch.call import CallRequest
+import base
+
+
+def function(*args, **kwargs):
+    pass
+
+
+class TestMigrationCompactCallRequests(base.PulpServerTests):
+
+    def setUp(self):
+        super(TestMigrationCompactCallRequests, self).setUp()
+        self.module = MigrationModule('pulp.server.db.migrations.0005_compact_call_requests')._module
+        self.collection = ArchivedCall.get_collection()
+
+    def tearDown(self):
+        super(TestMigrationCompactCallRequests, self).tearDown()
+        self.collection.remove(safe=True)
+
+    def _pickled_call_request(self, call_request):
+        data = call_request.serialize()
+        data.pop('format_version')
+        for field in CallRequest.pickled_fields:
+            data[field] = pickle.dumps(getattr(call_request, field))
+        return data
+
+    def test_with_db(self):
+        call_request = CallRequest(function, ['fee'], {'fie': 'foe'})
+        self.collection.insert({'serialized_call_request': self._pickled_call_request(call_request)},
+                               safe=True)
+        self.collection.insert({'serialized_call_request': None}, safe=True)
+
+        self.module.migrate()
+
+        document = self.collection.find_one({'serialized_call_request': {'$ne': None}})
+        data = document['serialized_call_request']
+        self.assertEqual(data['format_version'], CallRequest.serialization_format_version)
+        self.assertEqual(data['args'], ['fee'])
+
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertEqual(call_request_2.id, call_request.id)
+        self.assertTrue(call_request_2.call is function)
+        self.assertEqual(call_request_2.kwargs, {'fie': 'foe'})
+
+    def test_unpicklable(self):
+        data = self._pickled_call_request(CallRequest(function))
+        data['call'] = 'not a pickle'
+        self.collection.insert({'serialized_call_request': data}, safe=True)
+
+        self.module.migrate()
+
+        document = self.collection.find_one()
+        self.assertEqual(document['serialized_call_request']['call'], 'not a pickle')
+        self.assertFalse('format_version' in document['serialized_call_request'])
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+from pulp.server.db.migrate.models import MigrationModule
+from pulp.server.db.model.consumer import UnitProfile
+import base
+
+
+class TestMigrationUnitProfileHash(base.PulpServerTests):
+
+    PROFILE = [{'name': 'zsh', 'version': '1.0'}]
+
+    def setUp(self):
+        super(TestMigrationUnitProfileHash, self).setUp()
+        self.module = MigrationModule('pulp.server.db.migrations.0006_unit_profile_hash')._module
+        self.collection = UnitProfile.get_collection()
+
+    def tearDown(self):
+        super(TestMigrationUnitProfileHash, self).tearDown()
+        self.collection.remove(safe=True)
+
+    def test_migrate(self):
+        self.collection.insert({'consumer_id': 'test-1', 'content_type': 'rpm',
+                                'profile': self.PROFILE}, safe=True)
+        self.collection.insert({'consumer_id': 'test-2', 'content_type': 'rpm',
+                                'profile': self.PROFILE, 'profile_hash': 'existing'}, safe=True)
+
+        self.module.migrate()
+
+        profile = self.collection.find_one({'consumer_id': 'test-1'})
+        self.assertEqual(profile['profile_hash'], UnitProfile.calculate_hash(self.PROFILE))
+        profile = self.collection.find_one({'consumer_id': 'test-2'})
+        self.assertEqual(profile['profile_hash'], 'existing')
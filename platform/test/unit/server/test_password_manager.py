@@ -12,6 +12,8 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import mock
+
 import base
 
 from pulp.server.managers import factory as manager_factory
@@ -35,3 +37,24 @@ class PasswordManagerTests(base.PulpServerTests):
         password = "some password"
         hashed = self.password_manager.hash_password(password)
         self.assertTrue(self.password_manager.check_password(hashed, password))
+
+    def test_check_password_cached(self):
+        password = "some password"
+        hashed = self.password_manager.hash_password(password)
+        with mock.patch.object(self.password_manager, 'pbkdf_sha256',
+                               wraps=self.password_manager.pbkdf_sha256) as mock_pbkdf:
+            self.assertTrue(self.password_manager.check_password(hashed, password))
+            self.assertTrue(self.password_manager.check_password(hashed, password))
+            self.assertEqual(mock_pbkdf.call_count, 1)
+            # wrong passwords are not cached
+            self.assertFalse(self.password_manager.check_password(hashed, "wrong password"))
+            self.assertFalse(self.password_manager.check_password(hashed, "wrong password"))
+            self.assertEqual(mock_pbkdf.call_count, 3)
+
+    def test_check_password_changed(self):
+        password = "some password"
+        hashed = self.password_manager.hash_password(password)
+        self.assertTrue(self.password_manager.check_password(hashed, password))
+        # the cached result of the old password does not apply to a new one
+        hashed = self.password_manager.hash_password("some other password")
+        self.assertFalse(self.password_manager.check_password(hashed, password))
@@ -13,6 +13,7 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import base
+import mock
 import pymongo
 
 from pulp.server.db.model.consumer import Consumer, UnitProfile
@@ -77,6 +78,19 @@ class ProfileManagerTests(base.PulpAsyncServerTests):
         self.assertEquals(profiles[1]['content_type'], self.TYPE_2)
         self.assertEquals(profiles[1]['profile'], self.PROFILE_2)
 
+    def test_find_profiles(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.create(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        manager.create(self.CONSUMER_ID, self.TYPE_2, self.PROFILE_2)
+        # Test
+        profiles = manager.find_profiles([self.CONSUMER_ID, 'other-consumer'])
+        # Verify
+        self.assertEquals(profiles['other-consumer'], {})
+        self.assertEquals(profiles[self.CONSUMER_ID],
+                          {self.TYPE_1:self.PROFILE_1, self.TYPE_2:self.PROFILE_2})
+
     def test_get_profiles_none(self):
         # Setup
         self.populate()
@@ -125,6 +139,73 @@ class ProfileManagerTests(base.PulpAsyncServerTests):
         self.assertEquals(profiles[0]['content_type'], self.TYPE_1)
         self.assertEquals(profiles[0]['profile'], self.PROFILE_2)
 
+    def test_update_stores_hash(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        # Test
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_2)
+        # Verify
+        profile = manager.get_profile_hash(self.CONSUMER_ID, self.TYPE_1)
+        self.assertEquals(profile['profile_hash'], UnitProfile.calculate_hash(self.PROFILE_2))
+        self.assertFalse('profile' in profile)
+
+    @mock.patch('pulp.server.managers.consumer.applicability.ApplicabilityManager.remove_consumer')
+    def test_update_unchanged(self, mock_remove):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        created = manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Test
+        collection = UnitProfile.get_collection()
+        with mock.patch.object(collection, 'save') as mock_save:
+            updated = manager.update(self.CONSUMER_ID, self.TYPE_1, dict(self.PROFILE_1))
+        # Verify
+        self.assertFalse(mock_save.called)
+        # the cached applicability is keyed by the profiles' hash
+        self.assertFalse(mock_remove.called)
+        self.assertEquals(updated['id'], created['id'])
+        self.assertEquals(updated['profile'], self.PROFILE_1)
+
+    def test_get_profile_hash_not_found(self):
+        # Setup
+        self.populate()
+        # Test
+        manager = factory.consumer_profile_manager()
+        self.assertRaises(MissingResource, manager.get_profile_hash, self.CONSUMER_ID, self.TYPE_1)
+
+    def test_find_profile_hashes(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.create(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        manager.create(self.CONSUMER_ID, self.TYPE_2, self.PROFILE_2)
+        # Test
+        hashes = manager.find_profile_hashes([self.CONSUMER_ID, 'other-consumer'])
+        # Verify
+        self.assertEquals(hashes['other-consumer'], {})
+        self.assertEquals(hashes[self.CONSUMER_ID],
+                          {self.TYPE_1:UnitProfile.calculate_hash(self.PROFILE_1),
+                           self.TYPE_2:UnitProfile.calculate_hash(self.PROFILE_2)})
+
+    def test_update_upgraded_profile(self):
+        # Setup
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        # profiles upgraded from v1 have neither an id nor a hash
+        collection = UnitProfile.get_collection()
+        collection.insert(dict(consumer_id=self.CONSUMER_ID, content_type=self.TYPE_1,
+                               profile=self.PROFILE_1), safe=True)
+        hashes = manager.find_profile_hashes([self.CONSUMER_ID])
+        self.assertEquals(hashes[self.CONSUMER_ID], {self.TYPE_1:None})
+        # Test
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        # Verify
+        profiles = list(collection.find({'consumer_id':self.CONSUMER_ID}))
+        self.assertEquals(len(profiles), 1)
+        self.assertEquals(profiles[0]['profile_hash'], UnitProfile.calculate_hash(self.PROFILE_1))
+
     def test_multiple_types(self):
         # Setup
         self.populate()
@@ -257,6 +257,15 @@ class TestManageDB(MigrationTest):
         self.assertEqual(indexes.keys(), [u'_id_', u'attribute_1_1_attribute_2_1_attribute_3_1',
                                           u'attribute_1_1', u'attribute_3_1'])
 
+    @patch.object(MigrationTracker, 'ensure_indices')
+    def test_ensure_database_indices(self, ensure_indices_mock):
+        """
+        Test that pulp-manage-db ensures the indices of the data models.
+        """
+        manage.ensure_database_indices()
+
+        self.assertEqual(ensure_indices_mock.call_count, 1)
+
     @patch('sys.stderr')
     @patch.object(models.MigrationPackage, 'apply_migration',
            side_effect=models.MigrationPackage.apply_migration, autospec=True)
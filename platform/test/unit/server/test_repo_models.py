@@ -13,6 +13,10 @@
 
 import unittest
 
+import base
+import mock
+
+from pulp.server.db import connection
 from pulp.server.db.model.repository import RepoContentUnit
 
 
@@ -26,3 +30,27 @@ class TestRepoContentUnit(unittest.TestCase):
         self.assertTrue(
             self.unit.created.endswith('Z') or
             self.unit.created.endswith('+00:00'))
+
+
+class TestModelCollectionCache(base.PulpServerTests):
+    def tearDown(self):
+        super(TestModelCollectionCache, self).tearDown()
+        connection.reset_collection_cache()
+
+    def test_collection_is_cached(self):
+        connection.reset_collection_cache()
+        collection = RepoContentUnit.get_collection()
+        self.assertTrue(collection is RepoContentUnit.get_collection())
+        self.assertTrue(collection is connection.get_collection(RepoContentUnit.collection_name))
+
+    @mock.patch.object(RepoContentUnit, 'ensure_indices')
+    def test_indices_ensured_once(self, mock_ensure):
+        connection.reset_collection_cache()
+        RepoContentUnit.get_collection()
+        RepoContentUnit.get_collection()
+        self.assertEqual(1, mock_ensure.call_count)
+
+        # a reset forgets the handle, so the indices are ensured again
+        connection.reset_collection_cache()
+        RepoContentUnit.get_collection()
+        self.assertEqual(2, mock_ensure.call_count)
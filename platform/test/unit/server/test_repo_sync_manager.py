@@ -317,6 +317,44 @@ class RepoSyncManagerTests(base.PulpAsyncServerTests):
         # Cleanup
         mock_plugins.MOCK_IMPORTER.sync_repo.side_effect = None
 
+    @mock.patch('pulp.server.managers.consumer.applicability.ApplicabilityManager.invalidate_repo')
+    def test_sync_invalidates_applicability_once(self, mock_invalidate):
+        """
+        Tests the cached applicability is invalidated once at the end of a
+        sync that changed the repo's units, even when the plugin then fails.
+        """
+
+        # Setup
+        def sync_repo(transfer_repo, conduit, call_config):
+            conduit._applicability_stale = True
+            raise Exception('partial sync')
+
+        mock_plugins.MOCK_IMPORTER.sync_repo.side_effect = sync_repo
+
+        self.repo_manager.create_repo('repo-1')
+        self.importer_manager.set_importer('repo-1', 'mock-importer', {})
+
+        # Test
+        try:
+            self.assertRaises(PulpExecutionException, self.sync_manager.sync, 'repo-1')
+        finally:
+            mock_plugins.MOCK_IMPORTER.sync_repo.side_effect = None
+
+        # Verify
+        mock_invalidate.assert_called_once_with('repo-1')
+
+    @mock.patch('pulp.server.managers.consumer.applicability.ApplicabilityManager.invalidate_repo')
+    def test_sync_unchanged_keeps_applicability(self, mock_invalidate):
+        # Setup
+        self.repo_manager.create_repo('repo-1')
+        self.importer_manager.set_importer('repo-1', 'mock-importer', {})
+
+        # Test
+        self.sync_manager.sync('repo-1')
+
+        # Verify
+        self.assertEqual(0, mock_invalidate.call_count)
+
     def _test_sync_with_auto_publish(self):
         """
         Tests that the autodistribute call is properly called at the tail end
@@ -129,6 +129,26 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertEqual('unit-1', repo_units[0]['unit_id'])
         self.assertEqual('unit-1', repo_units[1]['unit_id'])
 
+    @mock.patch('pulp.server.managers.consumer.applicability.ApplicabilityManager.invalidate_repo')
+    def test_associate_by_id_deferred_invalidation(self, mock_invalidate):
+        """
+        Tests the cached applicability is left to the caller to invalidate.
+        """
+
+        # Test
+        created = self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1', OWNER_TYPE_USER, 'admin',
+                                                    invalidate_applicability=False)
+        created_again = self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1', OWNER_TYPE_USER, 'admin',
+                                                          invalidate_applicability=False)
+        removed_count = self.manager.unassociate_unit_by_id(self.repo_id, 'type-1', 'unit-1', OWNER_TYPE_USER, 'admin',
+                                                            notify_plugins=False, invalidate_applicability=False)
+
+        # Verify
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(1, removed_count)
+        self.assertEqual(0, mock_invalidate.call_count)
+
     def test_associate_invalid_owner_type(self):
         # Test
         self.assertRaises(exceptions.InvalidValue, self.manager.associate_unit_by_id, self.repo_id, 'type-1', 'unit-1', 'bad-owner', 'irrelevant')
@@ -268,6 +288,85 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertEqual(1, len(kwargs['units']))
         self.assertEqual(kwargs['units'][0].id, 'unit-2')
 
+    @mock.patch.object(mock_plugins.MockImporter, 'metadata')
+    def test_associate_from_repo_server_side_copy(self, mock_metadata):
+        # Setup
+        mock_metadata.return_value = {'types' : ['mock-type'],
+                                      association_manager.SERVER_SIDE_COPY : True}
+
+        source_repo_id = 'source-repo'
+        dest_repo_id = 'dest-repo'
+
+        self.repo_manager.create_repo(source_repo_id)
+        self.importer_manager.set_importer(source_repo_id, 'mock-importer', {})
+
+        self.repo_manager.create_repo(dest_repo_id)
+        self.importer_manager.set_importer(dest_repo_id, 'mock-importer', {})
+
+        for unit_id in ('unit-1', 'unit-2', 'unit-3'):
+            self.content_manager.add_content_unit('mock-type', unit_id, {'key-1' : unit_id})
+            self.manager.associate_unit_by_id(source_repo_id, 'mock-type', unit_id, OWNER_TYPE_USER, 'admin')
+
+        fake_user = User('associate-user', '')
+        manager_factory.principal_manager().set_principal(principal=fake_user)
+
+        # Test
+        criteria = UnitAssociationCriteria(type_ids=['mock-type'], unit_filters={'key-1' : {'$in' : ['unit-1', 'unit-2']}})
+        self.manager.associate_from_repo(source_repo_id, dest_repo_id, criteria=criteria)
+        self.manager.associate_from_repo(source_repo_id, dest_repo_id)
+
+        # Verify
+        self.assertEqual(0, mock_plugins.MOCK_IMPORTER.import_units.call_count)
+
+        dest_units = list(RepoContentUnit.get_collection().find({'repo_id' : dest_repo_id}))
+        self.assertEqual(3, len(dest_units))
+        for u in dest_units:
+            self.assertEqual(u['owner_type'], OWNER_TYPE_USER)
+            self.assertEqual(u['owner_id'], fake_user.login)
+
+        dest_repo = Repo.get_collection().find_one({'id' : dest_repo_id})
+        self.assertEqual(3, dest_repo['content_unit_counts']['mock-type'])
+
+        # Clean Up
+        manager_factory.principal_manager().set_principal(principal=None)
+
+    @mock.patch.object(mock_plugins.MockImporter, 'metadata')
+    def test_associate_from_repo_server_side_copy_remove_duplicates(self, mock_metadata):
+        # Setup
+        mock_metadata.return_value = {'types' : ['mock-type'],
+                                      association_manager.SERVER_SIDE_COPY : True}
+
+        source_repo_id = 'source-repo'
+        dest_repo_id = 'dest-repo'
+
+        self.repo_manager.create_repo(source_repo_id)
+        self.importer_manager.set_importer(source_repo_id, 'mock-importer', {})
+
+        self.repo_manager.create_repo(dest_repo_id)
+        self.importer_manager.set_importer(dest_repo_id, 'mock-importer', {})
+
+        for unit_id in ('unit-1', 'unit-2'):
+            self.content_manager.add_content_unit('mock-type', unit_id, {'key-1' : unit_id})
+            self.manager.associate_unit_by_id(source_repo_id, 'mock-type', unit_id, OWNER_TYPE_USER, 'admin')
+            self.manager.associate_unit_by_id(source_repo_id, 'mock-type', unit_id, OWNER_TYPE_IMPORTER, 'imp')
+
+        manager_factory.principal_manager().set_principal(principal=User('associate-user', ''))
+
+        # Test
+        criteria = UnitAssociationCriteria(type_ids=['mock-type'], remove_duplicates=True)
+        self.manager.associate_from_repo(source_repo_id, dest_repo_id, criteria=criteria)
+
+        # Verify
+        dest_units = list(RepoContentUnit.get_collection().find({'repo_id' : dest_repo_id}))
+        self.assertEqual(2, len(dest_units))
+
+        # The caller's criteria is not changed
+        self.assertEqual(None, criteria.association_fields)
+        self.assertEqual(None, criteria.unit_fields)
+
+        # Clean Up
+        manager_factory.principal_manager().set_principal(principal=None)
+
     def test_associate_from_repo_dest_has_no_importer(self):
         # Setup
         source_repo_id = 'source-repo'
@@ -429,6 +528,36 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
 
         mock_call.assert_called_once_with(self.repo_id, 'type-1', 2)
 
+    @mock.patch('pulp.server.managers.repo.unit_association.ASSOCIATION_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.managers.repo.cud.RepoManager.update_unit_count')
+    def test_associate_all_batched(self, mock_call):
+        """
+        Makes sure associations spanning multiple batches are all created and
+        counted once, and that units already associated by another owner are
+        not counted again.
+        """
+        self.manager.associate_unit_by_id(
+            self.repo_id, 'type-1', 'foo', OWNER_TYPE_USER, 'admin2')
+        mock_call.reset_mock()
+
+        IDS = ['foo', 'bar', 'baz', 'qux', 'quux']
+
+        self.manager.associate_all_by_ids(
+            self.repo_id, 'type-1', IDS, OWNER_TYPE_USER, 'admin')
+
+        # Calling again must have no effect
+        self.manager.associate_all_by_ids(
+            self.repo_id, 'type-1', IDS, OWNER_TYPE_USER, 'admin')
+
+        mock_call.assert_called_once_with(self.repo_id, 'type-1', len(IDS) - 1)
+
+        spec = {'repo_id' : self.repo_id, 'owner_id' : 'admin'}
+        repo_units = list(RepoContentUnit.get_collection().find(spec))
+        self.assertEqual(sorted(IDS), sorted([u['unit_id'] for u in repo_units]))
+
+    def test_associate_all_invalid_owner_type(self):
+        self.assertRaises(exceptions.InvalidValue, self.manager.associate_all_by_ids, self.repo_id, 'type-1', ['unit-1'], 'bad-owner', 'irrelevant')
+
     def test_unassociate_all(self):
         """
         Tests unassociating multiple units in a single call.
@@ -481,6 +610,27 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
             self.repo_id, 'type-1', 'unit-1', OWNER_TYPE_USER, 'admin1')
         self.assertEqual(mock_call.call_count, 1) # only once for the associates
 
+    @mock.patch('pulp.server.managers.repo.unit_association.ASSOCIATION_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.managers.repo.unit_association.remove_from_importer')
+    @mock.patch('pulp.server.managers.repo.cud.RepoManager.update_unit_count')
+    def test_unassociate_all_no_notify(self, mock_call, mock_remove):
+        IDS = ['unit-1', 'unit-2', 'unit-3']
+        self.manager.associate_all_by_ids(
+            self.repo_id, 'type-1', IDS, OWNER_TYPE_USER, 'admin1')
+        self.manager.associate_unit_by_id(
+            self.repo_id, 'type-1', 'unit-1', OWNER_TYPE_USER, 'admin2')
+        mock_call.reset_mock()
+
+        # unit-1 remains associated through admin2 and unit-X was never associated
+        self.manager.unassociate_all_by_ids(
+            self.repo_id, 'type-1', IDS + ['unit-X'], OWNER_TYPE_USER, 'admin1', notify_plugins=False)
+
+        mock_call.assert_called_once_with(self.repo_id, 'type-1', -2)
+        self.assertFalse(mock_remove.called)
+        self.assertTrue(self.manager.association_exists(self.repo_id, 'unit-1', 'type-1'))
+        self.assertFalse(self.manager.association_exists(self.repo_id, 'unit-2', 'type-1'))
+        self.assertFalse(self.manager.association_exists(self.repo_id, 'unit-3', 'type-1'))
+
     @mock.patch('pymongo.cursor.Cursor.count', return_value=1)
     def test_association_exists_true(self, mock_count):
         self.assertTrue(self.manager.association_exists(self.repo_id, 'unit-1', 'type-1'))
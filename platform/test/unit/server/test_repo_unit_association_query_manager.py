@@ -399,6 +399,49 @@ class UnitAssociationQueryTests(base.PulpServerTests):
             self.assertFalse('created' in u)
             self.assertFalse('updated' in u)
 
+    def test_get_units_metadata_paging(self):
+        # Test
+        all_units = self.manager.get_units_across_types('repo-1')
+        self.manager._merge_unit_metadata = mock.MagicMock(wraps=self.manager._merge_unit_metadata)
+
+        paged_units = []
+        for u in self.manager.get_units_across_types_iter('repo-1', page_size=2):
+            paged_units.append(u)
+
+        # Verify
+        self.assertEqual(all_units, paged_units)
+        expected_calls = int(math.ceil(float(self.repo_1_count) / 2))
+        self.assertEqual(expected_calls, self.manager._merge_unit_metadata.call_count)
+
+        for u in paged_units:
+            self._assert_unit_integrity(u)
+
+        self._assert_default_sort(paged_units)
+
+    def test_get_units_iter_remove_duplicates(self):
+        # Test
+        criteria = UnitAssociationCriteria(remove_duplicates=True)
+        units = list(self.manager.get_units_across_types_iter('repo-1', criteria, page_size=3))
+
+        # Verify
+        self.assertEqual(self.repo_1_count - len(self.units['gamma']), len(units))
+        non_user_gamma_units = [u for u in units if u['unit_type_id'] == 'gamma' and u['owner_type'] != OWNER_TYPE_USER]
+        self.assertEqual(0, len(non_user_gamma_units))
+
+    def test_merge_unit_metadata_missing_unit(self):
+        # Setup
+        units = [{'unit_type_id' : 'alpha', 'unit_id' : 'aardvark'},
+                 {'unit_type_id' : 'beta', 'unit_id' : 'missing'},
+                 {'unit_type_id' : 'alpha', 'unit_id' : 'apple'}]
+
+        # Test
+        self.manager._merge_unit_metadata(units, page_size=1)
+
+        # Verify
+        self.assertEqual('aardvark', units[0]['metadata']['key_1'])
+        self.assertEqual(None, units[1]['metadata'])
+        self.assertEqual('apple', units[2]['metadata']['key_1'])
+
     # -- get_units_by_type tests ----------------------------------------------
 
     def test_get_units_by_type_no_criteria(self):
@@ -466,6 +509,35 @@ class UnitAssociationQueryTests(base.PulpServerTests):
             u2 = units[i+1]
             self.assertTrue(u1['owner_type'] >= u2['owner_type'])
 
+    def test_get_units_by_type_association_sort_limit_zero(self):
+        # Test
+        criteria = UnitAssociationCriteria(association_sort=[('owner_type', association_manager.SORT_DESCENDING)])
+        all_units = self.manager.get_units_by_type('repo-1', 'alpha', criteria)
+
+        criteria = UnitAssociationCriteria(association_sort=[('owner_type', association_manager.SORT_DESCENDING)], limit=0)
+        units = self.manager.get_units_by_type('repo-1', 'alpha', criteria)
+
+        # Verify - as with the database, a limit of 0 means no limit
+        self.assertTrue(len(all_units) > 1)
+        self.assertEqual(len(all_units), len(units))
+
+    def test_get_units_by_type_association_sort_unit_filter(self):
+        # Test
+        criteria = UnitAssociationCriteria(association_sort=[('created', association_manager.SORT_DESCENDING)],
+                                           unit_filters={'md_2' : 0})
+        all_units = self.manager.get_units_by_type('repo-1', 'alpha', criteria)
+
+        criteria = UnitAssociationCriteria(association_sort=[('created', association_manager.SORT_DESCENDING)],
+                                           unit_filters={'md_2' : 0}, skip=1, limit=1)
+        page_units = self.manager.get_units_by_type('repo-1', 'alpha', criteria)
+
+        # Verify
+        self.assertEqual(['apple', 'aardvark'], [u['metadata']['key_1'] for u in all_units])
+
+        # The skip and limit must be applied after the unit filter
+        self.assertEqual(1, len(page_units))
+        self.assertEqual('aardvark', page_units[0]['metadata']['key_1'])
+
     def test_get_units_by_type_unit_metadata_sort_limit(self):
         # Test
         criteria = UnitAssociationCriteria(unit_sort=[('md_2', association_manager.SORT_DESCENDING)], limit=2)
@@ -565,6 +637,47 @@ class UnitAssociationQueryTests(base.PulpServerTests):
             self.assertFalse('md_2' in u['metadata'])
             self.assertFalse('md_3' in u['metadata'])
 
+    def test_get_units_by_type_iter_unit_sort_paged(self):
+        # Test
+        unit_sort = [('md_2', association_manager.SORT_DESCENDING), ('key_1', association_manager.SORT_ASCENDING)]
+        criteria = UnitAssociationCriteria(unit_sort=unit_sort, skip=1, limit=3, unit_fields=['key_1'])
+        units = self.manager.get_units_by_type('repo-1', 'alpha', criteria)
+        paged_units = list(self.manager.get_units_by_type_iter('repo-1', 'alpha', criteria, page_size=2))
+
+        # Verify
+        self.assertEqual(3, len(paged_units))
+        self.assertEqual([u['metadata']['key_1'] for u in units],
+                         [u['metadata']['key_1'] for u in paged_units])
+        for u in paged_units:
+            # the sort field is only used by the database
+            self.assertFalse('md_2' in u['metadata'])
+            self.assertEqual(u['unit_id'], u['metadata']['_id'])
+
+    def test_get_units_by_type_iter_unit_filters_paged(self):
+        # Test
+        # more associated units than fit in a page, so the sorted unit IDs are
+        # matched against the associations rather than queried by ID
+        criteria = UnitAssociationCriteria(unit_filters={'md_2' : 0},
+                                           unit_sort=[('key_1', association_manager.SORT_DESCENDING)])
+        units = self.manager.get_units_by_type('repo-1', 'alpha', criteria)
+        paged_units = list(self.manager.get_units_by_type_iter('repo-1', 'alpha', criteria, page_size=1))
+
+        # Verify
+        self.assertEqual(2, len(paged_units))
+        self.assertEqual([u['metadata']['key_1'] for u in units],
+                         [u['metadata']['key_1'] for u in paged_units])
+        self.assertEqual(['apple', 'aardvark'], [u['metadata']['key_1'] for u in paged_units])
+
+    def test_get_units_by_type_iter_remove_duplicates_paged(self):
+        # Test
+        criteria = UnitAssociationCriteria(remove_duplicates=True)
+        units = list(self.manager.get_units_by_type_iter('repo-1', 'gamma', criteria, page_size=1))
+
+        # Verify
+        self.assertEqual(len(self.units['gamma']), len(units))
+        for u in units:
+            self.assertEqual(u['owner_type'], association_manager.OWNER_TYPE_USER)
+
     def test_get_units_by_type_not_query(self):
         """
         Mongo really doesn't like $not queries when regular expressions are
@@ -22,3 +22,11 @@ class StatusControllerTests(base.PulpWebserviceTests):
 
         self.assertEqual(status, 200)
         self.assertTrue('api_version' in body)
+        self.assertFalse('auth_cache' in body)
+
+    def test_get_auth_cache(self):
+
+        status, body = self.get('/v2/status/auth_cache/')
+
+        self.assertEqual(status, 200)
+        self.assertTrue('hit_rate' in body)
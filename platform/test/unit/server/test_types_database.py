@@ -260,6 +260,78 @@ class TypesDatabaseTests(base.PulpServerTests):
         # Verify
         self.assertTrue(indexes is None)
 
+    def test_type_definition_cache(self):
+        """
+        Tests that repeated lookups are answered from the type definition cache.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1, DEF_2])
+        types_db.TYPE_DEFINITION_CACHE.reset_statistics()
+
+        # Test
+        types_db.type_definition(DEF_1.id)
+        types_db.type_units_unit_key(DEF_2.id)
+        types_db.all_type_ids()
+
+        # Verify
+        stats = types_db.type_definition_cache_statistics()
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(2, stats['size'])
+
+    def test_type_definition_cache_copies(self):
+        """
+        Tests that changes to a returned definition do not leak into the cache.
+        """
+
+        # Setup
+        types_db.update_database([DEF_3])
+
+        # Test
+        type_def = types_db.type_definition(DEF_3.id)
+        type_def['unit_key'].append('extra')
+        unit_key = types_db.type_units_unit_key(DEF_3.id)
+        unit_key.append('extra')
+
+        # Verify
+        self.assertEqual(DEF_3.unit_key, types_db.type_units_unit_key(DEF_3.id))
+
+    def test_type_definition_cache_invalidated_on_update(self):
+        """
+        Tests that writing a type definition refreshes the cache.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+        self.assertEqual([DEF_1.id], types_db.all_type_ids())
+
+        # Test
+        changed = TypeDefinition(DEF_1.id, 'Definition 1', 'Changed', ['compound_1', 'compound_2'], [], [])
+        types_db.update_database([changed, DEF_2])
+
+        # Verify
+        self.assertEqual(set([DEF_1.id, DEF_2.id]), set(types_db.all_type_ids()))
+        self.assertEqual(changed.unit_key, types_db.type_units_unit_key(DEF_1.id))
+
+    def test_type_definition_cache_added_elsewhere(self):
+        """
+        Tests that a type written outside of this process is still found.
+        """
+
+        # Setup
+        types_db.load_type_definition_cache()
+        ContentType.get_collection().save(ContentType('external', 'External', 'External',
+                                                      ['name'], [], []), safe=True)
+
+        # Test
+        type_def = types_db.type_definition('external')
+
+        # Verify
+        self.assertTrue(type_def is not None)
+        self.assertEqual(['name'], type_def['unit_key'])
+        self.assertTrue('external' in types_db.all_type_ids())
+
     # -- utility method tests ------------------------------------------------
 
     def test_create_or_update_type_collection(self):
@@ -163,6 +163,20 @@ class UserManagerTests(base.PulpServerTests):
         self.assertTrue(user['password'] is not None)
         self.assertNotEqual(changed_password, user['password'])
 
+    @mock.patch('pulp.server.auth.cache.AuthenticationCache.invalidate')
+    def test_update_invalidates_auth_cache(self, mock_invalidate):
+        login = 'login-test'
+        self.user_manager.create_user(login, 'some password')
+        self.user_manager.update_user(login, delta={'password': 'some other password'})
+        mock_invalidate.assert_called_once_with(login)
+
+    @mock.patch('pulp.server.auth.cache.AuthenticationCache.invalidate')
+    def test_delete_invalidates_auth_cache(self, mock_invalidate):
+        login = 'login-test'
+        self.user_manager.create_user(login, 'some password')
+        self.user_manager.delete_user(login)
+        mock_invalidate.assert_called_once_with(login)
+
     @mock.patch('pulp.server.db.connection.PulpCollection.query')
     def test_find_by_criteria(self, mock_query):
         criteria = Criteria()
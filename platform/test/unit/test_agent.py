@@ -83,3 +83,58 @@ class TestConduit(unittest.TestCase):
         conduit.update_progress(report)
         self.assertEqual(report, mock_context.return_value.progress.details)
         self.assertEqual(1, mock_context.return_value.progress.report.call_count)
+
+
+class TestProfile(unittest.TestCase):
+
+    PROFILE = [{'name': 'zsh', 'version': '1.0'}]
+
+    @mock.patch('pulp.agent.lib.dispatcher.Dispatcher')
+    @mock.patch('gofer.agent.plugin.Plugin.find', return_value=MockPlugin())
+    @mock.patch('gofer.agent.logutil.getLogger', return_value=root)
+    def setUp(self, *unused):
+        from pulp.agent.gofer import pulpplugin
+        self.pulpplugin = pulpplugin
+        report = mock.Mock()
+        report.details = {'rpm': {'succeeded': True, 'details': self.PROFILE}}
+        dispatcher = mock.Mock()
+        dispatcher.profile.return_value = report
+        self.bindings = mock.Mock()
+        self.patchers = [
+            mock.patch.object(pulpplugin, 'dispatcher', dispatcher),
+            mock.patch.object(pulpplugin, 'PulpBindings', return_value=self.bindings),
+            mock.patch.object(pulpplugin, 'Bundle'),
+            mock.patch.object(pulpplugin, 'Conduit'),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        pulpplugin.Bundle.return_value.cn.return_value = TEST_CN
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_send_unchanged(self):
+        from pulp.common.util import profile_hash
+        response = self.bindings.profile.hash.return_value
+        response.response_body = {'profile_hash': profile_hash(self.PROFILE)}
+        self.pulpplugin.Profile().send()
+        self.bindings.profile.hash.assert_called_with(TEST_CN, 'rpm')
+        self.assertFalse(self.bindings.profile.send.called)
+
+    def test_send_changed(self):
+        response = self.bindings.profile.hash.return_value
+        response.response_body = {'profile_hash': 'other'}
+        self.pulpplugin.Profile().send()
+        self.bindings.profile.send.assert_called_with(TEST_CN, 'rpm', self.PROFILE)
+
+    def test_send_hash_not_found(self):
+        self.bindings.profile.hash.side_effect = Exception()
+        self.pulpplugin.Profile().send()
+        self.bindings.profile.send.assert_called_with(TEST_CN, 'rpm', self.PROFILE)
+
+    def test_send_hashing_not_supported(self):
+        with mock.patch.object(self.pulpplugin, 'profile_hash', side_effect=ImportError()):
+            self.pulpplugin.Profile().send()
+        self.assertFalse(self.bindings.profile.hash.called)
+        self.bindings.profile.send.assert_called_with(TEST_CN, 'rpm', self.PROFILE)
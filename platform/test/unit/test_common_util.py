@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+from pulp.common import util
+
+
+class TestProfileHash(unittest.TestCase):
+
+    PROFILE = [{'name': 'zsh', 'version': '1.0', 'arch': 'x86_64'},
+               {'name': 'ksh', 'version': '2.0', 'arch': 'noarch'}]
+
+    def test_unordered(self):
+        profile = [dict(reversed(sorted(p.items()))) for p in reversed(self.PROFILE)]
+        self.assertEqual(util.profile_hash(self.PROFILE), util.profile_hash(profile))
+
+    def test_unicode(self):
+        profile = [dict([(unicode(k), unicode(v)) for k, v in p.items()]) for p in self.PROFILE]
+        self.assertEqual(util.profile_hash(self.PROFILE), util.profile_hash(profile))
+
+    def test_changed(self):
+        profile = [dict(p) for p in self.PROFILE]
+        profile[0]['version'] = '1.1'
+        self.assertNotEqual(util.profile_hash(self.PROFILE), util.profile_hash(profile))
+        self.assertNotEqual(util.profile_hash(self.PROFILE), util.profile_hash(self.PROFILE[:1]))
+
+    def test_nested(self):
+        profile_1 = {'modules': [[1, 2], [3, 4]]}
+        profile_2 = {'modules': [[4, 3], [2, 1]]}
+        self.assertEqual(util.profile_hash(profile_1), util.profile_hash(profile_2))
@@ -15,7 +15,7 @@ import unittest
 
 import mock
 
-from pulp.bindings.consumer import ConsumerSearchAPI
+from pulp.bindings.consumer import ConsumerSearchAPI, ProfilesAPI
 
 class TestConsumerSearchAPI(unittest.TestCase):
     def test_path_defined(self):
@@ -23,3 +23,9 @@ class TestConsumerSearchAPI(unittest.TestCase):
         self.assertTrue(api.PATH is not None)
         self.assertTrue(len(api.PATH) > 0)
 
+
+class TestProfilesAPI(unittest.TestCase):
+    def test_hash(self):
+        api = ProfilesAPI(mock.MagicMock())
+        api.hash('test-consumer', 'rpm')
+        api.server.GET.assert_called_once_with('/v2/consumers/test-consumer/profiles/rpm/hash/')
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Compare the number of certificate verifications per second of forking
+'openssl verify' with the server's in-process verification, both without
+(cold) and with (warm) its cache of verified certificates.
+
+Needs M2Crypto and the Pulp server sources on the python path, e.g.:
+
+ PYTHONPATH=../../platform/src python ./verify_benchmark.py \
+    --ca /etc/pki/pulp/ca.crt --cert consumer.crt
+"""
+
+import optparse
+import subprocess
+import sys
+import time
+
+from pulp.server.managers.auth.cert.cert_generator import CAStore
+
+
+def openssl_verify(ca_path, cert_pem):
+    p = subprocess.Popen(['openssl', 'verify', '-CAfile', ca_path],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate(input=cert_pem)
+    return stdout.rstrip().endswith('OK')
+
+
+def in_process_verify(ca_path, cert_pem):
+    return CAStore().verify(ca_path, cert_pem)
+
+
+def cold_in_process_verify(ca_path, cert_pem):
+    store = CAStore()
+    store.verified.invalidate()
+    return store.verify(ca_path, cert_pem)
+
+
+def run(verify, ca_path, cert_pem, seconds):
+    if not verify(ca_path, cert_pem):
+        raise RuntimeError('certificate did not verify')
+    count = 0
+    start = time.time()
+    elapsed = 0
+    while elapsed < seconds:
+        verify(ca_path, cert_pem)
+        count += 1
+        elapsed = time.time() - start
+    return count / elapsed
+
+
+def parse_args():
+    parser = optparse.OptionParser()
+    parser.add_option('--ca', help='CA certificate file to verify against')
+    parser.add_option('--cert', help='PEM encoded certificate issued by the CA')
+    parser.add_option('--seconds', type='float', default=5.0,
+                      help='time to run each verification for [default: %default]')
+    options, args = parser.parse_args()
+    if args:
+        parser.error('unknown arguments: %s' % ', '.join(args))
+    if not options.ca or not options.cert:
+        parser.error('--ca and --cert are required')
+    return options
+
+
+def main():
+    options = parse_args()
+    fp = open(options.cert)
+    try:
+        cert_pem = fp.read()
+    finally:
+        fp.close()
+
+    results = []
+    for name, verify in (('openssl verify', openssl_verify),
+                         ('in-process (cold)', cold_in_process_verify),
+                         ('in-process (warm)', in_process_verify)):
+        rate = run(verify, options.ca, cert_pem, options.seconds)
+        results.append(rate)
+        print '%-20s %10.1f verifications/second' % (name, rate)
+
+    print 'in-process speedup: %.1fx (cold), %.1fx (warm)' % (results[1] / results[0],
+                                                              results[2] / results[0])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
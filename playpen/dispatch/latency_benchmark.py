@@ -0,0 +1,86 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Measure the latency the dispatch subsystem adds to synchronous calls.
+
+Each call is a no-op executed with Coordinator.execute_call_synchronously, so
+the measured time is the time spent enqueueing, dispatching and waiting on the
+task. Run it on an otherwise idle machine.
+"""
+
+import optparse
+import sys
+import time
+
+from pulp.server.db import connection
+
+DEFAULT_DATABASE = 'pulp_dispatch_benchmark'
+
+
+def no_op():
+    pass
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def parse_args():
+    parser = optparse.OptionParser()
+    parser.add_option('--calls', type='int', default=100,
+                      help='number of synchronous calls to time [default: %default]')
+    parser.add_option('--database', default=DEFAULT_DATABASE,
+                      help='scratch database to use; it is dropped when done [default: %default]')
+    options, args = parser.parse_args()
+    if args:
+        parser.error('unknown arguments: %s' % ', '.join(args))
+    return options
+
+
+def main():
+    options = parse_args()
+
+    connection.initialize(name=options.database)
+
+    # imported after the database connection is initialized
+    from pulp.server.dispatch import factory as dispatch_factory
+    from pulp.server.dispatch.call import CallRequest
+    from pulp.server.managers import factory as manager_factory
+
+    manager_factory.initialize()
+    dispatch_factory.initialize()
+    coordinator = dispatch_factory.coordinator()
+
+    latencies = []
+    try:
+        for i in range(options.calls):
+            start = time.time()
+            coordinator.execute_call_synchronously(CallRequest(no_op))
+            latencies.append(time.time() - start)
+    finally:
+        dispatch_factory.finalize(clear_queued_calls=True)
+        connection.database().connection.drop_database(options.database)
+
+    latencies.sort()
+    print 'synchronous calls: %d' % len(latencies)
+    print 'mean:   %8.2f ms' % (1000 * sum(latencies) / len(latencies))
+    for label, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        print '%s:    %8.2f ms' % (label, 1000 * percentile(latencies, fraction))
+    print 'max:    %8.2f ms' % (1000 * latencies[-1])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
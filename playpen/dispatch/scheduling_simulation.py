@@ -0,0 +1,173 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2013 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Simulate the task queue's scheduling policies against a recorded queue.
+
+A recorded queue is a JSON list of calls, each one an object with:
+ enqueue:  seconds after the start of the recording the call was queued
+ tags:     the call request's tags
+ weight:   the call request's concurrency weight
+ duration: seconds the call ran for
+
+Without a recording, a synthetic top of the hour is generated: a burst of
+scheduled syncs, each followed by its auto publish, while administrators and
+consumers keep making short calls. --dump writes the queue that was simulated
+so it can be edited and replayed.
+
+The simulation is event driven, like the dispatcher: the policy is consulted
+every time a call is queued or completes. No database is needed.
+"""
+
+import heapq
+import json
+import optparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+from pulp.common.tags import action_tag
+from pulp.server.dispatch import policy
+
+
+class SimulatedCallRequest(object):
+
+    def __init__(self, tags, weight):
+        self.tags = tags
+        self.weight = weight
+        self.dependencies = {}
+
+
+class SimulatedTask(object):
+
+    def __init__(self, call, start_time):
+        self.call = call
+        self.call_request = SimulatedCallRequest(call['tags'], call['weight'])
+        self.enqueue_time = start_time + timedelta(seconds=call['enqueue'])
+        self.wait = None
+
+
+def synthetic_queue(syncs, seed):
+    random.seed(seed)
+    queue = []
+    for i in range(syncs):
+        duration = random.uniform(60, 600)
+        queue.append({'enqueue': 0.0, 'tags': [action_tag('sync')], 'weight': 2,
+                      'duration': duration})
+        queue.append({'enqueue': 0.0, 'tags': [action_tag('auto_publish')], 'weight': 1,
+                      'duration': random.uniform(10, 60)})
+    for i in range(syncs * 2):
+        action = random.choice(('create', 'update', 'delete', 'unit_install', 'bind'))
+        queue.append({'enqueue': random.uniform(0, 3600), 'tags': [action_tag(action)],
+                      'weight': 1, 'duration': random.uniform(0.1, 5)})
+    queue.sort(key=lambda c: c['enqueue'])
+    return queue
+
+
+def simulate(tasks, start_time, scheduling_policy, concurrency_threshold):
+    # tasks are popped off the end in the order they were queued
+    arrivals = list(reversed(tasks))
+    waiting = []
+    running = [] # heap of (finish time, sequence, task)
+    running_weight = 0
+    now = 0.0
+    sequence = 0
+    while arrivals or waiting or running:
+        next_times = []
+        if arrivals:
+            next_times.append(arrivals[-1].call['enqueue'])
+        if running:
+            next_times.append(running[0][0])
+        if not next_times:
+            raise RuntimeError('%d calls can never run' % len(waiting))
+        now = max(now, min(next_times))
+        while running and running[0][0] <= now:
+            finish_time, seq, task = heapq.heappop(running)
+            running_weight -= task.call_request.weight
+        while arrivals and arrivals[-1].call['enqueue'] <= now:
+            waiting.append(arrivals.pop())
+        ready = scheduling_policy.ready_tasks(waiting, [r[2] for r in running],
+                                              concurrency_threshold - running_weight,
+                                              start_time + timedelta(seconds=now))
+        for task in ready:
+            waiting.remove(task)
+            task.wait = now - task.call['enqueue']
+            running_weight += task.call_request.weight
+            heapq.heappush(running, (now + task.call['duration'], sequence, task))
+            sequence += 1
+    return now
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def report(name, queue, scheduling_policy, concurrency_threshold):
+    classifier = policy.PriorityPolicy()
+    start_time = datetime(2013, 1, 1)
+    tasks = [SimulatedTask(c, start_time) for c in queue]
+    makespan = simulate(tasks, start_time, scheduling_policy, concurrency_threshold)
+    print '%s policy: all calls completed after %.1f s' % (name, makespan)
+    print '  %-10s %6s %10s %10s %10s' % ('class', 'calls', 'mean wait', 'p95 wait', 'max wait')
+    for priority, priority_class in enumerate(classifier.priority_classes):
+        waits = sorted(t.wait for t in tasks if classifier.task_priority(t) == priority)
+        if not waits:
+            continue
+        print '  %-10s %6d %10.1f %10.1f %10.1f' % (priority_class, len(waits), sum(waits) / len(waits),
+                                                    percentile(waits, 0.95), waits[-1])
+
+
+def parse_args():
+    parser = optparse.OptionParser()
+    parser.add_option('--queue', help='recorded queue to replay')
+    parser.add_option('--dump', help='write the simulated queue to this file')
+    parser.add_option('--syncs', type='int', default=500,
+                      help='scheduled syncs in the synthetic queue [default: %default]')
+    parser.add_option('--seed', type='int', default=0,
+                      help='random seed for the synthetic queue [default: %default]')
+    parser.add_option('--threshold', type='int', default=9,
+                      help='concurrency threshold [default: %default]')
+    parser.add_option('--aging-interval', type='float', default=300,
+                      help='priority policy aging interval in seconds [default: %default]')
+    parser.add_option('--concurrency-caps', default='',
+                      help='priority policy concurrency caps, e.g. pulp:action:sync=4')
+    options, args = parser.parse_args()
+    if args:
+        parser.error('unknown arguments: %s' % ', '.join(args))
+    return options
+
+
+def main():
+    options = parse_args()
+
+    if options.queue:
+        queue = json.load(open(options.queue))
+        queue.sort(key=lambda c: c['enqueue'])
+    else:
+        queue = synthetic_queue(options.syncs, options.seed)
+
+    if options.dump:
+        json.dump(queue, open(options.dump, 'w'), indent=1)
+
+    caps = policy.parse_concurrency_caps(options.concurrency_caps)
+    policies = (('fifo', policy.FIFOPolicy()),
+                ('priority', policy.PriorityPolicy(concurrency_caps=caps,
+                                                   aging_interval=options.aging_interval)))
+    for name, scheduling_policy in policies:
+        report(name, queue, scheduling_policy, options.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())